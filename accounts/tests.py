@@ -1,3 +1,34 @@
-from django.test import TestCase
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.test import Client, TestCase, override_settings
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
 
-# Create your tests here.
+
+@override_settings(TOKEN_CACHE_TIMEOUT=300)
+class AccountTokenTests(TestCase):
+    """Account changes reach API tokens cached by CachedTokenAuthentication"""
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('alice', 'alice@example.com', 'pw')
+        self.token = Token.objects.create(user=self.user)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+        # Warm the cache
+        self.assertEqual(self.client.get('/api/messages/').status_code, 200)
+
+    def test_deactivated_account_loses_api_access(self):
+        self.user.is_active = False
+        self.user.save()
+        self.assertEqual(self.client.get('/api/messages/').status_code, 401)
+
+    def test_deleted_account_loses_api_access(self):
+        self.user.delete()
+        self.assertEqual(self.client.get('/api/messages/').status_code, 401)
+
+    def test_web_login_keeps_the_token(self):
+        # Logging in only saves last_login, which cached tokens ignore
+        response = Client().post('/accounts/login/', {'username': 'alice', 'password': 'pw'})
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(self.client.get('/api/messages/').status_code, 200)
@@ -1,14 +1,38 @@
 from rest_framework import serializers, viewsets, generics, permissions, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
+from rest_framework.views import APIView
 from rest_framework.authtoken.models import Token
 from rest_framework.authtoken.views import ObtainAuthToken
+from django.conf import settings
 from django.contrib.auth import authenticate
+from django.core.cache import cache
+from django.core.handlers.wsgi import WSGIRequest
+from django.db import transaction
 from django.db.models import Q, Count
+from django.urls import resolve, Resolver404
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from datetime import datetime, timedelta, timezone as dt_timezone
+from urllib.parse import urlsplit
+import hashlib
+import io
+import json
+import logging
+from resources.models import Resource, ResourceText
 from .models import (
     Post, Comment, Reaction, User,
-    Notification, UserActivity, Follow, Message
+    Notification, UserActivity, Follow, Message, PostSave, PostTombstone, SyncTombstone
 )
+from .signals import touch_posts
+from .search import PostSearchResults, UnifiedSearchResults, normalize_query, highlight_pages
+from . import typeahead
+from .conditional import list_validators, add_validator_headers, not_modified_response
+
+logger = logging.getLogger(__name__)
+
+# Change tokens count microseconds from here
+CHANGES_EPOCH = datetime(1970, 1, 1, tzinfo=dt_timezone.utc)
 
 # ==================== SERIALIZERS ====================
 
@@ -28,9 +52,25 @@ class UserSerializer(serializers.ModelSerializer):
             'follower_count', 'following_count', 'last_login'
         ]
 
+class SideloadedUserSerializer(UserSerializer):
+    """Nested user that collapses to an id when the response side-loads users"""
+    
+    def get_attribute(self, instance):
+        if self.context.get('sideloaded_user_ids') is not None:
+            # Read the FK column directly so the related user is never fetched
+            return getattr(instance, f'{self.source}_id')
+        return super().get_attribute(instance)
+    
+    def to_representation(self, instance):
+        user_ids = self.context.get('sideloaded_user_ids')
+        if user_ids is None:
+            return super().to_representation(instance)
+        user_ids.add(instance)
+        return instance
+
 class ReactionSerializer(serializers.ModelSerializer):
     """Reaction serializer"""
-    user = UserSerializer(read_only=True)
+    user = SideloadedUserSerializer(read_only=True)
     
     class Meta:
         model = Reaction
@@ -38,7 +78,7 @@ class ReactionSerializer(serializers.ModelSerializer):
 
 class CommentSerializer(serializers.ModelSerializer):
     """Comment serializer with nested replies"""
-    author = UserSerializer(read_only=True)
+    author = SideloadedUserSerializer(read_only=True)
     reply_count = serializers.IntegerField(source='replies.count', read_only=True)
     reaction_count = serializers.IntegerField(source='reactions.count', read_only=True)
     user_reaction = serializers.SerializerMethodField()
@@ -60,7 +100,7 @@ class CommentSerializer(serializers.ModelSerializer):
 
 class PostSerializer(serializers.ModelSerializer):
     """Post serializer with all related data"""
-    author = UserSerializer(read_only=True)
+    author = SideloadedUserSerializer(read_only=True)
     comment_count = serializers.IntegerField(read_only=True)
     reaction_counts = serializers.SerializerMethodField()
     user_reaction = serializers.SerializerMethodField()
@@ -97,7 +137,7 @@ class PostSerializer(serializers.ModelSerializer):
 
 class NotificationSerializer(serializers.ModelSerializer):
     """Notification serializer"""
-    sender = UserSerializer(read_only=True)
+    sender = SideloadedUserSerializer(read_only=True)
     
     class Meta:
         model = Notification
@@ -105,20 +145,84 @@ class NotificationSerializer(serializers.ModelSerializer):
 
 class MessageSerializer(serializers.ModelSerializer):
     """Message serializer for private chat"""
-    sender = UserSerializer(read_only=True)
-    recipient = UserSerializer(read_only=True)
+    sender = SideloadedUserSerializer(read_only=True)
+    recipient = SideloadedUserSerializer(read_only=True)
     
     class Meta:
         model = Message
         fields = ['id', 'sender', 'recipient', 'content', 'created_at', 'is_read']
 
+# ==================== SIDE-LOADING ====================
+
+class SideloadUsersMixin:
+    """
+    Opt-in normalized responses. With ``?sideload=users`` every nested user
+    is replaced by its id and a single ``users`` map, fetched in one query,
+    is attached to the response.
+    """
+    
+    def sideloads_users(self):
+        return self.request.query_params.get('sideload') == 'users'
+    
+    def initial(self, request, *args, **kwargs):
+        self.sideloaded_user_ids = set() if self.sideloads_users() else None
+        super().initial(request, *args, **kwargs)
+    
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        if getattr(self, 'sideloaded_user_ids', None) is not None:
+            context['sideloaded_user_ids'] = self.sideloaded_user_ids
+        return context
+    
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(request, response, *args, **kwargs)
+        user_ids = getattr(self, 'sideloaded_user_ids', None)
+        if user_ids is None or response.status_code >= 300 or response.exception:
+            return response
+        
+        users = list(User.objects.filter(pk__in=user_ids).select_related('activity'))
+        users_map = {
+            str(data['id']): data
+            for data in UserSerializer(users, many=True, context={'request': request}).data
+        }
+        if isinstance(response.data, list):
+            response.data = {'results': response.data, 'users': users_map}
+        elif isinstance(response.data, dict):
+            response.data['users'] = users_map
+        return response
+
+# ==================== CONDITIONAL GET ====================
+
+class ConditionalListMixin:
+    """
+    ETag for list endpoints. The validator comes from one aggregate
+    query, so unchanged refreshes get a 304 without serializing.
+    """
+    validator_timestamp_field = 'updated_at'
+    
+    def get_validator_counters(self):
+        return {}
+    
+    def list(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_queryset())
+        etag = list_validators(
+            request, queryset, self.validator_timestamp_field, **self.get_validator_counters()
+        )
+        response = not_modified_response(request, etag)
+        if response is not None:
+            return response
+        
+        response = super().list(request, *args, **kwargs)
+        return add_validator_headers(response, etag)
+
 # ==================== VIEWSETS ====================
 
-class PostViewSet(viewsets.ModelViewSet):
+class PostViewSet(SideloadUsersMixin, ConditionalListMixin, viewsets.ModelViewSet):
     """API endpoint for posts"""
     queryset = Post.objects.filter(is_archived=False).order_by('-created_at')
     serializer_class = PostSerializer
     permission_classes = [permissions.IsAuthenticatedOrReadOnly]
+    validator_timestamp_field = 'last_activity'
     
     def perform_create(self, serializer):
         serializer.save(author=self.request.user)
@@ -161,6 +265,97 @@ class PostViewSet(viewsets.ModelViewSet):
             return Response({'saved': False})
         return Response({'saved': True})
     
+    # Changes committed just before a watermark may become visible just after
+    # it, so every delta re-reads a short window behind the token.
+    changes_overlap = timedelta(seconds=5)
+    changes_limit = 500
+    
+    @action(detail=False, methods=['get'])
+    def changes(self, request):
+        """
+        Delta sync: posts created, updated, archived or deleted since ``?since=<token>``.
+        
+        Without a token only the current watermark is returned. ``has_more``
+        means the client should call again with the returned token, which
+        then carries the last post's id as well: touch_posts() gives many
+        posts one timestamp, so a page can end in the middle of them.
+        """
+        now = timezone.now()
+        since_token = request.query_params.get('since')
+        if not since_token:
+            return Response({'token': self.changes_token(now - self.changes_overlap)})
+        try:
+            micros, _, after_id = since_token.partition('.')
+            since = CHANGES_EPOCH + timedelta(microseconds=int(micros))
+            after_id = int(after_id) if after_id else None
+        except (ValueError, OverflowError):
+            return Response({'error': 'Invalid since token'}, status=400)
+        
+        if since < now - PostTombstone.RETENTION:
+            # Tombstones older than this have been pruned: refetch from scratch
+            return Response({'reset': True, 'token': self.changes_token(now - self.changes_overlap)})
+        
+        if after_id is None:
+            window = Q(last_activity__gte=since)
+        else:
+            window = Q(last_activity__gt=since) | Q(last_activity=since, id__gt=after_id)
+        changed = list(
+            Post.objects.filter(window)
+            .annotate(comment_total=Count('comments'))
+            .order_by('last_activity', 'id')
+            .values('id', 'created_at', 'last_activity', 'is_archived', 'reply_count', 'comment_total')[:self.changes_limit + 1]
+        )
+        has_more = len(changed) > self.changes_limit
+        if has_more:
+            changed = changed[:self.changes_limit]
+            token = self.changes_token(changed[-1]['last_activity'], changed[-1]['id'])
+        else:
+            token = self.changes_token(now - self.changes_overlap)
+        
+        created, updated, archived, counters = [], [], [], {}
+        for row in changed:
+            if row['is_archived']:
+                archived.append(row['id'])
+                continue
+            (created if row['created_at'] >= since else updated).append(row['id'])
+            counters[str(row['id'])] = {
+                'comment_count': row['comment_total'],
+                'reply_count': row['reply_count'],
+                'reaction_counts': {},
+            }
+        
+        for post_id, reaction_type, total in (
+            Reaction.objects.filter(post_id__in=created + updated)
+            .values_list('post_id', 'reaction_type').annotate(total=Count('id')).order_by()
+        ):
+            counters[str(post_id)]['reaction_counts'][reaction_type] = total
+        
+        deleted = list(PostTombstone.objects.filter(deleted_at__gte=since).values_list('post_id', flat=True))
+        
+        return Response({
+            'token': token,
+            'has_more': has_more,
+            'created': created,
+            'updated': updated,
+            'archived': archived,
+            'deleted': deleted,
+            'counters': counters,
+        })
+    
+    @staticmethod
+    def changes_token(moment, last_id=None):
+        # Whole microseconds, exactly: the next page compares last_activity for equality
+        micros = (moment - CHANGES_EPOCH) // timedelta(microseconds=1)
+        return f'{micros}.{last_id}' if last_id is not None else str(micros)
+    
+    @action(detail=False, methods=['get'])
+    def search(self, request):
+        """Ranked full-text search: ?q=<text>, paginated like the feed"""
+        results = PostSearchResults(request.query_params.get('q', ''))
+        page = self.paginate_queryset(results)
+        serializer = self.get_serializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
+    
     @action(detail=True, methods=['get'])
     def reactions(self, request, pk=None):
         """Get list of users who reacted"""
@@ -180,7 +375,7 @@ class PostViewSet(viewsets.ModelViewSet):
         
         return Response(grouped)
 
-class CommentViewSet(viewsets.ModelViewSet):
+class CommentViewSet(SideloadUsersMixin, viewsets.ModelViewSet):
     """API endpoint for comments"""
     queryset = Comment.objects.all().order_by('-created_at')
     serializer_class = CommentSerializer
@@ -216,7 +411,7 @@ class CommentViewSet(viewsets.ModelViewSet):
             comment.reactions.create(user=request.user)
             return Response({'liked': True})
 
-class UserViewSet(viewsets.ReadOnlyModelViewSet):
+class UserViewSet(SideloadUsersMixin, viewsets.ReadOnlyModelViewSet):
     """API endpoint for users"""
     queryset = User.objects.filter(is_active=True)
     serializer_class = UserSerializer
@@ -235,6 +430,18 @@ class UserViewSet(viewsets.ReadOnlyModelViewSet):
             return Response({'following': False})
         return Response({'following': True})
     
+    @action(detail=False, methods=['get'])
+    def search(self, request):
+        """Username prefix search: ?q=<text>"""
+        query = request.query_params.get('q', '').strip()
+        users = self.get_queryset().none() if not query else (
+            self.get_queryset().filter(username__istartswith=query)
+            .select_related('activity').order_by('username')
+        )
+        page = self.paginate_queryset(users)
+        serializer = self.get_serializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
+    
     @action(detail=True, methods=['get'])
     def posts(self, request, pk=None):
         """Get posts by user"""
@@ -242,15 +449,20 @@ class UserViewSet(viewsets.ReadOnlyModelViewSet):
         posts = Post.objects.filter(author=user, is_archived=False).order_by('-created_at')
         page = self.paginate_queryset(posts)
         if page is not None:
-            serializer = PostSerializer(page, many=True, context={'request': request})
+            serializer = PostSerializer(page, many=True, context=self.get_serializer_context())
             return self.get_paginated_response(serializer.data)
-        serializer = PostSerializer(posts, many=True, context={'request': request})
+        serializer = PostSerializer(posts, many=True, context=self.get_serializer_context())
         return Response(serializer.data)
 
-class MessageViewSet(viewsets.ModelViewSet):
+class MessageViewSet(SideloadUsersMixin, ConditionalListMixin, viewsets.ModelViewSet):
     """API endpoint for private messages"""
     serializer_class = MessageSerializer
     permission_classes = [permissions.IsAuthenticated]
+    validator_timestamp_field = 'created_at'
+    
+    def get_validator_counters(self):
+        # Messages are never edited, only marked read
+        return {'read': Count('pk', filter=Q(is_read=True))}
     
     def get_queryset(self):
         user = self.request.user
@@ -266,6 +478,366 @@ class MessageViewSet(viewsets.ModelViewSet):
     def perform_create(self, serializer):
         serializer.save(sender=self.request.user)
 
+# ==================== BATCH ====================
+
+class BatchView(APIView):
+    """
+    Run several API requests in one round trip.
+    
+    POST {"requests": [{"id": "feed", "method": "GET", "path": "/api/posts/"}, ...]}
+    
+    Sub-requests are dispatched in-process, in order, reusing the user
+    already authenticated on the batch request and the same DB connection.
+    Only the REST API views in posts/urls.py can be batched (not pages,
+    admin, login/logout or register), and each one runs in its own
+    savepoint: a failing item gets a 500 of its own and the rest still run.
+    """
+    permission_classes = [permissions.AllowAny]
+    max_requests = 20
+    allowed_methods = ('GET', 'HEAD', 'POST', 'PUT', 'PATCH', 'DELETE')
+    
+    def post(self, request):
+        sub_requests = request.data.get('requests')
+        if not isinstance(sub_requests, list) or not sub_requests:
+            return Response({'error': 'requests must be a non-empty list'}, status=400)
+        if len(sub_requests) > self.max_requests:
+            return Response({'error': f'At most {self.max_requests} requests per batch'}, status=400)
+        
+        return Response({'responses': [self.dispatch_sub_request(request, sub) for sub in sub_requests]})
+    
+    def dispatch_sub_request(self, request, sub):
+        if not isinstance(sub, dict):
+            return {'status': 400, 'body': {'error': 'Each request must be an object'}}
+        
+        result = {'id': sub['id']} if 'id' in sub else {}
+        method = str(sub.get('method', 'GET')).upper()
+        url = urlsplit(str(sub.get('path', '')))
+        
+        if method not in self.allowed_methods:
+            return {**result, 'status': 405, 'body': {'error': f'Method {method} not allowed'}}
+        try:
+            match = resolve(url.path, urlconf='posts.urls')
+        except Resolver404:
+            return {**result, 'status': 404, 'body': {'error': 'Not found'}}
+        view_class = getattr(match.func, 'cls', None)
+        if view_class is type(self):
+            return {**result, 'status': 400, 'body': {'error': 'Batches cannot be nested'}}
+        if view_class is None or issubclass(view_class, (LoginView, LogoutView, RegisterView)):
+            return {**result, 'status': 400, 'body': {'error': f'{url.path} cannot be batched'}}
+        
+        body = json.dumps(sub['body']).encode() if sub.get('body') is not None else b''
+        environ = {
+            # The batch's own conditional headers were meant for /api/batch/
+            **{key: value for key, value in request._request.META.items() if not key.startswith('HTTP_IF_')},
+            'REQUEST_METHOD': method,
+            'PATH_INFO': url.path,
+            'QUERY_STRING': url.query,
+            'CONTENT_TYPE': 'application/json',
+            'CONTENT_LENGTH': str(len(body)),
+            'wsgi.input': io.BytesIO(body),
+        }
+        for header, value in (sub.get('headers') or {}).items():
+            environ['HTTP_' + header.upper().replace('-', '_')] = str(value)
+        
+        sub_request = WSGIRequest(environ)
+        sub_request.resolver_match = match
+        # Skip re-authentication in DRF views and satisfy plain Django views
+        sub_request.user = request.user
+        sub_request._force_auth_user = request.user
+        sub_request._force_auth_token = request.auth
+        
+        try:
+            with transaction.atomic():
+                response = match.func(sub_request, *match.args, **match.kwargs)
+                if hasattr(response, 'data'):
+                    response_body = response.data
+                elif response.streaming:
+                    # File downloads: the client fetches those directly
+                    response_body = None
+                else:
+                    content = response.content.decode(response.charset or 'utf-8')
+                    if response.get('Content-Type', '').startswith('application/json'):
+                        response_body = json.loads(content) if content else None
+                    else:
+                        response_body = content
+        except Exception:
+            logger.exception('Batch sub-request %s %s failed', method, url.path)
+            return {**result, 'status': 500, 'body': {'error': 'Internal server error'}}
+        
+        headers = {name: response[name] for name in ('ETag', 'Last-Modified') if response.has_header(name)}
+        return {**result, 'status': response.status_code, 'headers': headers, 'body': response_body}
+
+# ==================== OFFLINE SYNC ====================
+
+class SyncView(APIView):
+    """
+    Replay reactions, saves and follows queued while offline.
+    
+    POST {"actions": [{"type": "react", "post": 1, "reaction_type": "like", "at": "<iso>"}, ...]}
+    
+    Types: react/unreact and save/unsave (``post``), follow/unfollow (``user``).
+    Actions set state rather than toggle it, so replaying a queue twice is
+    harmless. The last action per target (ordered by ``at``) wins and is
+    skipped when the server already holds a newer change for that target:
+    a newer row, or a newer removal recorded as a ``SyncTombstone`` (so an
+    add queued on one device can't resurrect a row another device removed
+    later). Everything is applied in one transaction with bulk upserts/deletes.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+    max_actions = 500
+    
+    # type -> (state key, target field, value)
+    ACTIONS = {
+        'react': ('reactions', 'post', None),
+        'unreact': ('reactions', 'post', False),
+        'save': ('saves', 'post', True),
+        'unsave': ('saves', 'post', False),
+        'follow': ('follows', 'user', True),
+        'unfollow': ('follows', 'user', False),
+    }
+    
+    def post(self, request):
+        actions = request.data.get('actions')
+        if not isinstance(actions, list):
+            return Response({'error': 'actions must be a list'}, status=400)
+        if len(actions) > self.max_actions:
+            return Response({'error': f'At most {self.max_actions} actions per sync'}, status=400)
+        
+        user = request.user
+        now = timezone.now()
+        parsed, errors = [], []
+        reaction_types = dict(Reaction.REACTION_TYPES)
+        
+        for index, item in enumerate(actions):
+            if not isinstance(item, dict) or item.get('type') not in self.ACTIONS:
+                errors.append({'index': index, 'error': 'Unknown action type'})
+                continue
+            key, target_field, value = self.ACTIONS[item['type']]
+            try:
+                target = int(item.get(target_field))
+            except (TypeError, ValueError):
+                errors.append({'index': index, 'error': f'{target_field} id required'})
+                continue
+            if item['type'] == 'react':
+                value = item.get('reaction_type')
+                if value not in reaction_types:
+                    errors.append({'index': index, 'error': 'Invalid reaction_type'})
+                    continue
+            
+            at = None
+            if item.get('at'):
+                try:
+                    at = parse_datetime(str(item['at']))
+                except ValueError:
+                    pass
+                if at is None:
+                    errors.append({'index': index, 'error': 'Invalid at timestamp'})
+                    continue
+                if timezone.is_naive(at):
+                    at = timezone.make_aware(at)
+            parsed.append((min(at or now, now), index, key, target, value))
+        
+        # Collapse to the final desired state per target
+        desired = {'reactions': {}, 'saves': {}, 'follows': {}}
+        for at, index, key, target, value in sorted(parsed, key=lambda a: (a[0], a[1])):
+            desired[key][target] = (at, value)
+        
+        post_ids = set(desired['reactions']) | set(desired['saves'])
+        live_posts = set(Post.objects.filter(pk__in=post_ids, is_archived=False).values_list('pk', flat=True))
+        live_users = set(
+            User.objects.filter(pk__in=desired['follows'], is_active=True)
+            .exclude(pk=user.pk).values_list('pk', flat=True)
+        )
+        for key, live in (('reactions', live_posts), ('saves', live_posts), ('follows', live_users)):
+            for target in set(desired[key]) - live:
+                del desired[key][target]
+                errors.append({'target': target, 'type': key, 'error': 'Not found'})
+        
+        with transaction.atomic():
+            self.apply(Reaction, 'user', 'post', user, desired['reactions'], 'reaction', value_field='reaction_type')
+            self.apply(PostSave, 'user', 'post', user, desired['saves'], 'save')
+            self.apply(Follow, 'follower', 'following', user, desired['follows'], 'follow')
+            touched = set(desired['reactions']) | set(desired['saves'])
+            if touched:
+                touch_posts(touched)
+        
+        return Response(self.final_state(user, live_posts, live_users, errors))
+    
+    def apply(self, model, owner_field, target_field, user, desired, kind, value_field=None):
+        """Set-based upsert/delete of ``desired`` ({target_id: (at, value)}) for one table"""
+        if not desired:
+            return
+        
+        target_id = f'{target_field}_id'
+        newer = model.objects.filter(**{owner_field: user, f'{target_id}__in': desired}).values_list(target_id, 'created_at')
+        removed_later = SyncTombstone.objects.filter(user_id=user.pk, kind=kind, target_id__in=desired).values_list('target_id', 'deleted_at')
+        for target, changed_at in [*newer, *removed_later]:
+            if target in desired and changed_at > desired[target][0]:
+                del desired[target]
+        
+        removed = {target: at for target, (at, value) in desired.items() if value is False}
+        if removed:
+            model.objects.filter(**{owner_field: user, f'{target_id}__in': removed}).delete()
+            SyncTombstone.record(user.pk, kind, removed)
+        
+        rows = [
+            model(**{owner_field: user, target_id: target, 'created_at': at, **({value_field: value} if value_field else {})})
+            for target, (at, value) in desired.items() if value is not False
+        ]
+        if not rows:
+            return
+        if value_field:
+            model.objects.bulk_create(
+                rows, update_conflicts=True,
+                unique_fields=[owner_field, target_field],
+                update_fields=[value_field, 'created_at'],
+            )
+        else:
+            model.objects.bulk_create(rows, ignore_conflicts=True)
+    
+    def final_state(self, user, post_ids, user_ids, errors):
+        posts = {str(pk): {'reaction': None, 'saved': False, 'reaction_counts': {}} for pk in post_ids}
+        
+        for post_id, reaction_type, total in (
+            Reaction.objects.filter(post_id__in=post_ids)
+            .values_list('post_id', 'reaction_type').annotate(total=Count('id')).order_by()
+        ):
+            posts[str(post_id)]['reaction_counts'][reaction_type] = total
+        for post_id, reaction_type in Reaction.objects.filter(user=user, post_id__in=post_ids).values_list('post_id', 'reaction_type'):
+            posts[str(post_id)]['reaction'] = reaction_type
+        for post_id in PostSave.objects.filter(user=user, post_id__in=post_ids).values_list('post_id', flat=True):
+            posts[str(post_id)]['saved'] = True
+        
+        following = set(Follow.objects.filter(follower=user, following_id__in=user_ids).values_list('following_id', flat=True))
+        return {
+            'posts': posts,
+            'following': {str(pk): pk in following for pk in user_ids},
+            'errors': errors,
+        }
+
+# ==================== TYPEAHEAD ====================
+
+class TypeaheadView(APIView):
+    """
+    Autocomplete over usernames, courses and universities.
+    
+    GET /api/typeahead/?q=csc1&types=course,university&limit=10
+    
+    Usernames are only suggested to signed-in users, so the endpoint can't
+    be used to list every account.
+    """
+    permission_classes = [permissions.AllowAny]
+    max_limit = 20
+    public_types = ('course', 'university')
+    
+    def get(self, request):
+        allowed = typeahead.TYPES if request.user.is_authenticated else self.public_types
+        types = [t for t in request.query_params.get('types', '').split(',') if t in allowed]
+        try:
+            limit = min(int(request.query_params.get('limit', 10)), self.max_limit)
+        except ValueError:
+            limit = 10
+        
+        results = typeahead.search(
+            request.query_params.get('q', ''),
+            types=types or allowed,
+            limit=max(limit, 1),
+        )
+        return Response({'results': results})
+
+class SearchResourceSerializer(serializers.ModelSerializer):
+    """Past-paper hit in unified search results"""
+    university = serializers.CharField(source='university.code')
+    course = serializers.CharField(source='course.code')
+    course_name = serializers.CharField(source='course.name')
+    module = serializers.SerializerMethodField()
+    resource_type = serializers.CharField(source='resource_type.name')
+    
+    class Meta:
+        model = Resource
+        fields = [
+            'id', 'title', 'description', 'university', 'course', 'course_name',
+            'module', 'resource_type', 'year_level', 'academic_year', 'semester',
+        ]
+    
+    def get_module(self, obj):
+        return obj.module.path if obj.module_id else None
+
+class SearchView(APIView):
+    """
+    Ranked search across posts and past-paper resources.
+    
+    GET /api/search/?q=csc101 exam&type=resource&university=ub&course=CSC101
+        &year_level=1&academic_year=2024&resource_type=Exam&page=2
+    
+    The ranked ids, count and facet counts for a normalized query are
+    cached for SEARCH_CACHE_TIMEOUT seconds; the rows themselves are loaded
+    per request so user-specific post fields stay fresh. Resource hits
+    carry the PDF pages that matched, with ``<mark>``ed snippets.
+    """
+    permission_classes = [permissions.AllowAny]
+    page_size = 20
+    int_filters = ('year_level', 'academic_year')
+    
+    def get(self, request):
+        params = request.query_params
+        query = normalize_query(params.get('q', ''))
+        kind = params.get('type') if params.get('type') in ('post', 'resource') else None
+        filters = {key: params[key] for key in UnifiedSearchResults.FACETS if params.get(key)}
+        try:
+            for key in self.int_filters:
+                if key in filters:
+                    filters[key] = int(filters[key])
+            page = max(int(params.get('page', 1)), 1)
+        except ValueError:
+            return Response({'error': 'page, year_level and academic_year must be integers'}, status=400)
+        
+        key_source = json.dumps([query, kind, sorted(filters.items()), page], default=str)
+        cache_key = f'search:{hashlib.sha1(key_source.encode()).hexdigest()}'
+        cached = cache.get(cache_key)
+        if cached is None:
+            results = UnifiedSearchResults(query, kind=kind, filters=filters)
+            start = (page - 1) * self.page_size
+            cached = {
+                'count': results.count(),
+                'hits': results[start:start + self.page_size],
+                'facets': results.facets(),
+            }
+            cache.set(cache_key, cached, getattr(settings, 'SEARCH_CACHE_TIMEOUT', 60))
+        
+        ids = {'post': [], 'resource': []}
+        for hit_kind, pk in cached['hits']:
+            ids[hit_kind].append(pk)
+        posts = Post.objects.select_related('author', 'author__activity').in_bulk(ids['post'])
+        resources = Resource.objects.select_related(
+            'university', 'course', 'resource_type', 'module'
+        ).in_bulk(ids['resource'])
+        
+        texts = dict(
+            ResourceText.objects.filter(resource_id__in=ids['resource'], error='')
+            .values_list('resource_id', 'content')
+        ) if ids['resource'] else {}
+        
+        context = {'request': request}
+        results = []
+        for hit_kind, pk in cached['hits']:
+            if hit_kind == 'post' and pk in posts:
+                results.append({'type': 'post', 'post': PostSerializer(posts[pk], context=context).data})
+            elif hit_kind == 'resource' and pk in resources:
+                results.append({
+                    'type': 'resource',
+                    'resource': SearchResourceSerializer(resources[pk]).data,
+                    'highlights': highlight_pages(texts.get(pk), query),
+                })
+        
+        return Response({
+            'count': cached['count'],
+            'page': page,
+            'has_more': page * self.page_size < cached['count'],
+            'results': results,
+            'facets': cached['facets'],
+        })
+
 # ==================== AUTHENTICATION ====================
 
 class LoginView(ObtainAuthToken):
@@ -282,6 +854,14 @@ class LoginView(ObtainAuthToken):
             'user': UserSerializer(user, context={'request': request}).data
         })
 
+class LogoutView(APIView):
+    """Delete the caller's token; the cached copy is dropped with it"""
+    permission_classes = [permissions.IsAuthenticated]
+    
+    def post(self, request):
+        Token.objects.filter(user=request.user).delete()
+        return Response({'logged_out': True})
+
 class RegisterView(generics.CreateAPIView):
     """User registration"""
     permission_classes = [permissions.AllowAny]
@@ -0,0 +1,56 @@
+"""
+Token authentication with the token -> user lookup cached.
+
+DRF's TokenAuthentication joins authtoken_token to auth_user on every
+request. Here the shared Django cache maps each token to just its user's
+id and active flag, so no password hash leaves the database, and every
+request gets a User of its own built from them; fields other than those
+load on first access. Entries are dropped as soon as a token is
+deleted/rotated or its user is saved (password change, deactivation),
+and as every process reads the same entry, a revoked token stops working
+everywhere at once.
+
+The cache must be one every process sees (Redis, see CACHES in
+settings); TOKEN_CACHE_TIMEOUT = 0 turns it off.
+"""
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import router
+from rest_framework import exceptions
+from rest_framework.authentication import TokenAuthentication
+
+
+def token_cache_key(key):
+    return f'auth_token_{key}'
+
+
+def invalidate_token(key):
+    """Forget a cached token right away"""
+    cache.delete(token_cache_key(key))
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """Drop-in replacement for TokenAuthentication backed by the shared cache"""
+
+    def authenticate_credentials(self, key):
+        model = self.get_model()
+        timeout = getattr(settings, 'TOKEN_CACHE_TIMEOUT', 300)
+        cached = cache.get(token_cache_key(key)) if timeout else None
+        if cached is None:
+            try:
+                token = model.objects.select_related('user').get(key=key)
+            except model.DoesNotExist:
+                raise exceptions.AuthenticationFailed('Invalid token.')
+            user = token.user
+            if timeout:
+                cache.set(token_cache_key(key), (user.pk, user.is_active), timeout)
+        else:
+            user_id, is_active = cached
+            user = User.from_db(router.db_for_read(User), ['id', 'is_active'], [user_id, is_active])
+            token = model(key=key, user=user)
+
+        if not user.is_active:
+            raise exceptions.AuthenticationFailed('User inactive or deleted.')
+
+        return (user, token)
@@ -0,0 +1,50 @@
+"""
+Cheap HTTP validators for list endpoints.
+
+ETags are derived from one aggregate query over the listed rows (latest
+timestamp plus a few counters) rather than from the rendered body, so an
+unchanged refresh is answered with 304 before anything is serialized.
+
+Lists get no Last-Modified: deleting, archiving or marking a row read
+changes a list without moving its newest timestamp, so If-Modified-Since
+alone would answer 304 for a changed list.
+"""
+import hashlib
+
+from django.db.models import Count, Max
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import quote_etag
+
+
+def list_validators(request, queryset, timestamp_field, **counters):
+    """Return the ETag of ``queryset`` using a single query"""
+    state = queryset.order_by().aggregate(
+        _latest=Max(timestamp_field),
+        _count=Count('pk'),
+        **counters
+    )
+    latest = state.pop('_latest')
+
+    # The same rows render differently per user (is_saved, user_reaction)
+    # and per page/query string, so both are part of the validator.
+    parts = [
+        request.user.pk or 0,
+        request.get_full_path(),
+        latest.isoformat() if latest else '',
+        sorted(state.items()),
+    ]
+    return quote_etag(hashlib.md5(repr(parts).encode()).hexdigest())
+
+
+def add_validator_headers(response, etag):
+    response.headers['ETag'] = etag
+    patch_vary_headers(response, ('Authorization', 'Cookie'))
+    return response
+
+
+def not_modified_response(request, etag):
+    """304 response if the client's If-None-Match still holds, else None"""
+    response = get_conditional_response(request, etag=etag)
+    if response is not None:
+        add_validator_headers(response, etag)
+    return response
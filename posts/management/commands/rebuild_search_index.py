@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+from posts import search
+
+
+class Command(BaseCommand):
+    help = 'Create or repair the post and resource full-text indexes and re-index every row'
+
+    def handle(self, *args, **options):
+        totals = search.rebuild(stdout=self.stdout)
+        backend = search.backend()
+        if backend is None:
+            self.stdout.write(self.style.WARNING('⚠️ No full-text backend for this database, search falls back to icontains'))
+            return
+
+        for name, total in totals.items():
+            self.stdout.write(self.style.SUCCESS(f'✅ Indexed {total} {name}s ({backend})'))
@@ -0,0 +1,26 @@
+# Full-text index for posts: tsvector + GIN on PostgreSQL, FTS5 on SQLite.
+# The structures live outside the model state and are kept current by
+# database triggers (see posts/search.py).
+
+from django.db import migrations
+
+
+def install_search_index(apps, schema_editor):
+    from posts import search
+    search.rebuild(schema_editor.connection, ['post'])
+
+
+def uninstall_search_index(apps, schema_editor):
+    from posts import search
+    search.uninstall(schema_editor.connection, ['post'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0009_message_posttombstone_and_more'),
+    ]
+
+    operations = [
+        migrations.RunPython(install_search_index, uninstall_search_index),
+    ]
@@ -0,0 +1,25 @@
+# Full-text index for users (username, first and last name), maintained by
+# triggers like the post index (see posts/search.py).
+
+from django.db import migrations
+
+
+def install_search_index(apps, schema_editor):
+    from posts import search
+    search.rebuild(schema_editor.connection, ['user'])
+
+
+def uninstall_search_index(apps, schema_editor):
+    from posts import search
+    search.uninstall(schema_editor.connection, ['user'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0010_post_search_index'),
+    ]
+
+    operations = [
+        migrations.RunPython(install_search_index, uninstall_search_index),
+    ]
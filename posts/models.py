@@ -1,6 +1,7 @@
 from django.db import models
 from django.contrib.auth.models import User
 from django.utils import timezone
+from datetime import timedelta
 from cloudinary.models import CloudinaryField
 
 class Post(models.Model):
@@ -35,6 +36,7 @@ class Post(models.Model):
         indexes = [
             models.Index(fields=['-created_at']),
             models.Index(fields=['author', '-created_at']),
+            models.Index(fields=['last_activity']),
         ]
     
     def __str__(self):
@@ -259,4 +261,48 @@ class Message(models.Model):
         ]
     
     def __str__(self):
-        return f"Message from {self.sender} to {self.recipient}"
\ No newline at end of file
+        return f"Message from {self.sender} to {self.recipient}"
+
+class PostTombstone(models.Model):
+    """Records deleted posts so delta sync can tell clients to drop them"""
+    RETENTION = timedelta(days=30)
+    
+    post_id = models.BigIntegerField()
+    deleted_at = models.DateTimeField(default=timezone.now, db_index=True)
+    
+    class Meta:
+        ordering = ['deleted_at']
+    
+    def __str__(self):
+        return f"Post {self.post_id} deleted"
+
+class SyncTombstone(models.Model):
+    """When a user last removed a reaction, save or follow, so older queued adds can't bring it back"""
+    KINDS = [
+        ('reaction', 'Reaction'),
+        ('save', 'Save'),
+        ('follow', 'Follow'),
+    ]
+    
+    # Plain ids like PostTombstone: rows are written from post_delete, which
+    # also fires while the user or post itself is being deleted.
+    user_id = models.BigIntegerField()
+    kind = models.CharField(max_length=10, choices=KINDS)
+    target_id = models.BigIntegerField()
+    deleted_at = models.DateTimeField(default=timezone.now)
+    
+    class Meta:
+        unique_together = ['user_id', 'kind', 'target_id']
+    
+    def __str__(self):
+        return f"{self.get_kind_display()} of {self.target_id} removed by user {self.user_id}"
+    
+    @classmethod
+    def record(cls, user_id, kind, removed):
+        """Upsert ``removed`` ({target_id: deleted_at}) in one query"""
+        cls.objects.bulk_create(
+            [cls(user_id=user_id, kind=kind, target_id=target, deleted_at=at) for target, at in removed.items()],
+            update_conflicts=True,
+            unique_fields=['user_id', 'kind', 'target_id'],
+            update_fields=['deleted_at'],
+        )
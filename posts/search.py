@@ -0,0 +1,618 @@
+"""
+Full-text search over posts, past-paper resources and users.
+
+Each indexed table gets, on PostgreSQL, a weighted ``tsvector`` column
+behind a GIN index and, on SQLite (local/dev), an external-content FTS5
+table. Both are maintained by database triggers, so creating or editing
+a row updates the index in the same statement. Other backends, or a
+SQLite build without FTS5, fall back to icontains scans.
+
+Resources are indexed on ``search_keywords`` too, a denormalized copy of
+their course code/name, university, module path, type and year (see
+``Resource.build_search_keywords``), so "CSC101 2024 exam" finds papers,
+and on the text extracted from their PDFs (``ResourceText``), so
+"thermodynamics 2024 entropy" does too. Users are indexed on their
+username and names for the site search page.
+"""
+import re
+from collections import Counter
+
+from django.db import connection
+from django.db.models import Q
+from django.utils.html import escape
+
+from .models import Post
+
+SEARCH_CONFIG = 'english'
+REBUILD_BATCH_SIZE = 5000
+
+# name -> table, weighted columns, rows that may appear in results
+INDEXES = {
+    'post': {
+        'table': 'posts_post',
+        'columns': [('title', 'A'), ('content', 'B')],
+        'visible': "NOT {table}.is_archived AND {table}.parent_id IS NULL",
+    },
+    'resource': {
+        'table': 'resources_resource',
+        'columns': [('title', 'A'), ('search_keywords', 'A'), ('description', 'B')],
+        # Text extracted from the PDF (resources/extraction.py)
+        'attached': {'table': 'resources_resourcetext', 'fk': 'resource_id', 'column': 'content', 'weight': 'C'},
+        'visible': "1 = 1",
+    },
+    'user': {
+        'table': 'auth_user',
+        'columns': [('username', 'A'), ('first_name', 'B'), ('last_name', 'B')],
+        'visible': "{table}.is_active",
+    },
+}
+
+# bm25 column weights matching the tsvector weights
+BM25_WEIGHTS = {'A': 10.0, 'B': 1.0, 'C': 0.5}
+
+
+def _weighted(spec, prefix='', row=None):
+    """(expression, weight) pairs for an index, attached text included"""
+    weighted = [(f'{prefix}{column}', weight) for column, weight in spec['columns']]
+    attached = spec.get('attached')
+    if attached:
+        weighted.append((
+            f"(SELECT {attached['column']} FROM {attached['table']} WHERE {attached['fk']} = {row})",
+            attached['weight'],
+        ))
+    return weighted
+
+
+def _vector_sql(weighted):
+    return ' || '.join(
+        f"setweight(to_tsvector('{SEARCH_CONFIG}', coalesce({expression}, '')), '{weight}')"
+        for expression, weight in weighted
+    )
+
+
+def _postgres_install(spec):
+    table = spec['table']
+    names = ', '.join(column for column, _ in spec['columns'])
+    statements = [
+        f"ALTER TABLE {table} ADD COLUMN IF NOT EXISTS search_vector tsvector",
+        f"""
+        CREATE OR REPLACE FUNCTION {table}_search_vector() RETURNS trigger AS $$
+        BEGIN
+            NEW.search_vector := {_vector_sql(_weighted(spec, 'NEW.', 'NEW.id'))};
+            RETURN NEW;
+        END
+        $$ LANGUAGE plpgsql
+        """,
+        f"DROP TRIGGER IF EXISTS {table}_search_vector_trg ON {table}",
+        f"""
+        CREATE TRIGGER {table}_search_vector_trg
+        BEFORE INSERT OR UPDATE OF {names} ON {table}
+        FOR EACH ROW EXECUTE FUNCTION {table}_search_vector()
+        """,
+        f"CREATE INDEX IF NOT EXISTS {table}_search_idx ON {table} USING GIN (search_vector)",
+    ]
+    attached = spec.get('attached')
+    if attached:
+        # Changes to the attached text re-index the row it belongs to
+        other, fk = attached['table'], attached['fk']
+        statements += [
+            f"""
+            CREATE OR REPLACE FUNCTION {other}_search_vector() RETURNS trigger AS $$
+            BEGIN
+                UPDATE {table} SET search_vector = {_vector_sql(_weighted(spec, f'{table}.', f'{table}.id'))}
+                WHERE id = CASE WHEN TG_OP = 'DELETE' THEN OLD.{fk} ELSE NEW.{fk} END;
+                RETURN NULL;
+            END
+            $$ LANGUAGE plpgsql
+            """,
+            f"DROP TRIGGER IF EXISTS {other}_search_vector_trg ON {other}",
+            f"""
+            CREATE TRIGGER {other}_search_vector_trg
+            AFTER INSERT OR DELETE OR UPDATE OF {attached['column']} ON {other}
+            FOR EACH ROW EXECUTE FUNCTION {other}_search_vector()
+            """,
+        ]
+    return statements
+
+
+def _postgres_uninstall(spec):
+    table = spec['table']
+    statements = [
+        f"DROP INDEX IF EXISTS {table}_search_idx",
+        f"DROP TRIGGER IF EXISTS {table}_search_vector_trg ON {table}",
+        f"DROP FUNCTION IF EXISTS {table}_search_vector()",
+        f"ALTER TABLE {table} DROP COLUMN IF EXISTS search_vector",
+    ]
+    attached = spec.get('attached')
+    if attached:
+        statements += [
+            f"DROP TRIGGER IF EXISTS {attached['table']}_search_vector_trg ON {attached['table']}",
+            f"DROP FUNCTION IF EXISTS {attached['table']}_search_vector()",
+        ]
+    return statements
+
+
+def _sqlite_install(spec):
+    # Triggers are re-created on every install because SQLite table rebuilds
+    # during later migrations silently drop them.
+    table, attached = spec['table'], spec.get('attached')
+    own = [column for column, _ in spec['columns']]
+    names = ', '.join(own + ([attached['column']] if attached else []))
+    new_values = ', '.join(expression for expression, _ in _weighted(spec, 'new.', 'new.id'))
+    old_values = ', '.join(expression for expression, _ in _weighted(spec, 'old.', 'old.id'))
+    statements = []
+
+    # With attached text the FTS content is a view joining both tables.
+    # SQLite won't rebuild either table while the view names it, so
+    # migrations altering them uninstall the index first (see resources 0007)
+    content = table
+    if attached:
+        content = f'{table}_search'
+        statements += [
+            f"DROP VIEW IF EXISTS {content}",
+            f"""
+            CREATE VIEW {content} AS
+            SELECT {table}.id, {', '.join(f'{table}.{column}' for column in own)}, {attached['table']}.{attached['column']}
+            FROM {table} LEFT JOIN {attached['table']} ON {attached['table']}.{attached['fk']} = {table}.id
+            """,
+        ]
+
+    statements += [
+        f"""
+        CREATE VIRTUAL TABLE IF NOT EXISTS {table}_fts USING fts5(
+            {names}, content='{content}', content_rowid='id', tokenize='porter unicode61'
+        )
+        """,
+        f"DROP TRIGGER IF EXISTS {table}_fts_ai",
+        f"DROP TRIGGER IF EXISTS {table}_fts_ad",
+        f"DROP TRIGGER IF EXISTS {table}_fts_au",
+        f"""
+        CREATE TRIGGER {table}_fts_ai AFTER INSERT ON {table} BEGIN
+            INSERT INTO {table}_fts(rowid, {names}) VALUES (new.id, {new_values});
+        END
+        """,
+        f"""
+        CREATE TRIGGER {table}_fts_ad AFTER DELETE ON {table} BEGIN
+            INSERT INTO {table}_fts({table}_fts, rowid, {names}) VALUES ('delete', old.id, {old_values});
+        END
+        """,
+        f"""
+        CREATE TRIGGER {table}_fts_au AFTER UPDATE OF {', '.join(own)} ON {table} BEGIN
+            INSERT INTO {table}_fts({table}_fts, rowid, {names}) VALUES ('delete', old.id, {old_values});
+            INSERT INTO {table}_fts(rowid, {names}) VALUES (new.id, {new_values});
+        END
+        """,
+    ]
+
+    if attached:
+        # FTS5 deletes must repeat the indexed values exactly, so each change
+        # to the attached text swaps the old text for the new one explicitly
+        other, fk, column = attached['table'], attached['fk'], attached['column']
+        columns = ', '.join(f'{table}.{name}' for name in own)
+
+        def reindex(row, old_text, new_text):
+            return f"""
+                INSERT INTO {table}_fts({table}_fts, rowid, {names})
+                    SELECT 'delete', {table}.id, {columns}, {old_text} FROM {table} WHERE {table}.id = {row}.{fk};
+                INSERT INTO {table}_fts(rowid, {names})
+                    SELECT {table}.id, {columns}, {new_text} FROM {table} WHERE {table}.id = {row}.{fk};
+            """
+
+        statements += [
+            f"DROP TRIGGER IF EXISTS {other}_fts_ai",
+            f"DROP TRIGGER IF EXISTS {other}_fts_ad",
+            f"DROP TRIGGER IF EXISTS {other}_fts_au",
+            f"CREATE TRIGGER {other}_fts_ai AFTER INSERT ON {other} BEGIN {reindex('new', 'NULL', f'new.{column}')} END",
+            f"CREATE TRIGGER {other}_fts_ad AFTER DELETE ON {other} BEGIN {reindex('old', f'old.{column}', 'NULL')} END",
+            f"""
+            CREATE TRIGGER {other}_fts_au AFTER UPDATE OF {column} ON {other} BEGIN
+                {reindex('new', f'old.{column}', f'new.{column}')}
+            END
+            """,
+        ]
+    return statements
+
+
+def _sqlite_uninstall(spec):
+    table = spec['table']
+    statements = [
+        f"DROP TRIGGER IF EXISTS {table}_fts_ai",
+        f"DROP TRIGGER IF EXISTS {table}_fts_ad",
+        f"DROP TRIGGER IF EXISTS {table}_fts_au",
+        f"DROP TABLE IF EXISTS {table}_fts",
+    ]
+    attached = spec.get('attached')
+    if attached:
+        statements += [
+            f"DROP TRIGGER IF EXISTS {attached['table']}_fts_ai",
+            f"DROP TRIGGER IF EXISTS {attached['table']}_fts_ad",
+            f"DROP TRIGGER IF EXISTS {attached['table']}_fts_au",
+            f"DROP VIEW IF EXISTS {table}_search",
+        ]
+    return statements
+
+
+def backend(conn=connection, name='post'):
+    """'postgresql', 'sqlite' (FTS5) or None for the icontains fallback"""
+    if conn.vendor == 'postgresql':
+        return 'postgresql'
+    if conn.vendor == 'sqlite':
+        with conn.cursor() as cursor:
+            cursor.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = %s",
+                [f"{INDEXES[name]['table']}_fts"],
+            )
+            if cursor.fetchone():
+                return 'sqlite'
+    return None
+
+
+def _table_exists(conn, table):
+    return table in conn.introspection.table_names()
+
+
+def _present(conn, spec):
+    """The spec minus attached text whose table doesn't exist (yet)"""
+    attached = spec.get('attached')
+    if attached and not _table_exists(conn, attached['table']):
+        return {key: value for key, value in spec.items() if key != 'attached'}
+    return spec
+
+
+def install(conn=connection, names=None):
+    """Create (or repair) the index structures for the current database"""
+    if conn.vendor == 'postgresql':
+        build = _postgres_install
+    elif conn.vendor == 'sqlite':
+        build = _sqlite_install
+    else:
+        return False
+
+    with conn.cursor() as cursor:
+        if conn.vendor == 'sqlite':
+            cursor.execute("SELECT sqlite_compileoption_used('ENABLE_FTS5')")
+            if not cursor.fetchone()[0]:
+                return False
+        for name in names or INDEXES:
+            for sql in build(_present(conn, INDEXES[name])):
+                cursor.execute(sql)
+    return True
+
+
+def uninstall(conn=connection, names=None):
+    build = {'postgresql': _postgres_uninstall, 'sqlite': _sqlite_uninstall}.get(conn.vendor)
+    if build is None:
+        return
+    with conn.cursor() as cursor:
+        for name in names or INDEXES:
+            for sql in build(_present(conn, INDEXES[name])):
+                cursor.execute(sql)
+
+
+def rebuild(conn=connection, names=None, stdout=None):
+    """Re-index every row. Returns {index name: rows indexed}."""
+    names = names or list(INDEXES)
+    if not install(conn, names):
+        return {}
+
+    totals = {}
+    with conn.cursor() as cursor:
+        for name in names:
+            spec = _present(conn, INDEXES[name])
+            table = spec['table']
+            cursor.execute(f"SELECT count(*), coalesce(max(id), 0) FROM {table}")
+            totals[name], max_id = cursor.fetchone()
+
+            if conn.vendor == 'sqlite':
+                cursor.execute(f"INSERT INTO {table}_fts({table}_fts) VALUES ('rebuild')")
+                continue
+
+            # Batches by id keep each UPDATE's lock footprint small
+            for start in range(0, max_id + 1, REBUILD_BATCH_SIZE):
+                cursor.execute(
+                    f"UPDATE {table} SET search_vector = {_vector_sql(_weighted(spec, row=f'{table}.id'))} "
+                    f"WHERE id >= %s AND id < %s",
+                    [start, start + REBUILD_BATCH_SIZE],
+                )
+                if stdout:
+                    stdout.write(f'Indexed {table} up to id {min(start + REBUILD_BATCH_SIZE, max_id)}')
+    return totals
+
+
+def fts5_query(query):
+    """Turn free text into a safe FTS5 expression: every word, prefix-matched"""
+    words = re.findall(r'\w+', query)
+    return ' '.join(f'"{word}"*' for word in words)
+
+
+def normalize_query(query):
+    return ' '.join(re.findall(r'\w+', (query or '').lower()))
+
+
+def match_sql(name, query, conn=connection):
+    """
+    ``(joins, where, params, rank)`` selecting matching rows of one index.
+
+    ``joins`` is a FROM clause over the indexed table, ``where`` its match
+    condition and ``rank`` an expression where lower is better on every
+    backend.
+    """
+    spec = INDEXES[name]
+    table = spec['table']
+    visible = spec['visible'].format(table=table)
+    if conn.vendor == 'postgresql':
+        return (
+            f"FROM {table} CROSS JOIN websearch_to_tsquery('{SEARCH_CONFIG}', %s) AS query",
+            f"WHERE {table}.search_vector @@ query AND {visible}",
+            [query],
+            f"-ts_rank({table}.search_vector, query)",
+        )
+    weights = ', '.join(str(BM25_WEIGHTS[weight]) for _, weight in _weighted(spec))
+    return (
+        f"FROM {table}_fts JOIN {table} ON {table}.id = {table}_fts.rowid",
+        f"WHERE {table}_fts MATCH %s AND {visible}",
+        [fts5_query(query)],
+        f"bm25({table}_fts, {weights})",
+    )
+
+
+class PostSearchResults:
+    """
+    Ranked, lazily-paginated search results.
+
+    Supports ``count()`` and slicing, so Django's Paginator and DRF's
+    pagination classes can page through it; each page costs one ranked id
+    query plus one query for the posts themselves.
+    """
+
+    def __init__(self, query, queryset=None):
+        self.query = query.strip()
+        self.queryset = queryset if queryset is not None else Post.objects.select_related('author', 'author__activity')
+        self.backend = backend()
+        self._count = None
+
+    def _fallback(self):
+        return self.queryset.filter(
+            Q(title__icontains=self.query) | Q(content__icontains=self.query),
+            is_archived=False, parent=None
+        ).order_by('-created_at')
+
+    def _empty(self):
+        return not self.query or (self.backend == 'sqlite' and not fts5_query(self.query))
+
+    def count(self):
+        if self._count is None:
+            if self._empty():
+                self._count = 0
+            elif self.backend is None:
+                self._count = self._fallback().count()
+            else:
+                joins, where, params, rank = match_sql('post', self.query)
+                with connection.cursor() as cursor:
+                    cursor.execute(f"SELECT count(*) {joins} {where}", params)
+                    self._count = cursor.fetchone()[0]
+        return self._count
+
+    def __len__(self):
+        return self.count()
+
+    def __getitem__(self, key):
+        if not isinstance(key, slice):
+            return self[key:key + 1][0]
+        start = key.start or 0
+        stop = key.stop if key.stop is not None else self.count()
+        if self._empty() or stop <= start:
+            return []
+        if self.backend is None:
+            return list(self._fallback()[start:stop])
+
+        joins, where, params, rank = match_sql('post', self.query)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"SELECT posts_post.id {joins} {where} ORDER BY {rank}, posts_post.created_at DESC LIMIT %s OFFSET %s",
+                params + [stop - start, start],
+            )
+            ids = [row[0] for row in cursor.fetchall()]
+
+        posts = self.queryset.in_bulk(ids)
+        return [posts[pk] for pk in ids if pk in posts]
+
+
+def search_users(query, limit=10):
+    """Active users matching ``query`` on username or name, best first"""
+    from django.contrib.auth.models import User
+
+    query = query.strip()
+    engine = backend(name='user')
+    if not query or (engine == 'sqlite' and not fts5_query(query)):
+        return []
+    if engine is None:
+        return list(User.objects.filter(
+            Q(username__icontains=query) | Q(first_name__icontains=query) | Q(last_name__icontains=query),
+            is_active=True
+        ).order_by('username')[:limit])
+
+    joins, where, params, rank = match_sql('user', query)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"SELECT auth_user.id {joins} {where} ORDER BY {rank}, auth_user.username LIMIT %s",
+            params + [limit],
+        )
+        ids = [row[0] for row in cursor.fetchall()]
+    users = User.objects.select_related('activity').in_bulk(ids)
+    return [users[pk] for pk in ids if pk in users]
+
+
+class UnifiedSearchResults:
+    """
+    One ranked result list over posts and resources.
+
+    Both indexes are queried in a single UNION ALL ordered by a common
+    rank. ``filters`` narrows resources by facet (university, course,
+    year_level, academic_year, resource_type); any facet, or
+    ``kind='resource'``, leaves posts out. Pages are lists of
+    ``(kind, id)``; ``facets()`` counts matching resources per facet value.
+    Without a full-text backend, results fall back to icontains scans
+    ordered newest first, resources before posts.
+    """
+    KINDS = ('post', 'resource')
+    FACETS = ('university', 'course', 'year_level', 'academic_year', 'resource_type')
+    FACET_SAMPLE = 5000
+
+    def __init__(self, query, kind=None, filters=None):
+        self.query = query.strip()
+        self.filters = {key: value for key, value in (filters or {}).items() if key in self.FACETS and value not in (None, '')}
+        self.kinds = [kind] if kind in self.KINDS else list(self.KINDS)
+        if self.filters and 'post' in self.kinds:
+            self.kinds.remove('post')
+        self.backend = backend(name='resource') and backend(name='post')
+        self._count = None
+
+    def _empty(self):
+        return not self.kinds or not fts5_query(self.query)
+
+    def _fallback(self):
+        from resources.models import Resource
+        lookups = {
+            'university': 'university__code', 'course': 'course__code', 'year_level': 'year_level',
+            'academic_year': 'academic_year', 'resource_type': 'resource_type__name',
+        }
+        querysets = []
+        if 'resource' in self.kinds:
+            querysets.append(('resource', Resource.objects.filter(
+                Q(title__icontains=self.query) | Q(description__icontains=self.query)
+                | Q(search_keywords__icontains=self.query) | Q(extracted_text__content__icontains=self.query),
+                **{lookups[key]: value for key, value in self.filters.items()}
+            ).order_by('-uploaded_at')))
+        if 'post' in self.kinds:
+            querysets.append(('post', PostSearchResults(self.query)._fallback()))
+        return querysets
+
+    def _resource_filters(self):
+        clauses, params = [], []
+        lookups = {
+            'university': "resources_resource.university_id IN (SELECT id FROM resources_university WHERE code = %s)",
+            'course': "resources_resource.course_id IN (SELECT id FROM resources_course WHERE code = %s)",
+            'year_level': "resources_resource.year_level = %s",
+            'academic_year': "resources_resource.academic_year = %s",
+            'resource_type': "resources_resource.resource_type_id IN (SELECT id FROM resources_resourcetype WHERE name = %s)",
+        }
+        for key, value in self.filters.items():
+            clauses.append(lookups[key])
+            params.append(value)
+        return ''.join(f' AND {clause}' for clause in clauses), params
+
+    def _union_sql(self):
+        parts, params = [], []
+        for name in self.kinds:
+            joins, where, match_params, rank = match_sql(name, self.query)
+            table = INDEXES[name]['table']
+            if name == 'resource':
+                extra, extra_params = self._resource_filters()
+                where, match_params = where + extra, match_params + extra_params
+            parts.append(f"SELECT '{name}' AS kind, {table}.id AS id, {rank} AS rank {joins} {where}")
+            params += match_params
+        return ' UNION ALL '.join(parts), params
+
+    def count(self):
+        if self._count is None:
+            if self._empty():
+                self._count = 0
+            elif self.backend is None:
+                self._count = sum(queryset.count() for kind, queryset in self._fallback())
+            else:
+                sql, params = self._union_sql()
+                with connection.cursor() as cursor:
+                    cursor.execute(f"SELECT count(*) FROM ({sql}) AS matches", params)
+                    self._count = cursor.fetchone()[0]
+        return self._count
+
+    def __len__(self):
+        return self.count()
+
+    def __getitem__(self, key):
+        if not isinstance(key, slice):
+            return self[key:key + 1][0]
+        start = key.start or 0
+        stop = key.stop if key.stop is not None else self.count()
+        if self._empty() or stop <= start:
+            return []
+        if self.backend is None:
+            page, offset, limit = [], start, stop - start
+            for kind, queryset in self._fallback():
+                ids = list(queryset.values_list('pk', flat=True)[offset:offset + limit])
+                page += [(kind, pk) for pk in ids]
+                limit -= len(ids)
+                if not limit:
+                    break
+                # Exhausted this kind: the page continues at the next one
+                offset = 0 if ids else max(offset - queryset.count(), 0)
+            return page
+
+        sql, params = self._union_sql()
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"SELECT kind, id FROM ({sql}) AS matches ORDER BY rank, kind, id DESC LIMIT %s OFFSET %s",
+                params + [stop - start, start],
+            )
+            return [(kind, pk) for kind, pk in cursor.fetchall()]
+
+    def facets(self):
+        """{facet: {value: count}} over (up to FACET_SAMPLE) matching resources"""
+        counts = {facet: Counter() for facet in self.FACETS}
+        if self._empty() or 'resource' not in self.kinds or self.backend is None:
+            return {facet: {} for facet in self.FACETS}
+
+        joins, where, params, rank = match_sql('resource', self.query)
+        extra, extra_params = self._resource_filters()
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"""
+                SELECT resources_university.code, resources_course.code, resources_resource.year_level,
+                       resources_resource.academic_year, resources_resourcetype.name
+                {joins}
+                JOIN resources_university ON resources_university.id = resources_resource.university_id
+                JOIN resources_course ON resources_course.id = resources_resource.course_id
+                JOIN resources_resourcetype ON resources_resourcetype.id = resources_resource.resource_type_id
+                {where}{extra}
+                LIMIT %s
+                """,
+                params + extra_params + [self.FACET_SAMPLE],
+            )
+            for row in cursor.fetchall():
+                for facet, value in zip(self.FACETS, row):
+                    counts[facet][value] += 1
+        return {facet: dict(counter.most_common()) for facet, counter in counts.items()}
+
+
+def highlight_pages(content, query, limit=3, width=80):
+    """
+    Pages of extracted text (form-feed separated) that mention the query,
+    best first, as ``{'page': n, 'snippet': html}`` with ``<mark>`` hits.
+    """
+    words = re.findall(r'\w+', query.lower())
+    if not words or not content:
+        return []
+    # Prefix match, like the FTS query, so "entrop" marks "entropy"
+    pattern = re.compile(r'\b(' + '|'.join(re.escape(word) for word in words) + r')\w*', re.IGNORECASE)
+
+    pages = []
+    for number, text in enumerate(content.split('\f'), start=1):
+        hits = list(pattern.finditer(text))
+        if hits:
+            distinct = len({hit.group(1).lower() for hit in hits})
+            pages.append((distinct, len(hits), number, text, hits[0]))
+    pages.sort(key=lambda page: (-page[0], -page[1], page[2]))
+
+    highlights = []
+    for _, _, number, text, first in pages[:limit]:
+        start, end = max(first.start() - width, 0), first.end() + width
+        # Mark hits with control characters first so escaping can't split them
+        snippet = pattern.sub(lambda hit: f'\0{hit.group(0)}\1', text[start:end])
+        snippet = escape(snippet).replace('\0', '<mark>').replace('\1', '</mark>')
+        if start:
+            snippet = '…' + snippet
+        if end < len(text):
+            snippet += '…'
+        highlights.append({'page': number, 'snippet': snippet})
+    return highlights
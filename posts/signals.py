@@ -0,0 +1,82 @@
+from django.contrib.auth.models import User
+from django.db.models import QuerySet
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from django.utils import timezone
+from rest_framework.authtoken.models import Token
+from resources.models import Course, University
+from .authentication import invalidate_token
+from . import typeahead
+from .models import Post, Comment, Reaction, CommentReaction, PostSave, PostTombstone, Follow, SyncTombstone
+
+
+def touch_posts(post_ids):
+    """Bump last_activity so feed validators (ETags) change"""
+    Post.objects.filter(pk__in=post_ids).update(last_activity=timezone.now())
+
+
+def skip_touch(origin):
+    # Nothing to bump when the post itself is being deleted; bulk queryset
+    # deletes (like bulk_create) leave touching the posts to the caller.
+    return isinstance(origin, (Post, QuerySet))
+
+
+@receiver([post_save, post_delete], sender=Comment)
+@receiver([post_save, post_delete], sender=Reaction)
+@receiver([post_save, post_delete], sender=PostSave)
+def post_child_changed(sender, instance, origin=None, **kwargs):
+    if skip_touch(origin):
+        return
+    touch_posts([instance.post_id])
+
+
+@receiver([post_save, post_delete], sender=CommentReaction)
+def comment_reaction_changed(sender, instance, origin=None, **kwargs):
+    if skip_touch(origin) or isinstance(origin, Comment):
+        return
+    Post.objects.filter(comments=instance.comment_id).update(last_activity=timezone.now())
+
+
+@receiver(post_delete, sender=Post)
+def post_deleted(sender, instance, **kwargs):
+    now = timezone.now()
+    PostTombstone.objects.create(post_id=instance.pk, deleted_at=now)
+    PostTombstone.objects.filter(deleted_at__lt=now - PostTombstone.RETENTION).delete()
+
+
+@receiver(post_delete, sender=Reaction)
+@receiver(post_delete, sender=PostSave)
+@receiver(post_delete, sender=Follow)
+def sync_target_removed(sender, instance, origin=None, **kwargs):
+    # Lets SyncView ignore queued adds older than this removal. Nothing to
+    # record when the post or user goes too; SyncView's own queryset deletes
+    # record the time of the queued action instead of now.
+    if isinstance(origin, (Post, User, QuerySet)):
+        return
+    if sender is Follow:
+        user_id, kind, target_id = instance.follower_id, 'follow', instance.following_id
+    else:
+        user_id, kind, target_id = instance.user_id, 'reaction' if sender is Reaction else 'save', instance.post_id
+    SyncTombstone.record(user_id, kind, {target_id: timezone.now()})
+
+
+@receiver([post_save, post_delete], sender=Token)
+def token_changed(sender, instance, **kwargs):
+    invalidate_token(instance.key)
+
+
+@receiver(post_save, sender=User)
+def user_changed(sender, instance, update_fields=None, **kwargs):
+    # Logging in only touches last_login, which cached tokens don't care about
+    if update_fields is not None and set(update_fields) == {'last_login'}:
+        return
+    for key in Token.objects.filter(user=instance).values_list('key', flat=True):
+        invalidate_token(key)
+    typeahead.mark_stale()
+
+
+@receiver(post_delete, sender=User)
+@receiver([post_save, post_delete], sender=Course)
+@receiver([post_save, post_delete], sender=University)
+def typeahead_source_changed(sender, **kwargs):
+    typeahead.mark_stale()
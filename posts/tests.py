@@ -1,3 +1,392 @@
-from django.test import TestCase
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import connection
+from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from resources.models import University, Course, ResourceType, Resource, ResourceText
+from . import search, typeahead
+from .api import PostViewSet
+from .authentication import CachedTokenAuthentication, token_cache_key
+from .models import Post, PostTombstone
+
+# Pages render {% static %} without a collectstatic manifest
+PLAIN_STORAGES = {
+    'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+    'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'},
+}
+
+
+class APITestCase(TestCase):
+    """Two users with a few posts, and an API client logged in as the first"""
+
+    def setUp(self):
+        cache.clear()
+        self.alice = User.objects.create_user('alice', 'alice@example.com', 'pw')
+        self.bob = User.objects.create_user('bob', 'bob@example.com', 'pw')
+        self.posts = [
+            Post.objects.create(author=author, title=f'Post {i}', content='Past paper swap')
+            for i, author in enumerate([self.alice, self.bob, self.bob])
+        ]
+        self.client = APIClient()
+        self.client.force_authenticate(self.alice)
+
+
+# ==================== SIDE-LOADING ====================
+
+class SideloadTests(APITestCase):
+    def test_authors_collapse_to_ids_with_a_users_map(self):
+        response = self.client.get('/api/posts/?sideload=users')
+        self.assertEqual(response.status_code, 200)
+        authors = {post['author'] for post in response.data['results']}
+        self.assertEqual(authors, {self.alice.pk, self.bob.pk})
+        self.assertEqual(set(response.data['users']), {str(self.alice.pk), str(self.bob.pk)})
+        self.assertEqual(response.data['users'][str(self.bob.pk)]['username'], 'bob')
+
+    def test_users_are_nested_without_sideload(self):
+        response = self.client.get('/api/posts/')
+        self.assertNotIn('users', response.data)
+        self.assertEqual(response.data['results'][0]['author']['username'], 'bob')
+
+
+# ==================== CONDITIONAL GET ====================
+
+class ConditionalGetTests(APITestCase):
+    def test_matching_etag_gets_304(self):
+        etag = self.client.get('/api/posts/')['ETag']
+        response = self.client.get('/api/posts/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+
+    def test_delete_changes_the_etag(self):
+        etag = self.client.get('/api/posts/')['ETag']
+        self.posts[0].delete()
+        response = self.client.get('/api/posts/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertEqual(response.data['count'], 2)
+
+    def test_lists_send_no_last_modified(self):
+        # Deletes don't move the newest timestamp, so If-Modified-Since can't be trusted
+        response = self.client.get('/api/posts/')
+        self.assertFalse(response.has_header('Last-Modified'))
+        response = self.client.get('/api/posts/', HTTP_IF_MODIFIED_SINCE='Fri, 01 Jan 2100 00:00:00 GMT')
+        self.assertEqual(response.status_code, 200)
+
+    def test_etag_is_per_user(self):
+        etag = self.client.get('/api/posts/')['ETag']
+        self.client.force_authenticate(self.bob)
+        self.assertEqual(self.client.get('/api/posts/', HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+
+# ==================== BATCH ====================
+
+class BatchTests(APITestCase):
+    def batch(self, *requests, **extra):
+        response = self.client.post('/api/batch/', {'requests': list(requests)}, format='json', **extra)
+        self.assertEqual(response.status_code, 200)
+        return response.data['responses']
+
+    def test_runs_each_request_in_order(self):
+        feed, react = self.batch(
+            {'id': 'feed', 'path': '/api/posts/'},
+            {'method': 'POST', 'path': f'/api/posts/{self.posts[1].pk}/react/', 'body': {'reaction_type': 'like'}},
+        )
+        self.assertEqual((feed['id'], feed['status']), ('feed', 200))
+        self.assertEqual(feed['body']['count'], 3)
+        self.assertEqual(react['status'], 200)
+        self.assertTrue(self.posts[1].reactions.filter(user=self.alice).exists())
+
+    def test_failing_item_does_not_fail_the_batch(self):
+        with mock.patch.object(PostViewSet, 'list', side_effect=RuntimeError('boom')), \
+                self.assertLogs('posts.api', 'ERROR'):
+            failed, ok = self.batch({'path': '/api/posts/'}, {'path': '/api/messages/'})
+        self.assertEqual(failed['status'], 500)
+        self.assertEqual(ok['status'], 200)
+
+    def test_only_api_views_can_be_batched(self):
+        page, admin, logout, nested, missing = self.batch(
+            {'path': '/notifications/count/'},
+            {'path': '/admin/'},
+            {'method': 'POST', 'path': '/api/logout/'},
+            {'method': 'POST', 'path': '/api/batch/'},
+            {'path': '/nope/'},
+        )
+        self.assertEqual([page['status'], logout['status'], nested['status']], [400, 400, 400])
+        self.assertEqual([admin['status'], missing['status']], [404, 404])
+
+    def test_batch_validators_are_not_forwarded(self):
+        etag = self.client.get('/api/posts/')['ETag']
+        feed, = self.batch({'path': '/api/posts/'}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(feed['status'], 200)
+        # A validator sent on the item itself still applies
+        feed, = self.batch({'path': '/api/posts/', 'headers': {'If-None-Match': etag}})
+        self.assertEqual(feed['status'], 304)
+
+
+# ==================== OFFLINE SYNC ====================
+
+class SyncTests(APITestCase):
+    def sync(self, *actions):
+        response = self.client.post('/api/sync/', {'actions': list(actions)}, format='json')
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def test_last_queued_action_wins(self):
+        post = self.posts[1]
+        state = self.sync(
+            {'type': 'save', 'post': post.pk, 'at': '2024-05-01T10:00:00Z'},
+            {'type': 'unsave', 'post': post.pk, 'at': '2024-05-01T10:05:00Z'},
+            {'type': 'react', 'post': post.pk, 'reaction_type': 'love', 'at': '2024-05-01T10:01:00Z'},
+        )
+        self.assertEqual(state['posts'][str(post.pk)], {'reaction': 'love', 'saved': False, 'reaction_counts': {'love': 1}})
+
+    def test_newer_server_change_beats_older_queued_action(self):
+        post = self.posts[1]
+        self.client.post(f'/api/posts/{post.pk}/react/', {'reaction_type': 'like'}, format='json')
+        state = self.sync({'type': 'unreact', 'post': post.pk, 'at': '2024-05-01T10:00:00Z'})
+        self.assertEqual(state['posts'][str(post.pk)]['reaction'], 'like')
+
+    def test_older_queued_add_does_not_undo_a_later_removal(self):
+        post = self.posts[1]
+        # Phone saves at 10:00 but stays offline; the laptop saves and unsaves
+        self.sync({'type': 'save', 'post': post.pk, 'at': '2024-05-01T10:01:00Z'})
+        self.sync({'type': 'unsave', 'post': post.pk, 'at': '2024-05-01T10:02:00Z'})
+        state = self.sync({'type': 'save', 'post': post.pk, 'at': '2024-05-01T10:00:00Z'})
+        self.assertFalse(state['posts'][str(post.pk)]['saved'])
+        
+        # Newer adds still go through
+        state = self.sync({'type': 'save', 'post': post.pk, 'at': '2024-05-01T10:03:00Z'})
+        self.assertTrue(state['posts'][str(post.pk)]['saved'])
+    
+    def test_online_removal_beats_older_queued_add(self):
+        self.client.post(f'/api/users/{self.bob.pk}/follow/')
+        self.client.post(f'/api/users/{self.bob.pk}/follow/')
+        state = self.sync({'type': 'follow', 'user': self.bob.pk, 'at': '2024-05-01T10:00:00Z'})
+        self.assertEqual(state['following'], {str(self.bob.pk): False})
+    
+    def test_replaying_a_queue_is_harmless(self):
+        action = {'type': 'follow', 'user': self.bob.pk, 'at': '2024-05-01T10:00:00Z'}
+        self.sync(action)
+        state = self.sync(action)
+        self.assertEqual(state['following'], {str(self.bob.pk): True})
+        self.assertEqual(self.alice.following.count(), 1)
+
+    def test_bad_items_are_reported_without_failing_the_rest(self):
+        post = self.posts[1]
+        state = self.sync(
+            {'type': 'save', 'post': post.pk, 'at': '2024-13-01T00:00:00Z'},
+            {'type': 'save', 'post': post.pk, 'at': 'yesterday'},
+            {'type': 'dance', 'post': post.pk},
+            {'type': 'save', 'post': 999999},
+            {'type': 'react', 'post': post.pk, 'reaction_type': 'like'},
+        )
+        self.assertEqual(
+            [error.get('index', error.get('target')) for error in state['errors']], [0, 1, 2, 999999]
+        )
+        self.assertEqual(state['posts'][str(post.pk)]['reaction'], 'like')
+        self.assertFalse(state['posts'][str(post.pk)]['saved'])
+
+
+# ==================== DELTA SYNC ====================
+
+class ChangesTests(APITestCase):
+    def test_reports_created_updated_and_deleted_posts(self):
+        token = self.client.get('/api/posts/changes/').data['token']
+        new = Post.objects.create(author=self.bob, title='New post')
+        self.client.post(f'/api/posts/{self.posts[2].pk}/react/', {'reaction_type': 'wow'}, format='json')
+        deleted = self.posts[1].pk
+        self.posts[1].delete()
+
+        changes = self.client.get(f'/api/posts/changes/?since={token}').data
+        self.assertIn(new.pk, changes['created'])
+        self.assertIn(self.posts[2].pk, changes['updated'] + changes['created'])
+        self.assertEqual(changes['counters'][str(self.posts[2].pk)]['reaction_counts'], {'wow': 1})
+        self.assertEqual(changes['deleted'], [deleted])
+        self.assertFalse(changes['has_more'])
+
+    def test_archived_posts_are_listed_apart(self):
+        token = self.client.get('/api/posts/changes/').data['token']
+        Post.objects.filter(pk=self.posts[0].pk).update(is_archived=True, last_activity=timezone.now())
+        changes = self.client.get(f'/api/posts/changes/?since={token}').data
+        self.assertEqual(changes['archived'], [self.posts[0].pk])
+
+    def test_pages_through_posts_sharing_one_timestamp(self):
+        token = self.client.get('/api/posts/changes/').data['token']
+        Post.objects.bulk_create([Post(author=self.bob, title=f'Bulk {i}') for i in range(5)])
+        # As touch_posts() does: one UPDATE, one timestamp for every row
+        Post.objects.update(last_activity=timezone.now())
+
+        seen = []
+        with mock.patch.object(PostViewSet, 'changes_limit', 3):
+            for _ in range(5):
+                changes = self.client.get(f'/api/posts/changes/?since={token}').data
+                seen += changes['created'] + changes['updated']
+                token = changes['token']
+                if not changes['has_more']:
+                    break
+        self.assertFalse(changes['has_more'])
+        self.assertEqual(sorted(seen), sorted(Post.objects.values_list('pk', flat=True)))
+
+    def test_tokens_older_than_the_tombstones_reset(self):
+        stale = (timezone.now() - PostTombstone.RETENTION - timedelta(days=1)).timestamp()
+        changes = self.client.get(f'/api/posts/changes/?since={int(stale * 1_000_000)}').data
+        self.assertTrue(changes['reset'])
+        self.assertEqual(self.client.get('/api/posts/changes/?since=soon').status_code, 400)
+
+
+# ==================== TOKEN AUTHENTICATION ====================
+
+@override_settings(TOKEN_CACHE_TIMEOUT=300)
+class TokenAuthTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.token = Token.objects.create(user=self.alice)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+
+    def test_cached_token_authenticates(self):
+        self.assertEqual(self.client.get('/api/messages/').status_code, 200)
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.client.get('/api/messages/').status_code, 200)
+        self.assertFalse([query for query in queries if 'authtoken_token' in query['sql']])
+
+    def test_logout_revokes_the_cached_token(self):
+        self.assertEqual(self.client.get('/api/messages/').status_code, 200)
+        self.assertEqual(self.client.post('/api/logout/').status_code, 200)
+        self.assertEqual(self.client.get('/api/messages/').status_code, 401)
+
+    def test_cache_holds_no_user_and_requests_get_their_own(self):
+        backend = CachedTokenAuthentication()
+        first, _ = backend.authenticate_credentials(self.token.key)
+        self.assertEqual(cache.get(token_cache_key(self.token.key)), (self.alice.pk, True))
+        second, token = backend.authenticate_credentials(self.token.key)
+        self.assertIsNot(first, second)
+        self.assertEqual((second.pk, token.key), (self.alice.pk, self.token.key))
+        # The rest of the user loads on demand
+        self.assertEqual(second.username, 'alice')
+
+    def test_unknown_token_is_rejected(self):
+        self.client.credentials(HTTP_AUTHORIZATION='Token nope')
+        self.assertEqual(self.client.get('/api/messages/').status_code, 401)
+
+
+# ==================== SEARCH ====================
+
+class PostSearchTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        if search.backend() is None:
+            self.skipTest('no full-text index on this database')
+        self.thermo = Post.objects.create(author=self.bob, title='Thermodynamics notes', content='Entropy and enthalpy')
+        Post.objects.create(author=self.bob, title='Lunch', content='Anyone for thermodynamics revision later?')
+        Post.objects.create(author=self.alice, title='Archived thermodynamics', is_archived=True)
+
+    def test_ranks_title_matches_first(self):
+        response = self.client.get('/api/posts/search/?q=thermodynamics')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['count'], 2)
+        self.assertEqual(response.data['results'][0]['id'], self.thermo.pk)
+
+    def test_matches_word_prefixes_and_new_edits(self):
+        self.assertEqual(self.client.get('/api/posts/search/?q=entrop').data['count'], 1)
+        Post.objects.filter(pk=self.posts[0].pk).update(content='Entropy cheat sheet')
+        self.assertEqual(self.client.get('/api/posts/search/?q=entrop').data['count'], 2)
+
+    def test_punctuation_is_not_query_syntax(self):
+        response = self.client.get('/api/posts/search/?q="thermo* AND (')
+        self.assertEqual(response.status_code, 200)
+
+    @override_settings(STORAGES=PLAIN_STORAGES)
+    def test_site_search_matches_people_and_their_posts(self):
+        User.objects.filter(pk=self.bob.pk).update(first_name='Robert', last_name='Molefe')
+        User.objects.create_user('molefe_old', is_active=False)
+        response = Client().get('/search/?q=molefe')
+        self.assertEqual(response.status_code, 200)
+        self.assertTemplateUsed(response, 'posts/search.html')
+        self.assertEqual(response.context['users'], [self.bob])
+        self.assertEqual({post.author_id for post in response.context['posts']}, {self.bob.pk})
+        self.assertEqual(len(response.context['posts']), 4)
+        self.assertContains(response, 'Robert Molefe')
+        self.assertContains(response, 'Thermodynamics notes')
+
+
+class UnifiedSearchTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        if search.backend(name='resource') is None:
+            self.skipTest('no full-text index on this database')
+        university = University.objects.create(name='University of Botswana', code='ub')
+        course = Course.objects.create(university=university, code='PHY201', name='Thermal Physics')
+        exam = ResourceType.objects.create(name='Exam')
+        self.paper = Resource.objects.create(
+            university=university, course=course, resource_type=exam, title='Final paper',
+            year_level=2, academic_year=2024, file='resources/final.pdf',
+        )
+        ResourceText.objects.create(
+            resource=self.paper, source_name='resources/final.pdf', page_count=2,
+            content='Question 1: kinetics\fQuestion 2: entropy of an ideal gas',
+        )
+
+    def test_finds_papers_by_course_and_pdf_text(self):
+        response = self.client.get('/api/search/?q=phy201 2024')
+        self.assertEqual([hit['resource']['id'] for hit in response.data['results']], [self.paper.pk])
+
+        hit, = self.client.get('/api/search/?q=entropy&type=resource').data['results']
+        self.assertEqual(hit['highlights'][0]['page'], 2)
+        self.assertIn('<mark>entropy</mark>', hit['highlights'][0]['snippet'])
+
+    def test_facets_and_filters(self):
+        response = self.client.get('/api/search/?q=final')
+        self.assertEqual(response.data['facets']['course'], {'PHY201': 1})
+        self.assertEqual(self.client.get('/api/search/?q=final&academic_year=2023').data['count'], 0)
+        self.assertEqual(self.client.get('/api/search/?q=final&year_level=x').status_code, 400)
+
+    @override_settings(STORAGES=PLAIN_STORAGES)
+    def test_site_search_lists_papers(self):
+        response = Client().get('/search/?q=entropy')
+        self.assertEqual(response.context['resources'], [self.paper])
+        self.assertContains(response, f'/resources/view/{self.paper.pk}/')
+
+
+# ==================== TYPEAHEAD ====================
+
+class TypeaheadTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        typeahead._index = None
+        self.ub = University.objects.create(name='University of Botswana', code='ub')
+        self.course = Course.objects.create(university=self.ub, code='CSC101', name='Thermodynamics')
+
+    def suggest(self, query, client=None, **params):
+        response = (client or self.client).get('/api/typeahead/', {'q': query, **params})
+        self.assertEqual(response.status_code, 200)
+        return [(hit['type'], hit['label']) for hit in response.data['results']]
+
+    def test_prefixes(self):
+        self.assertEqual(self.suggest('ali')[0], ('user', 'alice'))
+        self.assertEqual(self.suggest('csc 101', types='course'), [('course', 'CSC101 - Thermodynamics')])
+        self.assertEqual(self.suggest('botsw'), [('university', 'University of Botswana')])
+
+    def test_fuzzy_matches(self):
+        self.assertEqual(self.suggest('thermodynamcs'), [('course', 'CSC101 - Thermodynamics')])
+
+    def test_changes_rebuild_the_index(self):
+        self.assertEqual(self.suggest('physics'), [])
+        Course.objects.create(university=self.ub, code='PHY201', name='Physics')
+        # Within the minimum interval the built index keeps answering
+        self.assertEqual(self.suggest('physics'), [])
+        with mock.patch.object(typeahead, 'TYPEAHEAD_MIN_REBUILD_INTERVAL', 0):
+            self.assertEqual(self.suggest('physics'), [('course', 'PHY201 - Physics')])
+
+    def test_usernames_are_for_signed_in_users(self):
+        anonymous = APIClient()
+        self.assertEqual(self.suggest('ali', client=anonymous), [])
+        self.assertEqual(self.suggest('ali', client=anonymous, types='user'), [])
+        self.assertEqual(self.suggest('csc', client=anonymous), [('course', 'CSC101 - Thermodynamics')])
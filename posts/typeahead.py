@@ -0,0 +1,167 @@
+"""
+In-memory typeahead over usernames, courses and universities.
+
+Each process keeps a sorted list of word-prefix keys (answered with
+bisect) plus a trigram posting list for fuzzy matches such as "thermo
+dynamcs". The index is rebuilt lazily, with three narrow queries, when a
+User/Course/University change has bumped the shared version key.
+"""
+import bisect
+import re
+import threading
+import time
+import unicodedata
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.urls import reverse
+
+from resources.models import Course, University
+
+TYPEAHEAD_VERSION_KEY = 'typeahead_version'
+# Milliseconds a single lookup may spend scanning before it answers
+TYPEAHEAD_BUDGET_MS = getattr(settings, 'TYPEAHEAD_BUDGET_MS', 15)
+# Minimum seconds between rebuilds, so bursts of saves cost one rebuild
+TYPEAHEAD_MIN_REBUILD_INTERVAL = getattr(settings, 'TYPEAHEAD_MIN_REBUILD_INTERVAL', 5)
+TRIGRAM_THRESHOLD = 0.6
+
+TYPES = ('user', 'course', 'university')
+
+
+def normalize(text):
+    text = unicodedata.normalize('NFKD', text or '').encode('ascii', 'ignore').decode()
+    return ' '.join(re.findall(r'[a-z0-9]+', text.lower()))
+
+
+def trigrams(text):
+    padded = f'  {text} '
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def mark_stale():
+    """Called from signals whenever an indexed row changes"""
+    cache.set(TYPEAHEAD_VERSION_KEY, time.time(), None)
+
+
+class TypeaheadIndex:
+    def __init__(self, entries):
+        # entries: (type, id, label, detail, url, [search texts])
+        self.entries = entries
+        self.keys = []
+        self.postings = {}
+        self.trigram_counts = []
+
+        for index, (kind, pk, label, detail, url, texts) in enumerate(entries):
+            grams = set()
+            for text in texts:
+                text = normalize(text)
+                if not text:
+                    continue
+                words = text.split()
+                for start in range(len(words)):
+                    self.keys.append((' '.join(words[start:]), 0 if start == 0 else 1, index))
+                compact = text.replace(' ', '')
+                if compact != text:
+                    self.keys.append((compact, 0, index))
+                grams |= trigrams(text)
+            for gram in grams:
+                self.postings.setdefault(gram, []).append(index)
+            self.trigram_counts.append(len(grams))
+        self.keys.sort()
+
+    @classmethod
+    def build(cls):
+        entries = []
+        for pk, username in User.objects.filter(is_active=True).values_list('pk', 'username'):
+            entries.append(('user', pk, username, None, None, [username]))
+
+        for pk, name, code in University.objects.values_list('pk', 'name', 'code'):
+            entries.append(('university', pk, name, code, reverse('university_detail', args=[code]), [name, code]))
+
+        for pk, code, name, uni_code in Course.objects.values_list('pk', 'code', 'name', 'university__code'):
+            entries.append((
+                'course', pk, f'{code} - {name}', uni_code,
+                reverse('course_detail', args=[uni_code, code]), [code, name],
+            ))
+        return cls(entries)
+
+    def search(self, query, types=TYPES, limit=10):
+        query = normalize(query)
+        if not query:
+            return []
+
+        deadline = time.perf_counter() + TYPEAHEAD_BUDGET_MS / 1000
+
+        # Prefix matches: whole-label prefixes rank above later-word prefixes.
+        # "csc 101" is also tried as "csc101" to match compact course codes.
+        scores = {}
+        for prefix in {query, query.replace(' ', '')}:
+            position = bisect.bisect_left(self.keys, (prefix,))
+            while position < len(self.keys) and self.keys[position][0].startswith(prefix):
+                key, word_offset, index = self.keys[position]
+                score = 3.0 if key == prefix and word_offset == 0 else 2.0 - word_offset * 0.5
+                if self.entries[index][0] in types and score > scores.get(index, 0):
+                    scores[index] = score
+                position += 1
+                if position % 256 == 0 and time.perf_counter() > deadline:
+                    break
+
+        # Fuzzy matches by trigram similarity, within the same budget
+        if len(scores) < limit and len(query) >= 3:
+            query_grams = trigrams(query)
+            shared = {}
+            for gram in query_grams:
+                for index in self.postings.get(gram, ()):
+                    shared[index] = shared.get(index, 0) + 1
+                if time.perf_counter() > deadline:
+                    break
+            for index, common in shared.items():
+                if index in scores or self.entries[index][0] not in types:
+                    continue
+                # Like pg_trgm's word_similarity: how much of the query appears
+                # in the label, with whole-label similarity as a tie-breaker
+                coverage = common / len(query_grams)
+                if coverage >= TRIGRAM_THRESHOLD:
+                    similarity = common / (len(query_grams) + self.trigram_counts[index] - common)
+                    scores[index] = 0.7 * coverage + 0.3 * similarity
+
+        ranked = sorted(scores.items(), key=lambda item: (-item[1], self.entries[item[0]][2].lower()))[:limit]
+        return [
+            {
+                'type': self.entries[index][0],
+                'id': self.entries[index][1],
+                'label': self.entries[index][2],
+                'detail': self.entries[index][3],
+                'url': self.entries[index][4],
+                'score': round(score, 3),
+            }
+            for index, score in ranked
+        ]
+
+
+_index = None
+_index_version = None
+_index_built_at = 0.0
+_lock = threading.Lock()
+
+
+def get_index():
+    """This process's index, rebuilt if a change was recorded since it was built"""
+    global _index, _index_version, _index_built_at
+    version = cache.get(TYPEAHEAD_VERSION_KEY)
+    if _index is not None and (
+        version == _index_version or time.monotonic() - _index_built_at < TYPEAHEAD_MIN_REBUILD_INTERVAL
+    ):
+        return _index
+
+    with _lock:
+        if _index is None or version != _index_version:
+            _index = TypeaheadIndex.build()
+            _index_version = version
+            _index_built_at = time.monotonic()
+    return _index
+
+
+def search(query, types=TYPES, limit=10):
+    return get_index().search(query, types=types, limit=limit)
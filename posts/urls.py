@@ -1,13 +1,18 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
 from . import views
-from .api import PostViewSet, CommentViewSet, UserViewSet, MessageViewSet, LoginView, RegisterView
+from .api import PostViewSet, CommentViewSet, UserViewSet, MessageViewSet, BatchView, SyncView, TypeaheadView, SearchView, LoginView, LogoutView, RegisterView
+from resources.api import UniversityViewSet, CourseViewSet, ModuleViewSet, ResourceViewSet
 
 router = DefaultRouter()
 router.register(r'posts', PostViewSet, basename='api-post')
 router.register(r'comments', CommentViewSet, basename='api-comment')
 router.register(r'users', UserViewSet)
 router.register(r'messages', MessageViewSet, basename='api-message')
+router.register(r'universities', UniversityViewSet, basename='api-university')
+router.register(r'courses', CourseViewSet, basename='api-course')
+router.register(r'modules', ModuleViewSet, basename='api-module')
+router.register(r'resources', ResourceViewSet, basename='api-resource')
 
 urlpatterns = [
     # Main feed
@@ -50,7 +55,12 @@ urlpatterns = [
     # ============ API ENDPOINTS FOR MOBILE APP ============
     path('api/', include(router.urls)),
     path('api/login/', LoginView.as_view(), name='api-login'),
+    path('api/logout/', LogoutView.as_view(), name='api-logout'),
     path('api/register/', RegisterView.as_view(), name='api-register'),
+    path('api/batch/', BatchView.as_view(), name='api-batch'),
+    path('api/sync/', SyncView.as_view(), name='api-sync'),
+    path('api/typeahead/', TypeaheadView.as_view(), name='api-typeahead'),
+    path('api/search/', SearchView.as_view(), name='api-search'),
     path('api-auth/', include('rest_framework.urls')),
     
     # Migration helpers
@@ -10,7 +10,7 @@ from django.utils.dateparse import parse_datetime
 from datetime import timedelta
 from django.conf import settings
 from django.template.loader import render_to_string
-from django.db.models import Q, Count
+from django.db.models import Count
 from django.core.paginator import Paginator
 from django.contrib.admin.views.decorators import staff_member_required
 from django.core.management import call_command
@@ -18,12 +18,15 @@ import json
 import io
 import sys
 import traceback
+from resources.models import Resource
 from .models import (
     Post, Comment, Reaction, CommentReaction,
     PostSave, PostReport, Notification,
     UserActivity
 )
 from .forms import PostForm, CommentForm
+from .conditional import list_validators, add_validator_headers, not_modified_response
+from .search import PostSearchResults, UnifiedSearchResults, search_users
 
 # ==================== HELPER FUNCTIONS ====================
 def get_most_popular_reaction(counts):
@@ -74,6 +77,13 @@ def home(request):
 # ==================== INFINITE SCROLL ====================
 def load_more_posts(request):
     page = request.GET.get('page', 1)
+    etag = list_validators(
+        request, Post.objects.filter(is_archived=False), 'last_activity'
+    )
+    not_modified = not_modified_response(request, etag)
+    if not_modified is not None:
+        return not_modified
+
     posts_list = Post.objects.filter(is_archived=False).select_related(
         'author', 'author__activity', 'parent__author', 'parent__author__activity'
     ).prefetch_related(
@@ -92,11 +102,12 @@ def load_more_posts(request):
         'user': request.user
     }, request=request)
 
-    return JsonResponse({
+    response = JsonResponse({
         'posts_html': posts_html,
         'has_next': posts.has_next(),
         'next_page': posts.next_page_number() if posts.has_next() else None
     })
+    return add_validator_headers(response, etag)
 
 # ==================== CREATE POST ====================
 @login_required
@@ -572,15 +583,21 @@ def search(request):
     query = request.GET.get('q', '')
 
     if query:
-        posts = Post.objects.filter(
-            Q(title__icontains=query) | Q(content__icontains=query) | Q(author__username__icontains=query),
-            is_archived=False, parent=None
-        )[:20]
-        users = User.objects.filter(Q(username__icontains=query) | Q(email__icontains=query))[:10]
+        posts = PostSearchResults(query)[:20]
+        users = search_users(query)
+        # Then posts by matching authors, which the post index doesn't cover
+        posts += Post.objects.filter(
+            author__in=users, is_archived=False, parent=None
+        ).exclude(pk__in=[post.pk for post in posts]).select_related(
+            'author', 'author__activity'
+        ).order_by('-created_at')[:20 - len(posts)]
+        resource_ids = [pk for kind, pk in UnifiedSearchResults(query, kind='resource')[:20]]
+        found = Resource.objects.select_related('course', 'university', 'resource_type').in_bulk(resource_ids)
+        resources = [found[pk] for pk in resource_ids if pk in found]
     else:
-        posts, users = [], []
+        posts, users, resources = [], [], []
 
-    context = {'query': query, 'posts': posts, 'users': users}
+    context = {'query': query, 'posts': posts, 'users': users, 'resources': resources}
     return render(request, 'posts/search.html', context)
 
 # ==================== ONLINE USERS API ====================
@@ -1,7 +1,39 @@
-from django.contrib import admin
+from django.contrib import admin, messages
+from django.contrib.admin.views.autocomplete import AutocompleteJsonView
+from django.contrib.admin.widgets import AutocompleteSelect
+from django.core.exceptions import PermissionDenied
+from django.shortcuts import redirect
+from django.template.response import TemplateResponse
 from django.utils.html import format_html
-from django.urls import reverse
-from .models import University, Course, Module, ResourceType, Resource, ResourceDownload
+from django.urls import path, reverse
+from django.db.models import Case, Count, When
+from .models import University, Course, Module, ResourceType, Resource, ResourceDownload, ArchivedResource, DownloadRollup
+from . import rollups
+from .forms import BulkResourceForm
+
+# ==================== TYPEAHEAD-BACKED AUTOCOMPLETE ====================
+
+class TypeaheadAutocompleteMixin:
+    """Answer autocomplete_fields lookups from the in-memory typeahead index, best match first"""
+    typeahead_type = None
+    
+    def get_search_results(self, request, queryset, search_term):
+        match = getattr(request, 'resolver_match', None)
+        if not search_term or match is None or match.url_name != 'autocomplete':
+            return super().get_search_results(request, queryset, search_term)
+        
+        from posts import typeahead
+        try:
+            page = max(int(request.GET.get('page', 1)), 1)
+        except ValueError:
+            page = 1
+        # Everything up to the requested page, plus one so the paginator knows there is more
+        limit = page * AutocompleteJsonView.paginate_by + 1
+        ids = [r['id'] for r in typeahead.search(search_term, types=[self.typeahead_type], limit=limit)]
+        if not ids:
+            return queryset.none(), False
+        rank = Case(*[When(pk=pk, then=position) for position, pk in enumerate(ids)])
+        return queryset.filter(pk__in=ids).order_by(rank), False
 
 # ==================== INLINE ADMIN CLASSES ====================
 
@@ -59,8 +91,9 @@ class ResourceInline(admin.TabularInline):
 # ==================== MAIN ADMIN CLASSES ====================
 
 @admin.register(University)
-class UniversityAdmin(admin.ModelAdmin):
+class UniversityAdmin(TypeaheadAutocompleteMixin, admin.ModelAdmin):
     """🏛️ UNIVERSITY MANAGEMENT - Top Level"""
+    typeahead_type = 'university'
     
     # List Display
     list_display = [
@@ -103,8 +136,9 @@ class UniversityAdmin(admin.ModelAdmin):
     resource_count_display.short_description = "📄 Resources"
 
 @admin.register(Course)
-class CourseAdmin(admin.ModelAdmin):
+class CourseAdmin(TypeaheadAutocompleteMixin, admin.ModelAdmin):
     """📚 COURSE MANAGEMENT - Second Level"""
+    typeahead_type = 'course'
     
     list_display = [
         'code', 
@@ -166,8 +200,10 @@ class ModuleAdmin(admin.ModelAdmin):
     ]
     
     list_filter = ['course__university', 'course', 'parent_module']
-    search_fields = ['name', 'description']
+    search_fields = ['name', 'full_path', 'description']
     autocomplete_fields = ['course', 'parent_module']
+    # The count annotations group the query, which drops Meta.ordering
+    ordering = ['course', 'order', 'name']
     readonly_fields = ['created_at', 'submodule_count', 'resource_count', 'path_display']
     inlines = [ResourceInline]
     
@@ -200,7 +236,7 @@ class ModuleAdmin(admin.ModelAdmin):
     parent_module_link.short_description = "Parent Folder"
     
     def submodule_count_display(self, obj):
-        count = obj.submodules.count()
+        count = obj.num_submodules
         if count > 0:
             url = reverse('admin:resources_module_changelist') + f'?parent_module__id__exact={obj.id}'
             return format_html('<a href="{}">{} Subfolders</a>', url, count)
@@ -212,7 +248,7 @@ class ModuleAdmin(admin.ModelAdmin):
     submodule_count.short_description = "Total Submodules"
     
     def resource_count_display(self, obj):
-        count = obj.resource_set.count()
+        count = obj.num_resources
         if count > 0:
             url = reverse('admin:resources_resource_changelist') + f'?module__id__exact={obj.id}'
             return format_html('<a href="{}" style="font-weight: bold;">{} Resources</a>', url, count)
@@ -220,12 +256,18 @@ class ModuleAdmin(admin.ModelAdmin):
     resource_count_display.short_description = "📄 Resources"
     
     def resource_count(self, obj):
-        return obj.resource_set.count()
-    resource_count.short_description = "Total Resources"
+        return obj.all_resources().count()
+    resource_count.short_description = "Total Resources (with subfolders)"
     
     def path_display(self, obj):
         return format_html('<span style="color: #ffd700; font-family: monospace;">{}</span>', obj.path)
     path_display.short_description = "Full Path"
+    
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related('course', 'parent_module').annotate(
+            num_submodules=Count('submodules', distinct=True),
+            num_resources=Count('resource', distinct=True),
+        )
 
 @admin.register(ResourceType)
 class ResourceTypeAdmin(admin.ModelAdmin):
@@ -285,9 +327,10 @@ class ResourceAdmin(admin.ModelAdmin):
     
     search_fields = ['title', 'description']
     autocomplete_fields = ['university', 'course', 'module', 'resource_type', 'uploaded_by']
-    readonly_fields = ['file_size', 'downloads', 'uploaded_at', 'file_preview']
+    readonly_fields = ['file_size', 'mime_type', 'page_count', 'content_hash', 'downloads', 'uploaded_at', 'file_preview']
     list_editable = ['academic_year']
     list_per_page = 25
+    change_list_template = 'admin/resources/resource/change_list.html'
     
     fieldsets = (
         ('📎 Resource Details', {
@@ -303,7 +346,7 @@ class ResourceAdmin(admin.ModelAdmin):
             'description': 'Year level and academic period'
         }),
         ('📊 Metadata', {
-            'fields': ('file_size', 'downloads', 'uploaded_by', 'uploaded_at'),
+            'fields': ('file_size', 'mime_type', 'page_count', 'content_hash', 'downloads', 'uploaded_by', 'uploaded_at'),
             'classes': ('collapse',),
         }),
     )
@@ -342,9 +385,13 @@ class ResourceAdmin(admin.ModelAdmin):
     
     def file_preview(self, obj):
         if obj.file:
+            preview = getattr(obj, 'preview', None)
+            thumbnail = ''
+            if preview and preview.thumbnail:
+                thumbnail = format_html('<img src="{}" width="120" style="display: block; margin-bottom: 8px;">', preview.thumbnail.url)
             return format_html(
-                '<div style="margin-top: 10px;"><a href="{}" target="_blank" class="button" style="background: #667eea;">📄 Open File</a>',
-                obj.file.url
+                '<div style="margin-top: 10px;">{}<a href="{}" target="_blank" class="button" style="background: #667eea;">📄 Open File</a>',
+                thumbnail, obj.file.url
             )
         return "No file uploaded"
     file_preview.short_description = "Preview"
@@ -358,6 +405,55 @@ class ResourceAdmin(admin.ModelAdmin):
         return super().get_queryset(request).select_related(
             'university', 'course', 'module', 'resource_type', 'uploaded_by'
         )
+    
+    def get_urls(self):
+        return [
+            path('bulk-add/', self.admin_site.admin_view(self.bulk_add_view), name='resources_resource_bulk_add'),
+        ] + super().get_urls()
+    
+    def bulk_add_view(self, request):
+        """📤 Many files with shared details in one upload"""
+        if not self.has_add_permission(request):
+            raise PermissionDenied
+        form = BulkResourceForm(request.POST or None, request.FILES or None)
+        for name in ('university', 'course', 'module', 'resource_type'):
+            field = form.fields[name]
+            field.widget = AutocompleteSelect(Resource._meta.get_field(name), self.admin_site)
+            field.widget.choices, field.widget.is_required = field.choices, field.required
+        
+        if request.method == 'POST' and form.is_valid():
+            resources = form.save(uploaded_by=request.user)
+            for resource in resources:
+                self.log_addition(request, resource, [{'added': {}}])
+            self.message_user(
+                request, f"📤 Added {len(resources)} resources to {form.cleaned_data['course'].code}", messages.SUCCESS
+            )
+            changelist = reverse('admin:resources_resource_changelist')
+            return redirect(f"{changelist}?course__id__exact={form.cleaned_data['course'].pk}")
+        
+        context = {
+            **self.admin_site.each_context(request),
+            'opts': self.model._meta,
+            'title': 'Bulk add resources',
+            'form': form,
+            'media': self.media + form.media,
+        }
+        return TemplateResponse(request, 'admin/resources/resource/bulk_add.html', context)
+
+@admin.register(ArchivedResource)
+class ArchivedResourceAdmin(admin.ModelAdmin):
+    """🗄️ ARCHIVED RESOURCES - Removed by prune_resources --archive"""
+    
+    list_display = ['title', 'course_code', 'university_code', 'resource_type', 'academic_year', 'downloads', 'archived_at']
+    list_filter = ['university_code', 'academic_year', 'resource_type']
+    search_fields = ['title', 'course_code']
+    list_per_page = 50
+    
+    def has_add_permission(self, request):
+        return False
+    
+    def has_change_permission(self, request, obj=None):
+        return False
 
 @admin.register(ResourceDownload)
 class ResourceDownloadAdmin(admin.ModelAdmin):
@@ -396,4 +492,48 @@ class ResourceDownloadAdmin(admin.ModelAdmin):
         return False
     
     def has_change_permission(self, request, obj=None):
-        return False
\ No newline at end of file
+        return False
+
+@admin.register(DownloadRollup)
+class DownloadRollupAdmin(admin.ModelAdmin):
+    """📈 DAILY DOWNLOADS - Rollups maintained by rollup_downloads"""
+    
+    list_display = ['day', 'resource_link', 'course', 'university', 'downloads']
+    list_filter = ['university', 'course']
+    date_hierarchy = 'day'
+    list_select_related = ['resource', 'course', 'university']
+    list_per_page = 50
+    change_list_template = 'admin/resources/downloadrollup/change_list.html'
+    
+    def resource_link(self, obj):
+        if obj.resource:
+            url = reverse('admin:resources_resource_change', args=[obj.resource.id])
+            return format_html('<a href="{}">{}</a>', url, obj.resource.title)
+        return "Removed"
+    resource_link.short_description = "Resource"
+    
+    def changelist_view(self, request, extra_context=None):
+        # Summaries follow the course/university filters of the list
+        course, university = (
+            int(value) if value.isdigit() else None
+            for value in (request.GET.get('course__id__exact', ''), request.GET.get('university__id__exact', ''))
+        )
+        top = rollups.top_resources(days=7, course=course, university=university)
+        titles = dict(Resource.objects.filter(pk__in=[row['resource_id'] for row in top]).values_list('id', 'title'))
+        series = rollups.daily_series(days=30, course=course, university=university)
+        peak = max((downloads for _, downloads in series), default=0) or 1
+        extra_context = {
+            **(extra_context or {}),
+            'top_this_week': [{**row, 'title': titles.get(row['resource_id'], '—')} for row in top],
+            'daily_downloads': [
+                {'day': day, 'downloads': downloads, 'width': round(downloads * 100 / peak)}
+                for day, downloads in series
+            ],
+        }
+        return super().changelist_view(request, extra_context)
+    
+    def has_add_permission(self, request):
+        return False
+    
+    def has_change_permission(self, request, obj=None):
+        return False
@@ -0,0 +1,198 @@
+from rest_framework import serializers, viewsets, permissions
+from rest_framework.exceptions import ValidationError
+from rest_framework.pagination import CursorPagination
+from django.conf import settings
+from django.db.models import Count
+from django.urls import reverse
+from django.utils.cache import patch_cache_control
+from django.utils.http import quote_etag
+import hashlib
+from posts.conditional import add_validator_headers, not_modified_response
+from .models import University, Course, Module, Resource
+from . import catalog
+
+# ==================== SERIALIZERS ====================
+
+class UniversitySerializer(serializers.ModelSerializer):
+    logo = serializers.SerializerMethodField()
+    course_count = serializers.IntegerField(source='num_courses', read_only=True)
+
+    class Meta:
+        model = University
+        fields = ['id', 'code', 'name', 'description', 'logo', 'course_count']
+
+    def get_logo(self, obj):
+        return obj.logo.url if obj.logo else None
+
+class CourseSerializer(serializers.ModelSerializer):
+    university = serializers.CharField(source='university.code')
+    resource_count = serializers.IntegerField(source='num_resources', read_only=True)
+
+    class Meta:
+        model = Course
+        fields = ['id', 'university', 'code', 'name', 'description', 'resource_count']
+
+class ModuleSerializer(serializers.ModelSerializer):
+    parent = serializers.IntegerField(source='parent_module_id')
+
+    class Meta:
+        model = Module
+        fields = ['id', 'course', 'parent', 'name', 'description', 'order', 'depth', 'full_path']
+
+class ResourceSerializer(serializers.ModelSerializer):
+    """
+    Past paper metadata. Download counts are left out: they change on every
+    click without touching the catalog version the ETags come from.
+    """
+    university = serializers.CharField(source='university.code')
+    course_code = serializers.CharField(source='course.code')
+    module_path = serializers.CharField(source='module.full_path', default=None)
+    resource_type = serializers.CharField(source='resource_type.name')
+    view_url = serializers.SerializerMethodField()
+    download_url = serializers.SerializerMethodField()
+    thumbnail_url = serializers.SerializerMethodField()
+    preview_url = serializers.SerializerMethodField()
+
+    class Meta:
+        model = Resource
+        fields = [
+            'id', 'title', 'description', 'university', 'course', 'course_code', 'module', 'module_path',
+            'resource_type', 'year_level', 'academic_year', 'semester', 'file_size', 'mime_type',
+            'page_count', 'uploaded_at',
+            'view_url', 'download_url', 'thumbnail_url', 'preview_url',
+        ]
+
+    def get_view_url(self, obj):
+        return self.context['request'].build_absolute_uri(reverse('view_pdf', args=[obj.pk]))
+
+    def get_download_url(self, obj):
+        return self.context['request'].build_absolute_uri(reverse('download_resource', args=[obj.pk]))
+
+    def get_thumbnail_url(self, obj):
+        return self.image_url(obj, 'thumbnail')
+
+    def get_preview_url(self, obj):
+        return self.image_url(obj, 'image')
+
+    def image_url(self, obj, field):
+        preview = getattr(obj, 'preview', None)
+        image = preview and getattr(preview, field)
+        return self.context['request'].build_absolute_uri(image.url) if image else None
+
+# ==================== PAGINATION & CACHING ====================
+
+class KeysetPagination(CursorPagination):
+    """Keyset pages by id: stable while the catalog changes under an offline client"""
+    ordering = 'id'
+    page_size = 100
+    page_size_query_param = 'page_size'
+    max_page_size = 500
+
+class CatalogCachingMixin:
+    """
+    ETags from the catalog version (resources/catalog.py), which every
+    university, course, module, type or resource change replaces, so a
+    device revalidating its offline copy gets a 304 without a query.
+    """
+    def get_etag(self, request):
+        parts = [catalog.version(), request.get_full_path()]
+        return quote_etag(hashlib.md5(repr(parts).encode()).hexdigest())
+
+    def conditional(self, handler, request, *args, **kwargs):
+        etag = self.get_etag(request)
+        response = not_modified_response(request, etag)
+        if response is None:
+            response = handler(request, *args, **kwargs)
+            if response.status_code != 200:
+                return response
+            add_validator_headers(response, etag)
+        patch_cache_control(response, max_age=getattr(settings, 'RESOURCES_API_MAX_AGE', 300))
+        return response
+
+    def list(self, request, *args, **kwargs):
+        return self.conditional(super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.conditional(super().retrieve, request, *args, **kwargs)
+
+    def int_param(self, name):
+        value = self.request.query_params.get(name)
+        if value in (None, ''):
+            return None
+        try:
+            return int(value)
+        except ValueError:
+            raise ValidationError({name: 'Must be an integer'})
+
+# ==================== VIEWSETS ====================
+
+class UniversityViewSet(CatalogCachingMixin, viewsets.ReadOnlyModelViewSet):
+    """Universities: GET /api/universities/"""
+    serializer_class = UniversitySerializer
+    pagination_class = KeysetPagination
+    permission_classes = [permissions.AllowAny]
+
+    def get_queryset(self):
+        return University.objects.annotate(num_courses=Count('courses'))
+
+class CourseViewSet(CatalogCachingMixin, viewsets.ReadOnlyModelViewSet):
+    """Courses: GET /api/courses/?university=ub"""
+    serializer_class = CourseSerializer
+    pagination_class = KeysetPagination
+    permission_classes = [permissions.AllowAny]
+
+    def get_queryset(self):
+        courses = Course.objects.select_related('university').annotate(num_resources=Count('resource'))
+        if self.request.query_params.get('university'):
+            courses = courses.filter(university__code=self.request.query_params['university'])
+        return courses
+
+class ModuleViewSet(CatalogCachingMixin, viewsets.ReadOnlyModelViewSet):
+    """Module folders: GET /api/modules/?course=<id>&parent=<id or 'none'>"""
+    serializer_class = ModuleSerializer
+    pagination_class = KeysetPagination
+    permission_classes = [permissions.AllowAny]
+
+    def get_queryset(self):
+        modules = Module.objects.all()
+        course = self.int_param('course')
+        if course is not None:
+            modules = modules.filter(course_id=course)
+        if self.request.query_params.get('parent') == 'none':
+            modules = modules.filter(parent_module__isnull=True)
+        else:
+            parent = self.int_param('parent')
+            if parent is not None:
+                modules = modules.filter(parent_module_id=parent)
+        return modules
+
+class ResourceViewSet(CatalogCachingMixin, viewsets.ReadOnlyModelViewSet):
+    """
+    Past papers: GET /api/resources/?university=ub&course=<id>&module=<id>
+        &subfolders=1&year_level=1&academic_year=2024&semester=1&resource_type=Exam
+    """
+    serializer_class = ResourceSerializer
+    pagination_class = KeysetPagination
+    permission_classes = [permissions.AllowAny]
+    int_filters = ('course', 'year_level', 'academic_year', 'semester')
+
+    def get_queryset(self):
+        params = self.request.query_params
+        resources = Resource.objects.select_related('university', 'course', 'module', 'resource_type', 'preview')
+        for name in self.int_filters:
+            value = self.int_param(name)
+            if value is not None:
+                resources = resources.filter(**{f'{name}_id' if name == 'course' else name: value})
+        if params.get('university'):
+            resources = resources.filter(university__code=params['university'])
+        if params.get('resource_type'):
+            resources = resources.filter(resource_type__name__iexact=params['resource_type'])
+
+        module = self.int_param('module')
+        if module is not None:
+            if params.get('subfolders') in ('1', 'true'):
+                tree_path = Module.objects.filter(pk=module).values_list('tree_path', flat=True).first()
+                resources = resources.filter(module__tree_path__startswith=tree_path) if tree_path else resources.none()
+            else:
+                resources = resources.filter(module_id=module)
+        return resources
@@ -3,3 +3,6 @@ from django.apps import AppConfig
 
 class ResourcesConfig(AppConfig):
     name = 'resources'
+
+    def ready(self):
+        from . import signals  # noqa: F401
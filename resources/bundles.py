@@ -0,0 +1,164 @@
+"""
+ZIP bundles of every paper for a course, year level and academic year.
+
+stream() writes the archive straight into the response as it reads each
+file from storage a chunk at a time, so a bundle download holds one chunk
+in memory however many papers it has, and nothing touches disk. Entries
+are stored uncompressed (PDFs barely shrink) with sizes in trailing data
+descriptors, which lets the archive be written without seeking.
+
+build() precomputes bundles for popular course years into storage and
+records each one as a ResourceBundle with its fingerprint (the set of
+resources and their stored files) and the name storage actually saved it
+under: Cloudinary picks its own public id, so the requested name can't be
+looked up again. The view redirects to the prebuilt bundle when the
+recorded fingerprint is current, so every process sees it and a changed
+course year falls back to streaming until it is built again.
+"""
+import hashlib
+import os
+import tempfile
+import zipfile
+from urllib.request import urlopen
+
+from django.conf import settings
+from django.core.files import File
+from django.core.files.storage import default_storage
+from django.utils.module_loading import import_string
+from django.utils.text import get_valid_filename
+
+from .models import Resource, ResourceBundle
+
+CHUNK_SIZE = 64 * 1024
+
+
+def bundle_storage():
+    path = getattr(settings, 'RESOURCE_BUNDLE_STORAGE', None)
+    return import_string(path)() if path else default_storage
+
+
+def bundle_resources(course_id, year_level, academic_year):
+    return (
+        Resource.objects.filter(course_id=course_id, year_level=year_level, academic_year=academic_year)
+        .select_related('resource_type', 'course')
+        .order_by('resource_type__name', 'title', 'id')
+    )
+
+
+def fingerprint(resources):
+    """Changes whenever a paper is added, removed or re-uploaded"""
+    parts = [f'{resource.pk}:{resource.file.name}' for resource in resources]
+    return hashlib.sha1('\n'.join(parts).encode()).hexdigest()[:16]
+
+
+def filename(course, year_level, academic_year):
+    return get_valid_filename(f'{course.code}-year{year_level}-{academic_year}.zip')
+
+
+def arcname(resource):
+    ext = os.path.splitext(resource.file.name)[1] or '.pdf'
+    title = get_valid_filename(resource.title) or 'paper'
+    return f'{get_valid_filename(resource.resource_type.name)}/{title}-{resource.pk}{ext}'
+
+
+def iter_file(resource):
+    """The stored file in CHUNK_SIZE pieces without loading it whole"""
+    storage = resource.file.storage
+    try:
+        path = storage.path(resource.file.name)
+    except NotImplementedError:
+        # Remote storages (Cloudinary) read whole files in open(): stream the URL instead
+        source = urlopen(resource.file.url)
+    else:
+        source = open(path, 'rb')
+    with source:
+        while chunk := source.read(CHUNK_SIZE):
+            yield chunk
+
+
+class ZipSink:
+    """Write-only, unseekable file object whose bytes the generator drains"""
+
+    def __init__(self):
+        self.parts = []
+
+    def write(self, data):
+        self.parts.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b''.join(self.parts)
+        self.parts = []
+        return data
+
+
+def stream(resources):
+    """Yield the ZIP archive of ``resources`` chunk by chunk"""
+    sink = ZipSink()
+    missing = []
+    with zipfile.ZipFile(sink, 'w') as archive:
+        for resource in resources:
+            chunks = iter_file(resource)
+            try:
+                # Open the source before the entry header goes out, so a
+                # missing file is left out rather than half-written
+                first = next(chunks, b'')
+            except OSError:
+                missing.append(resource)
+                continue
+            info = zipfile.ZipInfo(arcname(resource), date_time=resource.uploaded_at.timetuple()[:6])
+            info.compress_type = zipfile.ZIP_STORED
+            with archive.open(info, 'w') as entry:
+                entry.write(first)
+                yield sink.drain()
+                for chunk in chunks:
+                    entry.write(chunk)
+                    yield sink.drain()
+        if missing:
+            archive.writestr('MISSING.txt', '\n'.join(f'{r.title} ({r.pk})' for r in missing))
+    yield sink.drain()
+
+
+def bundle_name(course, year_level, academic_year, resources):
+    return f'bundles/{fingerprint(resources)}/{filename(course, year_level, academic_year)}'
+
+
+def prebuilt_url(course, year_level, academic_year, resources):
+    """URL of a prebuilt bundle matching ``resources``, if there is one"""
+    name = (
+        ResourceBundle.objects.filter(
+            course=course, year_level=year_level, academic_year=academic_year, fingerprint=fingerprint(resources)
+        ).values_list('name', flat=True).first()
+    )
+    return bundle_storage().url(name) if name else None
+
+
+def build(course, year_level, academic_year):
+    """Write the bundle to storage unless it is current already. Returns the URL or None."""
+    resources = list(bundle_resources(course.pk, year_level, academic_year))
+    if not resources:
+        return None
+    url = prebuilt_url(course, year_level, academic_year, resources)
+    if url:
+        return url
+
+    storage = bundle_storage()
+    # Spills to disk past a few MB, which is fine off the request path
+    with tempfile.SpooledTemporaryFile(max_size=8 * 1024 * 1024) as archive:
+        for chunk in stream(resources):
+            archive.write(chunk)
+        archive.seek(0)
+        stored = storage.save(bundle_name(course, year_level, academic_year, resources), File(archive))
+
+    previous = ResourceBundle.objects.filter(course=course, year_level=year_level, academic_year=academic_year).first()
+    ResourceBundle.objects.update_or_create(
+        course=course, year_level=year_level, academic_year=academic_year,
+        defaults={'fingerprint': fingerprint(resources), 'name': stored},
+    )
+    if previous and previous.name != stored:
+        # Nothing links to a stale bundle once the new one is recorded
+        storage.delete(previous.name)
+    return storage.url(stored)
@@ -0,0 +1,190 @@
+"""
+Cached catalog tree for the resources browse pages.
+
+Universities -> courses -> year levels (with their academic years and
+resource types) and module folders, each with resource counts, built in
+one pass of four queries and cached under a version token. Signals replace
+the token whenever a university, course, module, resource or resource
+type changes, so browsing reads only the cache until an admin edits
+something. Download counts are not part of the tree.
+
+Deployments share the cache through Redis (REDIS_URL), so every worker
+sees a new token at once. With the dev server's per-process LocMem cache,
+other processes only see an edit once their copy expires after
+CATALOG_CACHE_TIMEOUT.
+"""
+import uuid
+from collections import Counter, defaultdict
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count
+
+from .models import University, Course, Module, Resource
+
+CATALOG_CACHE_TIMEOUT = getattr(settings, 'CATALOG_CACHE_TIMEOUT', 600)
+VERSION_KEY = 'resources:catalog:version'
+
+
+def version():
+    """
+    Opaque token naming the current catalog; the API derives ETags from it.
+    Random rather than a counter so separate LocMem copies never share a
+    token, and it expires with the tree so a process that missed an edit
+    moves on within CATALOG_CACHE_TIMEOUT.
+    """
+    return cache.get_or_set(VERSION_KEY, lambda: uuid.uuid4().hex, CATALOG_CACHE_TIMEOUT)
+
+
+def invalidate():
+    cache.set(VERSION_KEY, uuid.uuid4().hex, CATALOG_CACHE_TIMEOUT)
+
+
+def get_tree():
+    """The catalog tree, built on a cache miss"""
+    key = f'resources:catalog:{version()}'
+    tree = cache.get(key)
+    if tree is None:
+        tree = build_tree()
+        cache.set(key, tree, CATALOG_CACHE_TIMEOUT)
+    return tree
+
+
+def university(code):
+    return get_tree()['universities'].get(code)
+
+
+def course(uni_code, course_code):
+    uni = university(uni_code)
+    return uni and uni['courses'].get(course_code)
+
+
+def build_tree():
+    # One grouped row per course/level/year/module/type combination
+    counts = (
+        Resource.objects.values('course_id', 'year_level', 'academic_year', 'module_id', 'resource_type__name')
+        .annotate(n=Count('id'))
+        .order_by()
+    )
+    course_counts, level_counts, module_counts = Counter(), Counter(), Counter()
+    level_years = defaultdict(lambda: defaultdict(set))
+    level_modules = defaultdict(lambda: defaultdict(set))
+    for row in counts:
+        level = (row['course_id'], row['year_level'])
+        course_counts[row['course_id']] += row['n']
+        level_counts[level] += row['n']
+        level_years[level][row['academic_year']].add(row['resource_type__name'])
+        if row['module_id']:
+            module_counts[row['module_id']] += row['n']
+            level_modules[level][row['module_id']].add(row['academic_year'])
+
+    modules_by_course = defaultdict(dict)
+    children = defaultdict(list)
+    for module in Module.objects.values('id', 'course_id', 'parent_module_id', 'name', 'order', 'tree_path', 'depth'):
+        node = {
+            'id': module['id'], 'name': module['name'], 'order': module['order'],
+            'parent_id': module['parent_module_id'], 'depth': module['depth'], 'tree_path': module['tree_path'],
+            'num_resources': module_counts[module['id']],
+        }
+        modules_by_course[module['course_id']][module['id']] = node
+        children[module['parent_module_id']].append(node)
+
+    def folder_order(node):
+        return (node['order'], node['name'])
+
+    for course_modules in modules_by_course.values():
+        for node in course_modules.values():
+            node['submodule_ids'] = [child['id'] for child in sorted(children[node['id']], key=folder_order)]
+            node['num_submodules'] = len(node['submodule_ids'])
+
+    courses_by_university = defaultdict(dict)
+    for course in Course.objects.order_by('code'):
+        course_modules = modules_by_course[course.pk]
+        year_levels = []
+        for level, name in Resource.YEAR_LEVELS:
+            if not level_counts[(course.pk, level)]:
+                continue
+            years = level_years[(course.pk, level)]
+            level_modules_years = level_modules[(course.pk, level)]
+            year_levels.append({
+                'level': level,
+                'name': name,
+                'resource_count': level_counts[(course.pk, level)],
+                'academic_years': [
+                    {'year': year, 'types': sorted(years[year])} for year in sorted(years, reverse=True)
+                ],
+                'modules': [
+                    {**course_modules[module_id], 'years': sorted(module_years, reverse=True)}
+                    for module_id, module_years in sorted(
+                        level_modules_years.items(), key=lambda item: folder_order(course_modules[item[0]])
+                    )
+                ],
+            })
+        courses_by_university[course.university_id][course.code] = {
+            'id': course.pk,
+            'code': course.code,
+            'name': course.name,
+            'description': course.description,
+            'num_resources': course_counts[course.pk],
+            'year_levels': year_levels,
+            'modules': course_modules,
+            'top_modules': sorted(
+                (node for node in course_modules.values() if node['parent_id'] is None), key=folder_order
+            ),
+        }
+
+    universities = {}
+    for uni in University.objects.all():
+        courses = courses_by_university[uni.pk]
+        universities[uni.code] = {
+            'id': uni.pk,
+            'code': uni.code,
+            'name': uni.name,
+            'description': uni.description,
+            'logo': {'url': uni.logo.url} if uni.logo else None,
+            'num_courses': len(courses),
+            'num_resources': sum(course['num_resources'] for course in courses.values()),
+            'courses': courses,
+        }
+    return {'universities': universities}
+
+
+def submodules(course, module):
+    return [course['modules'][pk] for pk in module['submodule_ids']]
+
+
+def ancestors(course, module):
+    ids = [int(pk) for pk in module['tree_path'].strip('/').split('/')[:-1] if pk]
+    return [course['modules'][pk] for pk in ids if pk in course['modules']]
+
+
+def as_json(tree):
+    """The tree as plain nested lists for the JSON endpoint"""
+    def module_json(course, node):
+        return {
+            'id': node['id'], 'name': node['name'],
+            'num_resources': node['num_resources'],
+            'submodules': [module_json(course, child) for child in submodules(course, node)],
+        }
+
+    return [
+        {
+            'code': uni['code'], 'name': uni['name'], 'num_courses': uni['num_courses'],
+            'num_resources': uni['num_resources'],
+            'courses': [
+                {
+                    'code': course['code'], 'name': course['name'], 'num_resources': course['num_resources'],
+                    'year_levels': [
+                        {
+                            'level': level['level'], 'name': level['name'], 'resource_count': level['resource_count'],
+                            'academic_years': level['academic_years'],
+                        }
+                        for level in course['year_levels']
+                    ],
+                    'modules': [module_json(course, node) for node in course['top_modules']],
+                }
+                for course in uni['courses'].values()
+            ],
+        }
+        for uni in tree['universities'].values()
+    ]
@@ -0,0 +1,138 @@
+"""
+Text extraction for uploaded past papers.
+
+Parsing PDFs (pure-Python pypdf) is CPU-bound, so extract() fans files
+out to a process pool: the parent reads each file from storage and saves
+results, workers only parse. Every result is saved as soon as it arrives,
+so an interrupted run resumes where it stopped, and pending() only picks
+up resources whose file has never been extracted or was re-uploaded.
+extract_resource_text --watch runs as its own worker process (see
+Procfile) and picks up new uploads as they arrive.
+
+Text is stored whitespace-collapsed with pages separated by form feeds
+and capped at RESOURCE_TEXT_MAX_CHARS per file; PostgreSQL compresses it
+further (TOAST). Triggers keep the full-text index current
+(see posts/search.py).
+"""
+import io
+import re
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from django.conf import settings
+from django.db.models import F, Q
+
+from .models import Resource, ResourceText
+
+MAX_CHARS = getattr(settings, 'RESOURCE_TEXT_MAX_CHARS', 200_000)
+
+
+def clean_text(text):
+    return re.sub(r'\s+', ' ', text.replace('\x00', '')).strip()
+
+
+def extract_pages(data):
+    """List of page texts for PDF bytes, stopping once MAX_CHARS is reached"""
+    from pypdf import PdfReader
+
+    if not data[:1024].lstrip().startswith(b'%PDF-'):
+        raise ValueError('not a PDF')
+
+    pages, total = [], 0
+    for page in PdfReader(io.BytesIO(data)).pages:
+        text = clean_text(page.extract_text() or '')[:MAX_CHARS - total]
+        pages.append(text)
+        total += len(text)
+        if total >= MAX_CHARS:
+            break
+    return pages
+
+
+def extract_worker(data):
+    """Runs in a pool process: never touches the database"""
+    try:
+        return extract_pages(data), ''
+    except Exception as e:
+        return [], f'{type(e).__name__}: {e}'[:255]
+
+
+def pending(force=False, retry_failed=False):
+    """Resources whose file has no up-to-date extracted text"""
+    resources = Resource.objects.exclude(file='').order_by('pk')
+    if force:
+        return resources
+    stale = Q(extracted_text__isnull=True) | ~Q(extracted_text__source_name=F('file'))
+    if retry_failed:
+        stale |= ~Q(extracted_text__error='')
+    return resources.filter(stale)
+
+
+def read_file(resource):
+    with resource.file.open('rb') as f:
+        return f.read()
+
+
+def save_result(resource_id, source_name, pages, error):
+    ResourceText.objects.update_or_create(
+        resource_id=resource_id,
+        defaults={
+            'content': '\f'.join(pages),
+            'page_count': len(pages),
+            'source_name': source_name,
+            'error': error,
+        },
+    )
+
+
+def run_pool(resources, worker, finish, workers=1):
+    """
+    Read each resource's file here and run ``worker(data)`` on it in a pool
+    of ``workers`` processes (1 runs it in this process), calling
+    ``finish(resource, result, error)`` here as each one completes.
+
+    At most ``workers * 2`` files are held in memory at once.
+    """
+    def load(resource):
+        try:
+            return read_file(resource), ''
+        except Exception as e:
+            return None, f'{type(e).__name__}: {e}'[:255]
+
+    resources = resources.iterator(chunk_size=200)
+    if workers <= 1:
+        for resource in resources:
+            data, error = load(resource)
+            finish(resource, *(worker(data) if data is not None else (None, error)))
+        return
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        running = {}
+        for resource in resources:
+            data, error = load(resource)
+            if data is None:
+                finish(resource, None, error)
+                continue
+            running[pool.submit(worker, data)] = resource
+            if len(running) >= workers * 2:
+                done = next(as_completed(running))
+                finish(running.pop(done), *done.result())
+        for done in as_completed(list(running)):
+            finish(running.pop(done), *done.result())
+
+
+def extract(resources, workers=1, on_result=None):
+    """Extract and save text for ``resources``. Returns (extracted, failed)."""
+    extracted = failed = 0
+
+    def finish(resource, pages, error):
+        nonlocal extracted, failed
+        pages = pages or []
+        save_result(resource.pk, resource.file.name, pages, error)
+        if error:
+            failed += 1
+        else:
+            extracted += 1
+        if on_result:
+            on_result(resource.pk, len(pages), error)
+
+    run_pool(resources.only('pk', 'file'), extract_worker, finish, workers)
+    return extracted, failed
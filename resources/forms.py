@@ -0,0 +1,106 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
+from datetime import datetime
+
+from django import forms
+from django.conf import settings
+from django.db import transaction
+
+from . import catalog
+from .models import University, Course, Module, ResourceType, Resource
+from .uploads import put_many
+
+class MultipleFileInput(forms.ClearableFileInput):
+    allow_multiple_selected = True
+
+class MultipleFileField(forms.FileField):
+    def __init__(self, *args, **kwargs):
+        kwargs.setdefault('widget', MultipleFileInput(attrs={'accept': '.pdf,image/*,.doc,.docx,.ppt,.pptx'}))
+        super().__init__(*args, **kwargs)
+
+    def clean(self, data, initial=None):
+        single_clean = super().clean
+        items = data if isinstance(data, (list, tuple)) else [data]
+        # No files at all still goes through FileField's required check
+        return [upload for upload in (single_clean(item, initial) for item in items or [None]) if upload]
+
+# ==================== BULK UPLOAD ====================
+
+class BulkResourceForm(forms.Form):
+    """Many files sharing one course, folder, type and academic period (ResourceAdmin bulk add)"""
+    university = forms.ModelChoiceField(University.objects.all())
+    course = forms.ModelChoiceField(Course.objects.all())
+    module = forms.ModelChoiceField(Module.objects.all(), required=False)
+    resource_type = forms.ModelChoiceField(ResourceType.objects.all())
+    year_level = forms.TypedChoiceField(choices=Resource.YEAR_LEVELS, coerce=int)
+    academic_year = forms.IntegerField(min_value=1900, max_value=2100)
+    semester = forms.TypedChoiceField(choices=Resource.SEMESTER_CHOICES, coerce=int, initial=1)
+    description = forms.CharField(widget=forms.Textarea(attrs={'rows': 2}), required=False)
+    papers = MultipleFileField()
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.fields['academic_year'].initial = datetime.now().year
+        self.max_files = getattr(settings, 'RESOURCE_BULK_MAX_FILES', 40)
+        self.fields['papers'].help_text = (
+            f'Each file becomes a resource titled after its file name (up to {self.max_files} per upload)'
+        )
+
+    def clean_papers(self):
+        papers = self.cleaned_data['papers']
+        if len(papers) > self.max_files:
+            raise forms.ValidationError(
+                f'{len(papers)} files chosen; upload at most {self.max_files} at a time'
+            )
+        return papers
+
+    def clean(self):
+        cleaned = super().clean()
+        university, course, module = cleaned.get('university'), cleaned.get('course'), cleaned.get('module')
+        if university and course and course.university_id != university.pk:
+            self.add_error('course', f'{course.code} is not a course at {university.code}')
+        if course and module and module.course_id != course.pk:
+            self.add_error('module', 'This folder belongs to another course')
+        return cleaned
+
+    def save(self, uploaded_by=None):
+        """
+        Store every new file concurrently, then create all the resources in
+        one transaction. Papers already stored, or chosen twice, are uploaded
+        once. Nothing is created if any file fails to store.
+        """
+        data = self.cleaned_data
+        field = Resource._meta.get_field('file')
+        files = data['papers']
+        workers = min(getattr(settings, 'RESOURCE_UPLOAD_WORKERS', 4), len(files))
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            # The uploads stay open for the request: nullcontext keeps put_many from closing them
+            stored = put_many(
+                pool, [(lambda upload=upload: nullcontext(upload), upload.name) for upload in files],
+                field.storage, field.max_length,
+            )
+        for result in stored:
+            if isinstance(result, Exception):
+                raise result
+
+        resources = []
+        for upload, (name, meta) in zip(files, stored):
+            resource = Resource(
+                university=data['university'], course=data['course'], module=data['module'],
+                resource_type=data['resource_type'], title=title_from_name(upload.name),
+                description=data['description'] or None, year_level=data['year_level'],
+                academic_year=data['academic_year'], semester=data['semester'],
+                uploaded_by=uploaded_by, **meta,
+            )
+            resource.file.name = name
+            resource.search_keywords = resource.build_search_keywords()
+            resources.append(resource)
+        with transaction.atomic():
+            Resource.objects.bulk_create(resources)
+        # bulk_create sends no signals
+        catalog.invalidate()
+        return resources
+
+def title_from_name(name):
+    return os.path.splitext(os.path.basename(name))[0].replace('_', ' ').strip()[:200] or 'Untitled'
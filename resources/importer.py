@@ -0,0 +1,266 @@
+"""
+Bulk import of past papers from a directory tree or ZIP with a CSV manifest.
+
+The manifest (manifest.csv at the top of the source unless given) has one
+row per file:
+
+    path,university,course,module,year_level,academic_year,resource_type,title,semester
+
+path, university, course, year_level, academic_year and resource_type are
+required. module is a folder path like "Past Papers > Finals" (or
+"Past Papers/Finals"), title defaults to the file name, and course_name
+and description columns are used when present. Missing courses and module
+folders are created; universities and resource types must exist.
+
+Files are hashed and stored by content (resources/uploads.py) from a
+bounded thread pool, since storage uploads wait on the network, and each
+batch of rows goes in with one bulk_create. A row whose course, title,
+academic year and content are already imported is skipped, so an
+interrupted import can simply be run again: content any resource already
+holds is found by its hash and not uploaded twice, and neither is a file
+repeated within a batch.
+"""
+import csv
+import io
+import os
+import posixpath
+import shutil
+import tempfile
+import time
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+from django.db import transaction
+
+from . import catalog
+from .models import University, Course, Module, ResourceType, Resource
+from .uploads import put_many
+
+MANIFEST_NAME = 'manifest.csv'
+# ZIP members are copied out before hashing: pypdf seeks backwards, which a
+# compressed member can only do by decompressing it again from the start
+SPOOL_SIZE = 8 * 1024 * 1024
+REQUIRED_COLUMNS = ['path', 'university', 'course', 'year_level', 'academic_year', 'resource_type']
+
+
+class ManifestError(Exception):
+    pass
+
+
+# ==================== SOURCES ====================
+
+def clean_path(path):
+    path = posixpath.normpath(path.strip().replace('\\', '/')).lstrip('/')
+    if path in ('', '.') or path == '..' or path.startswith('../'):
+        raise ValueError(f'bad path {path!r}')
+    return path
+
+
+class DirectorySource:
+    def __init__(self, root):
+        self.root = root
+
+    def open(self, path):
+        return open(os.path.join(self.root, *clean_path(path).split('/')), 'rb')
+
+    def close(self):
+        pass
+
+
+class ZipSource:
+    """Members are read from several threads; ZipFile serializes the reads"""
+
+    def __init__(self, path):
+        self.archive = zipfile.ZipFile(path)
+
+    def open(self, path):
+        spool = tempfile.SpooledTemporaryFile(max_size=SPOOL_SIZE)
+        with self.archive.open(clean_path(path)) as member:
+            shutil.copyfileobj(member, spool, 64 * 1024)
+        spool.seek(0)
+        return spool
+
+    def close(self):
+        self.archive.close()
+
+
+def open_source(path):
+    if os.path.isdir(path):
+        return DirectorySource(path)
+    if zipfile.is_zipfile(path):
+        return ZipSource(path)
+    raise ManifestError(f'{path} is neither a directory nor a ZIP file')
+
+
+def read_manifest(source, manifest=None):
+    """Manifest rows as dicts with their line number under 'line'"""
+    if manifest:
+        with open(manifest, encoding='utf-8-sig', newline='') as f:
+            text = f.read()
+    else:
+        try:
+            with source.open(MANIFEST_NAME) as f:
+                text = f.read().decode('utf-8-sig')
+        except (OSError, KeyError):
+            raise ManifestError(f'No {MANIFEST_NAME} in the source; pass --manifest')
+    reader = csv.DictReader(io.StringIO(text, newline=''))
+    missing = [column for column in REQUIRED_COLUMNS if column not in (reader.fieldnames or [])]
+    if missing:
+        raise ManifestError(f'Manifest is missing columns: {", ".join(missing)}')
+    return [
+        {**{key: (value or '').strip() for key, value in row.items() if key}, 'line': reader.line_num}
+        for row in reader
+    ]
+
+
+# ==================== ROWS ====================
+
+class Resolver:
+    """Turns manifest rows into unsaved Resources, creating courses and folders as needed"""
+
+    def __init__(self, uploaded_by=None):
+        self.uploaded_by = uploaded_by
+        self.universities = {uni.code.lower(): uni for uni in University.objects.all()}
+        self.types = {rtype.name.lower(): rtype for rtype in ResourceType.objects.all()}
+        self.courses = {
+            (course.university_id, course.code.lower()): course
+            for course in Course.objects.select_related('university')
+        }
+        self.modules = {}
+        self.created_courses = self.created_modules = 0
+
+    def course(self, university, code, name):
+        key = (university.pk, code.lower())
+        if key not in self.courses:
+            self.courses[key] = Course.objects.create(university=university, code=code, name=name or code)
+            self.created_courses += 1
+        return self.courses[key]
+
+    def module(self, course, path):
+        if course.pk not in self.modules:
+            self.modules[course.pk] = {
+                module.full_path.lower(): module for module in Module.objects.filter(course=course)
+            }
+        known = self.modules[course.pk]
+        parent, full_path = None, course.code
+        for name in (part.strip() for part in path.replace('/', '>').split('>')):
+            if not name:
+                continue
+            full_path = f'{full_path} > {name}'
+            if full_path.lower() not in known:
+                known[full_path.lower()] = Module.objects.create(course=course, parent_module=parent, name=name)
+                self.created_modules += 1
+            parent = known[full_path.lower()]
+        return parent
+
+    def resource(self, row):
+        """An unsaved Resource for ``row`` (file not yet set); raises ValueError"""
+        university = self.universities.get(row['university'].lower())
+        if university is None:
+            raise ValueError(f"unknown university {row['university']!r}")
+        resource_type = self.types.get(row['resource_type'].lower())
+        if resource_type is None:
+            raise ValueError(f"unknown resource type {row['resource_type']!r}")
+        year_level, academic_year = int(row['year_level']), int(row['academic_year'])
+        if year_level not in dict(Resource.YEAR_LEVELS):
+            raise ValueError(f'bad year level {year_level}')
+        semester = int(row.get('semester') or 1)
+        if semester not in dict(Resource.SEMESTER_CHOICES):
+            raise ValueError(f'bad semester {semester}')
+
+        if not row['course']:
+            raise ValueError('no course')
+        course = self.course(university, row['course'], row.get('course_name'))
+        module = self.module(course, row['module']) if row.get('module') else None
+        title = row.get('title')
+        if not title:
+            title = os.path.splitext(posixpath.basename(clean_path(row['path'])))[0].replace('_', ' ')
+        return Resource(
+            university=university, course=course, module=module, resource_type=resource_type,
+            title=title[:200], description=row.get('description') or None,
+            year_level=year_level, academic_year=academic_year, semester=semester,
+            uploaded_by=self.uploaded_by,
+        )
+
+
+# ==================== IMPORT ====================
+
+def already_imported(resources):
+    """(course, title, academic year, content) keys of ``resources`` that exist already"""
+    hashes = {resource.content_hash for resource in resources}
+    return set(
+        Resource.objects.filter(content_hash__in=hashes)
+        .values_list('course_id', 'title', 'academic_year', 'content_hash')
+    )
+
+
+def import_key(resource):
+    return (resource.course_id, resource.title, resource.academic_year, resource.content_hash)
+
+
+def run(source, rows, workers=8, batch_size=200, uploaded_by=None, on_error=None, on_batch=None):
+    """
+    Import manifest ``rows`` from ``source``. Returns a stats dict with
+    counts of imported, skipped and failed rows, bytes read and seconds taken.
+    """
+    resolver = Resolver(uploaded_by)
+    file_field = Resource._meta.get_field('file')
+    stats = {'imported': 0, 'skipped': 0, 'failed': 0, 'bytes': 0, 'seconds': 0.0}
+    started = time.monotonic()
+
+    def fail(row, error):
+        stats['failed'] += 1
+        if on_error:
+            on_error(row['line'], row.get('path', ''), error)
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for start in range(0, len(rows), batch_size):
+            batch_started = time.monotonic()
+            pending = []
+            for row in rows[start:start + batch_size]:
+                try:
+                    pending.append((row, resolver.resource(row), posixpath.basename(clean_path(row['path']))))
+                except ValueError as e:
+                    fail(row, str(e))
+
+            files = [(partial(source.open, row['path']), name) for row, _, name in pending]
+            results = put_many(pool, files, file_field.storage, file_field.max_length)
+            uploaded, batch_bytes = [], 0
+            for (row, resource, _), result in zip(pending, results):
+                if isinstance(result, (OSError, KeyError, ValueError)):
+                    fail(row, f'{type(result).__name__}: {result}')
+                    continue
+                if isinstance(result, Exception):
+                    raise result
+                stored, meta = result
+                resource.file.name = stored
+                for field, value in meta.items():
+                    setattr(resource, field, value)
+                resource.search_keywords = resource.build_search_keywords()
+                uploaded.append(resource)
+                batch_bytes += resource.file_size
+
+            existing = already_imported(uploaded)
+            new = []
+            for resource in uploaded:
+                if import_key(resource) in existing:
+                    stats['skipped'] += 1
+                    continue
+                existing.add(import_key(resource))
+                new.append(resource)
+            with transaction.atomic():
+                Resource.objects.bulk_create(new)
+
+            stats['imported'] += len(new)
+            stats['bytes'] += batch_bytes
+            if on_batch:
+                on_batch(start // batch_size + 1, len(pending), len(new), batch_bytes, time.monotonic() - batch_started)
+
+    stats['seconds'] = time.monotonic() - started
+    stats['created_courses'] = resolver.created_courses
+    stats['created_modules'] = resolver.created_modules
+    if stats['imported'] or resolver.created_courses or resolver.created_modules:
+        # bulk_create sends no signals
+        catalog.invalidate()
+    return stats
@@ -0,0 +1,39 @@
+from django.core.management.base import BaseCommand
+from resources import uploads
+from resources.models import Resource
+
+
+class Command(BaseCommand):
+    help = 'Record size, SHA-256, type and page count for resources uploaded before hashing'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--limit', type=int, help='Stop after this many files')
+        parser.add_argument('--force', action='store_true', help='Re-read files that already have a hash')
+
+    def handle(self, *args, **options):
+        resources = Resource.objects.exclude(file='').only('id', 'file').order_by('id')
+        if not options['force']:
+            resources = resources.filter(content_hash='')
+        if options['limit']:
+            resources = resources[:options['limit']]
+
+        done = failed = 0
+        for resource in resources.iterator():
+            try:
+                uploads.describe_stored(resource)
+            except OSError as e:
+                failed += 1
+                self.stdout.write(self.style.WARNING(f'⚠️ Resource {resource.pk}: {e}'))
+                continue
+            # update() rather than save(): no signals, so the catalog stays cached
+            Resource.objects.filter(pk=resource.pk).update(
+                file_size=resource.file_size, content_hash=resource.content_hash,
+                mime_type=resource.mime_type, page_count=resource.page_count,
+            )
+            done += 1
+        self.stdout.write(self.style.SUCCESS(f'✅ Described {done} files, {failed} failed'))
+
+        for group in uploads.duplicates():
+            self.stdout.write(
+                f"📎 {group['content_hash'][:12]}: {group['resources']} resources in {group['files']} copies"
+            )
@@ -0,0 +1,33 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db.models import Sum
+from django.utils import timezone
+from resources import bundles
+from resources.models import Course, DownloadRollup
+
+
+class Command(BaseCommand):
+    help = 'Prebuild ZIP bundles for the most downloaded course years (from the daily rollups)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--top', type=int, default=10, help='How many course years to bundle')
+        parser.add_argument('--days', type=int, default=7, help='Popularity window in days')
+
+    def handle(self, *args, **options):
+        popular = (
+            DownloadRollup.objects.filter(
+                day__gt=timezone.localdate() - timedelta(days=options['days']), resource__isnull=False
+            )
+            .values('course_id', 'resource__year_level', 'resource__academic_year')
+            .annotate(total=Sum('downloads'))
+            .order_by('-total')[:options['top']]
+        )
+        courses = Course.objects.in_bulk({row['course_id'] for row in popular})
+        for row in popular:
+            course = courses[row['course_id']]
+            year_level, academic_year = row['resource__year_level'], row['resource__academic_year']
+            url = bundles.build(course, year_level, academic_year)
+            if url:
+                self.stdout.write(f'📦 {course.code} year {year_level} {academic_year}: {url}')
+        self.stdout.write(self.style.SUCCESS(f'✅ Bundled {len(popular)} course years'))
@@ -0,0 +1,42 @@
+import os
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+from resources import extraction
+
+
+class Command(BaseCommand):
+    help = 'Extract searchable text from new or re-uploaded resource PDFs'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                            help='Parser processes (1 parses in this process)')
+        parser.add_argument('--limit', type=int, help='Stop after this many files')
+        parser.add_argument('--retry-failed', action='store_true', help='Retry files that failed before')
+        parser.add_argument('--force', action='store_true', help='Re-extract every file')
+        parser.add_argument('--watch', type=int, metavar='SECONDS',
+                            help='Keep running, checking for new uploads every SECONDS')
+
+    def handle(self, *args, **options):
+        while True:
+            self.run_once(options)
+            if not options['watch']:
+                break
+            time.sleep(options['watch'])
+            close_old_connections()
+
+    def run_once(self, options):
+        resources = extraction.pending(force=options['force'], retry_failed=options['retry_failed'])
+        if options['limit']:
+            resources = resources[:options['limit']]
+
+        def report(resource_id, pages, error):
+            if error:
+                self.stdout.write(self.style.WARNING(f'⚠️ Resource {resource_id}: {error}'))
+            elif options['verbosity'] > 1:
+                self.stdout.write(f'📄 Resource {resource_id}: {pages} pages')
+
+        extracted, failed = extraction.extract(resources, workers=options['workers'], on_result=report)
+        if extracted or failed or not options['watch']:
+            self.stdout.write(self.style.SUCCESS(f'✅ Extracted {extracted} files, {failed} failed'))
@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+from resources import downloads
+
+
+class Command(BaseCommand):
+    help = 'Add logged resource downloads to the download counts'
+
+    def handle(self, *args, **options):
+        total = 0
+        while written := downloads.flush():
+            total += written
+        self.stdout.write(self.style.SUCCESS(f'✅ Counted {total} downloads'))
@@ -0,0 +1,54 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from resources import importer
+
+
+class Command(BaseCommand):
+    help = 'Import past papers from a directory or ZIP with a CSV manifest (see resources/importer.py)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('source', help='Directory or ZIP file holding the papers')
+        parser.add_argument('--manifest', help=f'CSV manifest (default: {importer.MANIFEST_NAME} in the source)')
+        parser.add_argument('--workers', type=int, default=8, help='Concurrent storage uploads')
+        parser.add_argument('--batch-size', type=int, default=200, help='Rows per bulk insert')
+        parser.add_argument('--user', help='Username recorded as the uploader')
+
+    def handle(self, *args, **options):
+        uploaded_by = None
+        if options['user']:
+            uploaded_by = User.objects.filter(username=options['user']).first()
+            if uploaded_by is None:
+                raise CommandError(f"No user {options['user']!r}")
+        try:
+            source = importer.open_source(options['source'])
+            rows = importer.read_manifest(source, options['manifest'])
+        except importer.ManifestError as e:
+            raise CommandError(str(e))
+
+        self.stdout.write(f'📥 Importing {len(rows)} files with {options["workers"]} workers')
+
+        def report_error(line, path, error):
+            self.stdout.write(self.style.WARNING(f'⚠️ Line {line} ({path}): {error}'))
+
+        def report_batch(number, files, imported, size, seconds):
+            seconds = max(seconds, 0.001)
+            self.stdout.write(
+                f'📦 Batch {number}: {imported}/{files} imported, '
+                f'{files / seconds:.1f} files/s, {size / seconds / 1e6:.1f} MB/s'
+            )
+
+        try:
+            stats = importer.run(
+                source, rows, workers=options['workers'], batch_size=options['batch_size'],
+                uploaded_by=uploaded_by, on_error=report_error, on_batch=report_batch,
+            )
+        finally:
+            source.close()
+
+        seconds = max(stats['seconds'], 0.001)
+        self.stdout.write(self.style.SUCCESS(
+            f"✅ Imported {stats['imported']}, skipped {stats['skipped']} already imported, "
+            f"{stats['failed']} failed in {seconds:.1f}s "
+            f"({(stats['imported'] + stats['skipped']) / seconds:.1f} files/s, {stats['bytes'] / seconds / 1e6:.1f} MB/s); "
+            f"created {stats['created_courses']} courses and {stats['created_modules']} folders"
+        ))
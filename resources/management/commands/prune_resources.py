@@ -0,0 +1,95 @@
+import json
+from collections import Counter
+from datetime import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from resources import catalog, partitions
+from resources.models import Resource, ArchivedResource
+
+
+class Command(BaseCommand):
+    help = 'Delete resources older than the retention window, in bounded batches'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--keep-years', type=int, default=Resource.RETENTION_YEARS,
+                            help='Most recent academic years to keep')
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument('--archive', action='store_true', help='Copy rows to the archived resources table first')
+        parser.add_argument('--export', metavar='PATH', help='Append rows to this JSON lines file first')
+        parser.add_argument('--dry-run', action='store_true', help='Report what would be removed')
+
+    def handle(self, *args, **options):
+        if options['keep_years'] < 1:
+            raise CommandError('--keep-years must be at least 1')
+
+        expired = Resource.expired(options['keep_years'])
+        if options['dry_run']:
+            years = expired.values_list('academic_year', flat=True)
+            for year, count in sorted(Counter(years).items()):
+                self.stdout.write(f'🗓️ {year}: {count} resources would be removed')
+            self.stdout.write(self.style.SUCCESS(f'✅ Dry run: {expired.count()} resources'))
+            return
+
+        export = open(options['export'], 'a') if options['export'] else None
+        removed, cascaded, years = 0, Counter(), Counter()
+        try:
+            # On PostgreSQL whole expired years are partitions: copy them out
+            # if asked, then drop each one instead of deleting its rows
+            cutoff = datetime.now().year - options['keep_years']
+            for year in sorted(year for year in partitions.partitions() if year <= cutoff):
+                if export or options['archive']:
+                    last_pk = 0
+                    while batch := self.next_batch(Resource.objects.filter(academic_year=year, pk__gt=last_pk), options):
+                        self.copy_out(batch, export, options['archive'])
+                        last_pk = batch[-1].pk
+                years[year] = partitions.drop_partition(year)
+                removed += years[year]
+                self.stdout.write(f'🗑️ Dropped the {year} partition')
+                # Raw partition drops send no delete signals
+                catalog.invalidate()
+
+            # Rows outside per-year partitions (or every row, elsewhere)
+            while batch := self.next_batch(expired, options):
+                # The export is written before the delete commits, so a crash
+                # can duplicate lines but never lose rows
+                with transaction.atomic():
+                    self.copy_out(batch, export, options['archive'])
+                    total, per_model = Resource.objects.filter(pk__in=[r.pk for r in batch]).delete()
+
+                removed += per_model.pop(Resource._meta.label, 0)
+                cascaded.update(per_model)
+                years.update(r.academic_year for r in batch)
+                self.stdout.write(f'🗑️ Removed {removed} resources so far')
+        finally:
+            if export:
+                export.close()
+
+        for year, count in sorted(years.items()):
+            self.stdout.write(f'🗓️ {year}: {count} resources')
+        for label, count in sorted(cascaded.items()):
+            self.stdout.write(f'   ↳ {count} {label}')
+        self.stdout.write(self.style.SUCCESS(f'✅ Removed {removed} resources older than {options["keep_years"]} academic years'))
+
+    def next_batch(self, resources, options):
+        return list(
+            resources.select_related('university', 'course', 'module', 'resource_type')
+            .order_by('pk')[:options['batch_size']]
+        )
+
+    def copy_out(self, batch, export, archive):
+        if export:
+            for resource in batch:
+                export.write(json.dumps(self.export_row(resource), cls=DjangoJSONEncoder) + '\n')
+            export.flush()
+        if archive:
+            ArchivedResource.objects.bulk_create([ArchivedResource.from_resource(r) for r in batch])
+
+    def export_row(self, resource):
+        row = ArchivedResource.from_resource(resource)
+        return {
+            field.name: getattr(row, field.name)
+            for field in ArchivedResource._meta.fields
+            if field.name not in ('id', 'archived_at')
+        }
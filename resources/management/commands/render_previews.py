@@ -0,0 +1,48 @@
+import os
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+from resources import catalog, previews
+
+
+class Command(BaseCommand):
+    help = 'Render first-page thumbnails and previews for new or re-uploaded resources'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                            help='Renderer processes (1 renders in this process)')
+        parser.add_argument('--limit', type=int, help='Stop after this many files')
+        parser.add_argument('--retry-failed', action='store_true', help='Retry files that failed before')
+        parser.add_argument('--force', action='store_true', help='Re-render every file')
+        parser.add_argument('--watch', type=int, metavar='SECONDS',
+                            help='Keep running, checking for new uploads every SECONDS')
+
+    def handle(self, *args, **options):
+        while True:
+            self.run_once(options)
+            if not options['watch']:
+                break
+            time.sleep(options['watch'])
+            close_old_connections()
+
+    def run_once(self, options):
+        resources = previews.pending(force=options['force'], retry_failed=options['retry_failed'])
+        resources, shared = previews.share_existing(resources)
+        if options['limit']:
+            resources = resources[:options['limit']]
+
+        def report(resource_id, error):
+            if error:
+                self.stdout.write(self.style.WARNING(f'⚠️ Resource {resource_id}: {error}'))
+            elif options['verbosity'] > 1:
+                self.stdout.write(f'🖼️ Resource {resource_id}')
+
+        rendered, failed = previews.render(resources, workers=options['workers'], on_result=report)
+        if rendered or shared:
+            # The API's resource listings carry preview URLs
+            catalog.invalidate()
+        if rendered or shared or failed or not options['watch']:
+            self.stdout.write(self.style.SUCCESS(
+                f'✅ Rendered {rendered} previews, shared {shared}, {failed} failed'
+            ))
@@ -0,0 +1,46 @@
+from datetime import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+from resources import catalog, partitions
+from resources.models import Resource
+
+
+class Command(BaseCommand):
+    help = 'Partition resources by academic year, create upcoming partitions and drop expired ones (PostgreSQL)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--convert', action='store_true',
+                            help='Convert the plain table into a partitioned one first (rewrites the table; run in a maintenance window)')
+        parser.add_argument('--ahead', type=int, default=1, help='Future academic years to create partitions for')
+        parser.add_argument('--drop-expired', action='store_true',
+                            help='Drop partitions older than the retention window (use prune_resources to archive first)')
+        parser.add_argument('--keep-years', type=int, default=Resource.RETENTION_YEARS)
+
+    def handle(self, *args, **options):
+        current = datetime.now().year
+        if options['convert'] and not partitions.is_partitioned():
+            try:
+                converted = partitions.convert(range(current, current + options['ahead'] + 1))
+            except partitions.PartitionError as e:
+                raise CommandError(f'Cannot partition resources_resource: {e}')
+            if converted:
+                self.stdout.write(self.style.SUCCESS('✅ Converted resources_resource into a partitioned table'))
+
+        if not partitions.is_partitioned():
+            hint = '' if options['convert'] else ' (run with --convert)'
+            self.stdout.write(self.style.WARNING(f'⚠️ resources_resource is not partitioned on this database{hint}, nothing to do'))
+            return
+
+        for year in range(current, current + options['ahead'] + 1):
+            if partitions.create_partition(year):
+                self.stdout.write(self.style.SUCCESS(f'✅ Created partition for {year}'))
+
+        if options['drop_expired']:
+            cutoff = current - options['keep_years']
+            for year in sorted(year for year in partitions.partitions() if year <= cutoff):
+                removed = partitions.drop_partition(year)
+                self.stdout.write(self.style.SUCCESS(f'🗑️ Dropped partition for {year} ({removed} resources)'))
+                catalog.invalidate()
+
+        years = ', '.join(str(year) for year in sorted(partitions.partitions()))
+        self.stdout.write(f'📅 Partitions: {years}')
@@ -0,0 +1,25 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+from resources import rollups
+
+
+class Command(BaseCommand):
+    help = 'Fold raw resource downloads into daily per-resource rollups (run from cron)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--since', help='Recompute from this day (YYYY-MM-DD) instead of the last rolled-up day')
+
+    def handle(self, *args, **options):
+        since = None
+        if options['since']:
+            try:
+                since = date.fromisoformat(options['since'])
+            except ValueError:
+                raise CommandError(f"--since must be YYYY-MM-DD, got {options['since']!r}")
+
+        first, written = rollups.rollup(since)
+        if first is None:
+            self.stdout.write('📭 No downloads recorded yet')
+            return
+        self.stdout.write(self.style.SUCCESS(f'✅ Rolled up {written} resource-days since {first}'))
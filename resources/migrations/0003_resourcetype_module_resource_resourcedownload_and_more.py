@@ -0,0 +1,170 @@
+# Generated by Django 6.0.2 on 2026-10-19 09:00
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+# 0002 deleted these models, and some databases had the tables restored by
+# hand (force_create_tables) before this migration existed. The models are
+# recorded in the state here, and the tables are only created, or completed
+# with missing columns and indexes, where needed, so every database migrates
+# without a --fake.
+
+MODELS = ['ResourceType', 'Module', 'Resource', 'ResourceDownload']
+# Columns the hand-made tables hold under an older name
+LEGACY_COLUMNS = {'resources_resource': {'academic_year': 'year'}}
+
+
+def create_or_complete_tables(apps, schema_editor):
+    connection = schema_editor.connection
+    tables = connection.introspection.table_names()
+    for name in MODELS:
+        model = apps.get_model('resources', name)
+        table = model._meta.db_table
+        if table not in tables:
+            schema_editor.create_model(model)
+            continue
+        complete_table(schema_editor, model, LEGACY_COLUMNS.get(table, {}))
+
+
+def column_names(connection, table):
+    with connection.cursor() as cursor:
+        return {column.name for column in connection.introspection.get_table_description(cursor, table)}
+
+
+def field_copy(model, field, **attrs):
+    copy = field.clone()
+    for attr, value in attrs.items():
+        setattr(copy, attr, value)
+    copy.set_attributes_from_name(field.name)
+    copy.model = model
+    return copy
+
+
+def complete_table(schema_editor, model, legacy):
+    connection, table = schema_editor.connection, model._meta.db_table
+    columns = column_names(connection, table)
+    for field in model._meta.local_fields:
+        old = legacy.get(field.column)
+        if field.column not in columns and old in columns:
+            schema_editor.alter_field(model, field_copy(model, field, db_column=old), field)
+    columns = column_names(connection, table)
+
+    # Missing columns go in nullable first, which every backend adds in
+    # place, then get their default and become required once all exist
+    missing = [field for field in model._meta.local_fields if field.column not in columns]
+    quote = schema_editor.quote_name
+    added = []
+    for field in missing:
+        nullable = field_copy(model, field, null=True, default=models.NOT_PROVIDED)
+        schema_editor.add_field(model, nullable)
+        default = schema_editor.effective_default(field)
+        if default is not None:
+            schema_editor.execute(f'UPDATE {quote(table)} SET {quote(field.column)} = %s', [default])
+        added.append((nullable, field))
+    for nullable, field in added:
+        if not field.null:
+            schema_editor.alter_field(model, nullable, field)
+
+    with connection.cursor() as cursor:
+        constraints = connection.introspection.get_constraints(cursor, table)
+    for index in model._meta.indexes:
+        if index.name not in constraints:
+            schema_editor.add_index(model, index)
+
+
+def drop_tables(apps, schema_editor):
+    for name in reversed(MODELS):
+        schema_editor.delete_model(apps.get_model('resources', name))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('resources', '0002_remove_module_course_remove_module_parent_module_and_more'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.CreateModel(
+                    name='ResourceType',
+                    fields=[
+                        ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                        ('name', models.CharField(max_length=50)),
+                        ('icon', models.CharField(default='fa-file-pdf', max_length=50)),
+                    ],
+                    options={
+                        'verbose_name': 'Resource Type',
+                        'verbose_name_plural': 'Resource Types',
+                    },
+                ),
+                migrations.CreateModel(
+                    name='Module',
+                    fields=[
+                        ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                        ('name', models.CharField(max_length=200)),
+                        ('description', models.TextField(blank=True, null=True)),
+                        ('order', models.IntegerField(default=0)),
+                        ('created_at', models.DateTimeField(auto_now_add=True)),
+                        ('course', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='modules', to='resources.course')),
+                        ('parent_module', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='submodules', to='resources.module')),
+                    ],
+                    options={
+                        'ordering': ['course', 'order', 'name'],
+                    },
+                ),
+                migrations.CreateModel(
+                    name='Resource',
+                    fields=[
+                        ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                        ('title', models.CharField(max_length=200)),
+                        ('description', models.TextField(blank=True, null=True)),
+                        ('year_level', models.IntegerField(choices=[(1, 'First Year'), (2, 'Second Year'), (3, 'Third Year'), (4, 'Fourth Year'), (5, 'Fifth Year')], default=1, help_text='Academic year level')),
+                        ('academic_year', models.IntegerField(help_text='Calendar year e.g., 2024')),
+                        ('semester', models.IntegerField(choices=[(1, 'Semester 1'), (2, 'Semester 2'), (3, 'Semester 3'), (0, 'Full Year')], default=1)),
+                        ('file', models.FileField(upload_to='resources/%Y/%m/')),
+                        ('file_size', models.IntegerField(default=0)),
+                        ('uploaded_at', models.DateTimeField(auto_now_add=True)),
+                        ('downloads', models.IntegerField(default=0)),
+                        ('search_keywords', models.TextField(blank=True, editable=False)),
+                        ('course', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='resources.course')),
+                        ('module', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to='resources.module')),
+                        ('university', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='resources.university')),
+                        ('uploaded_by', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL)),
+                        ('resource_type', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='resources.resourcetype')),
+                    ],
+                    options={
+                        'verbose_name': 'Resource',
+                        'verbose_name_plural': 'Resources',
+                        'ordering': ['-academic_year', 'course', 'resource_type'],
+                    },
+                ),
+                migrations.CreateModel(
+                    name='ResourceDownload',
+                    fields=[
+                        ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                        ('downloaded_at', models.DateTimeField(auto_now_add=True)),
+                        ('ip_address', models.GenericIPAddressField(blank=True, null=True)),
+                        ('resource', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='resources.resource')),
+                        ('user', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL)),
+                    ],
+                    options={
+                        'verbose_name': 'Resource Download',
+                        'verbose_name_plural': 'Resource Downloads',
+                    },
+                ),
+                migrations.AddIndex(
+                    model_name='resource',
+                    index=models.Index(fields=['university', 'course', 'year_level', 'academic_year'], name='resources_r_univers_2eeb6f_idx'),
+                ),
+                migrations.AddIndex(
+                    model_name='resource',
+                    index=models.Index(fields=['-academic_year'], name='resources_r_academi_5c50a7_idx'),
+                ),
+            ],
+        ),
+        migrations.RunPython(create_or_complete_tables, drop_tables),
+    ]
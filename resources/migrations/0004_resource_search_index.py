@@ -0,0 +1,57 @@
+# Full-text index for resources (see posts/search.py). search_keywords is
+# filled by Resource.save(); this backfills it for existing rows first.
+
+from django.db import migrations
+
+
+def backfill_search_keywords(apps):
+    # Mirrors Resource.build_search_keywords() on the historical models, so
+    # later fields on the live models don't break this migration
+    Resource = apps.get_model('resources', 'Resource')
+    Module = apps.get_model('resources', 'Module')
+    modules = {m.pk: m for m in Module.objects.select_related('course')}
+    year_levels = dict(Resource._meta.get_field('year_level').choices)
+    semesters = dict(Resource._meta.get_field('semester').choices)
+
+    def module_path(module):
+        names = []
+        while module is not None:
+            names.append(module.name)
+            top, module = module, modules.get(module.parent_module_id)
+        return ' > '.join([top.course.code, *reversed(names)])
+
+    resources = list(Resource.objects.select_related('university', 'course', 'resource_type'))
+    for resource in resources:
+        parts = [
+            resource.course.code, resource.course.name,
+            resource.university.code, resource.university.name,
+            module_path(modules[resource.module_id]) if resource.module_id in modules else '',
+            resource.resource_type.name,
+            str(year_levels.get(resource.year_level, '')), str(resource.academic_year),
+            str(semesters.get(resource.semester, '')),
+        ]
+        resource.search_keywords = ' '.join(part for part in parts if part)
+    Resource.objects.bulk_update(resources, ['search_keywords'], batch_size=500)
+
+
+def install_search_index(apps, schema_editor):
+    from posts import search
+    backfill_search_keywords(apps)
+    search.rebuild(schema_editor.connection, ['resource'])
+
+
+def uninstall_search_index(apps, schema_editor):
+    from posts import search
+    search.uninstall(schema_editor.connection, ['resource'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('resources', '0003_resourcetype_module_resource_resourcedownload_and_more'),
+        ('posts', '0010_post_search_index'),
+    ]
+
+    operations = [
+        migrations.RunPython(install_search_index, uninstall_search_index),
+    ]
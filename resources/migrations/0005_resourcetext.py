@@ -0,0 +1,46 @@
+# Generated by Django 6.0.2 on 2026-10-19 09:30
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+# The resource index gains the extracted text as a fourth column, so its
+# structures are dropped and rebuilt (see posts/search.py)
+
+def reinstall_search_index(apps, schema_editor):
+    from posts import search
+    search.uninstall(schema_editor.connection, ['resource'])
+    search.rebuild(schema_editor.connection, ['resource'])
+
+
+def uninstall_search_index(apps, schema_editor):
+    # The index now reads resources_resourcetext; run rebuild_search_index
+    # from a tree without ResourceText to restore the older layout
+    from posts import search
+    search.uninstall(schema_editor.connection, ['resource'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('resources', '0004_resource_search_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ResourceText',
+            fields=[
+                ('resource', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='extracted_text', serialize=False, to='resources.resource')),
+                ('content', models.TextField(blank=True)),
+                ('page_count', models.IntegerField(default=0)),
+                ('source_name', models.CharField(max_length=255)),
+                ('error', models.CharField(blank=True, max_length=255)),
+                ('extracted_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Resource Text',
+                'verbose_name_plural': 'Resource Texts',
+            },
+        ),
+        migrations.RunPython(reinstall_search_index, uninstall_search_index),
+    ]
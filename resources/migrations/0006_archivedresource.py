@@ -0,0 +1,40 @@
+# Generated by Django 6.0.2 on 2026-10-19 10:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('resources', '0005_resourcetext'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedResource',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('original_id', models.IntegerField(db_index=True)),
+                ('university_code', models.CharField(max_length=20)),
+                ('course_code', models.CharField(max_length=20)),
+                ('module_path', models.CharField(blank=True, max_length=500)),
+                ('resource_type', models.CharField(max_length=50)),
+                ('title', models.CharField(max_length=200)),
+                ('description', models.TextField(blank=True, null=True)),
+                ('year_level', models.IntegerField()),
+                ('academic_year', models.IntegerField(db_index=True)),
+                ('semester', models.IntegerField()),
+                ('file', models.CharField(max_length=255)),
+                ('file_size', models.IntegerField(default=0)),
+                ('uploaded_by_id', models.IntegerField(blank=True, null=True)),
+                ('uploaded_at', models.DateTimeField()),
+                ('downloads', models.IntegerField(default=0)),
+                ('archived_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'verbose_name': 'Archived Resource',
+                'verbose_name_plural': 'Archived Resources',
+                'ordering': ['-academic_year', 'course_code'],
+            },
+        ),
+    ]
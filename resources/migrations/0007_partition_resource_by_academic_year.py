@@ -0,0 +1,41 @@
+# Generated by Django 6.0.2 on 2026-10-19 10:30
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+# The resource index is dropped around the table changes: SQLite refuses to
+# rebuild resourcetext while the index's view and triggers name it
+
+def uninstall_search_index(apps, schema_editor):
+    from posts import search
+    search.uninstall(schema_editor.connection, ['resource'])
+
+
+def rebuild_search_index(apps, schema_editor):
+    from posts import search
+    search.rebuild(schema_editor.connection, ['resource'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('resources', '0006_archivedresource'),
+    ]
+
+    operations = [
+        migrations.RunPython(uninstall_search_index, rebuild_search_index),
+        migrations.AlterField(
+            model_name='resourcedownload',
+            name='resource',
+            field=models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.CASCADE, to='resources.resource'),
+        ),
+        migrations.AlterField(
+            model_name='resourcetext',
+            name='resource',
+            field=models.OneToOneField(db_constraint=False, on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='extracted_text', serialize=False, to='resources.resource'),
+        ),
+        # Partitioning itself is `manage.py resource_partitions --convert`,
+        # run by hand: it rewrites the whole table
+        migrations.RunPython(rebuild_search_index, uninstall_search_index),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 6.0.2 on 2026-10-19 11:00
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('resources', '0007_partition_resource_by_academic_year'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='resourcedownload',
+            name='downloaded_at',
+            field=models.DateTimeField(db_index=True, default=django.utils.timezone.now),
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 6.0.2 on 2026-10-19 11:30
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('resources', '0008_resourcedownload_downloaded_at'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DownloadRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('downloads', models.IntegerField(default=0)),
+                ('course', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='download_rollups', to='resources.course')),
+                ('resource', models.ForeignKey(blank=True, db_constraint=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='download_rollups', to='resources.resource')),
+                ('university', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='download_rollups', to='resources.university')),
+            ],
+            options={
+                'verbose_name': 'Daily Downloads',
+                'verbose_name_plural': 'Daily Downloads',
+                'ordering': ['-day', '-downloads'],
+                'indexes': [models.Index(fields=['course', 'day'], name='resources_d_course__5929f0_idx'), models.Index(fields=['university', 'day'], name='resources_d_univers_4d127d_idx')],
+                'unique_together': {('day', 'resource')},
+            },
+        ),
+    ]
@@ -0,0 +1,48 @@
+# Generated by Django 6.0.2 on 2026-10-19 12:00
+
+from django.db import migrations, models
+
+
+def fill_tree_paths(apps, schema_editor):
+    # Same walk as Module.link_paths(), on the historical model
+    Module = apps.get_model('resources', 'Module')
+    modules = list(Module.objects.select_related('course'))
+    children = {}
+    for module in modules:
+        children.setdefault(module.parent_module_id, []).append(module)
+    known, level = {}, children.get(None, [])
+    while level:
+        for module in level:
+            parent = known.get(module.parent_module_id)
+            module.depth = parent.depth + 1 if parent else 0
+            module.tree_path = f"{parent.tree_path if parent else '/'}{module.pk}/"
+            module.full_path = f"{parent.full_path if parent else module.course.code} > {module.name}"
+            known[module.pk] = module
+        level = [child for module in level for child in children.get(module.pk, [])]
+    Module.objects.bulk_update(known.values(), ['tree_path', 'depth', 'full_path'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('resources', '0009_downloadrollup'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='module',
+            name='depth',
+            field=models.PositiveSmallIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='module',
+            name='full_path',
+            field=models.TextField(blank=True, editable=False),
+        ),
+        migrations.AddField(
+            model_name='module',
+            name='tree_path',
+            field=models.CharField(blank=True, db_index=True, editable=False, max_length=255),
+        ),
+        migrations.RunPython(fill_tree_paths, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 6.0.2 on 2026-10-19 14:05
+
+from django.db import migrations, models
+
+
+# SQLite rebuilds resources_resource to add the indexed column, which it
+# refuses to do while the search index's view and triggers name the table
+
+def uninstall_search_index(apps, schema_editor):
+    from posts import search
+    search.uninstall(schema_editor.connection, ['resource'])
+
+
+def rebuild_search_index(apps, schema_editor):
+    from posts import search
+    search.rebuild(schema_editor.connection, ['resource'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('resources', '0010_module_tree_path'),
+    ]
+
+    operations = [
+        migrations.RunPython(uninstall_search_index, rebuild_search_index),
+        migrations.AddField(
+            model_name='resource',
+            name='content_hash',
+            field=models.CharField(blank=True, db_index=True, editable=False, max_length=64),
+        ),
+        migrations.AddField(
+            model_name='resource',
+            name='mime_type',
+            field=models.CharField(blank=True, editable=False, max_length=100),
+        ),
+        migrations.AddField(
+            model_name='resource',
+            name='page_count',
+            field=models.PositiveIntegerField(blank=True, editable=False, null=True),
+        ),
+        migrations.RunPython(rebuild_search_index, uninstall_search_index),
+    ]
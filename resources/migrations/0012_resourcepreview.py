@@ -0,0 +1,29 @@
+# Generated by Django 6.0.2 on 2026-10-19 15:10
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('resources', '0011_resource_upload_metadata'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ResourcePreview',
+            fields=[
+                ('resource', models.OneToOneField(db_constraint=False, on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='preview', serialize=False, to='resources.resource')),
+                ('thumbnail', models.ImageField(blank=True, upload_to='previews/')),
+                ('image', models.ImageField(blank=True, upload_to='previews/')),
+                ('source_name', models.CharField(max_length=255)),
+                ('error', models.CharField(blank=True, max_length=255)),
+                ('rendered_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Resource Preview',
+                'verbose_name_plural': 'Resource Previews',
+            },
+        ),
+    ]
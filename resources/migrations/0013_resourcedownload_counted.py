@@ -0,0 +1,24 @@
+# Generated by Django 6.0.2 on 2026-10-19 14:10
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('resources', '0012_resourcepreview'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='resourcedownload',
+            name='counted',
+            field=models.BooleanField(default=True),
+        ),
+        migrations.AddIndex(
+            model_name='resourcedownload',
+            index=models.Index(condition=models.Q(('counted', False)), fields=['id'], name='resources_download_uncounted'),
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 6.0.2 on 2026-10-19 16:20
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('resources', '0013_resourcedownload_counted'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ResourceBundle',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('year_level', models.IntegerField()),
+                ('academic_year', models.IntegerField()),
+                ('fingerprint', models.CharField(max_length=16)),
+                ('name', models.CharField(max_length=255)),
+                ('built_at', models.DateTimeField(auto_now=True)),
+                ('course', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='bundles', to='resources.course')),
+            ],
+            options={
+                'verbose_name': 'Resource Bundle',
+                'verbose_name_plural': 'Resource Bundles',
+                'unique_together': {('course', 'year_level', 'academic_year')},
+            },
+        ),
+    ]
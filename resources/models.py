@@ -1,6 +1,8 @@
-from django.db import models
+from django.core.exceptions import ValidationError
+from django.db import models, transaction
 from django.urls import reverse
 from django.contrib.auth.models import User
+from django.utils import timezone
 from datetime import datetime
 
 class University(models.Model):
@@ -38,6 +40,13 @@ class Course(models.Model):
         ordering = ['university', 'code']
         unique_together = ['university', 'code']
     
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        course = super().from_db(db, field_names, values)
+        # Compared on save: folder paths are rebuilt only when the code changed
+        course._loaded_code = dict(zip(field_names, values)).get('code')
+        return course
+    
     def __str__(self):
         return f"{self.code} - {self.name}"
     
@@ -53,20 +62,98 @@ class Module(models.Model):
     order = models.IntegerField(default=0)
     created_at = models.DateTimeField(auto_now_add=True)
     
+    # Materialized path, kept up to date by save(): ids from the root down
+    # to this module ("/3/17/42/"), so a subtree is one prefix query
+    tree_path = models.CharField(max_length=255, db_index=True, editable=False, blank=True)
+    depth = models.PositiveSmallIntegerField(default=0, editable=False)
+    # "CSC101 > Exams > 2024", rendered without walking the parents
+    full_path = models.TextField(blank=True, editable=False)
+    
     class Meta:
         app_label = 'resources'
         ordering = ['course', 'order', 'name']
     
     def __str__(self):
-        if self.parent_module:
-            return f"{self.parent_module} > {self.name}"
-        return f"{self.course.code} - {self.name}"
+        return self.full_path.replace(' > ', ' - ', 1)
     
     @property
     def path(self):
-        if self.parent_module:
-            return f"{self.parent_module.path} > {self.name}"
-        return f"{self.course.code} > {self.name}"
+        return self.full_path
+    
+    @property
+    def ancestor_ids(self):
+        return [int(pk) for pk in self.tree_path.strip('/').split('/')[:-1] if pk]
+    
+    def ancestors(self):
+        """Parent folders from the root down, in one query"""
+        return Module.objects.filter(pk__in=self.ancestor_ids).order_by('depth')
+    
+    def subtree(self):
+        """This module and every module below it"""
+        return Module.objects.filter(tree_path__startswith=self.tree_path)
+    
+    def all_resources(self):
+        """Resources in this module or any of its subfolders"""
+        return Resource.objects.filter(module__tree_path__startswith=self.tree_path)
+    
+    def clean(self):
+        parent = self.parent_module
+        if parent and self.pk and (parent.pk == self.pk or self.pk in parent.ancestor_ids):
+            raise ValidationError({'parent_module': "A folder can't be moved inside itself."})
+    
+    def save(self, *args, **kwargs):
+        parent = self.parent_module
+        self.depth = parent.depth + 1 if parent else 0
+        self.full_path = f"{parent.full_path if parent else self.course.code} > {self.name}"
+        if kwargs.get('update_fields') is not None:
+            kwargs['update_fields'] = {*kwargs['update_fields'], 'depth', 'full_path', 'tree_path'}
+        
+        with transaction.atomic():
+            if self.pk:
+                old_tree_path, old_full_path = Module.objects.filter(pk=self.pk).values_list(
+                    'tree_path', 'full_path'
+                ).first() or (None, None)
+                self.tree_path = f"{parent.tree_path if parent else '/'}{self.pk}/"
+                # Before saving, so post_save receivers see the whole subtree moved
+                if old_tree_path and (old_tree_path, old_full_path) != (self.tree_path, self.full_path):
+                    self.rewrite_descendants(old_tree_path)
+            super().save(*args, **kwargs)
+            
+            # A new module only has an id to put in its path once inserted
+            if not self.tree_path:
+                self.tree_path = f"{parent.tree_path if parent else '/'}{self.pk}/"
+                Module.objects.filter(pk=self.pk).update(tree_path=self.tree_path)
+    
+    def rewrite_descendants(self, old_tree_path):
+        """Re-derive the paths below this module after a move or rename"""
+        descendants = list(
+            Module.objects.filter(tree_path__startswith=old_tree_path).exclude(pk=self.pk)
+        )
+        Module.link_paths(descendants, {self.pk: self})
+        Module.objects.bulk_update(descendants, ['tree_path', 'depth', 'full_path'], batch_size=500)
+    
+    @classmethod
+    def rebuild_paths(cls, course):
+        """Recompute every path in a course, e.g. after its code changed"""
+        modules = list(cls.objects.filter(course=course).select_related('course'))
+        cls.link_paths(modules, {})
+        cls.objects.bulk_update(modules, ['tree_path', 'depth', 'full_path'], batch_size=500)
+    
+    @staticmethod
+    def link_paths(modules, known):
+        """Set paths on ``modules`` from their parents, found in ``known`` or the list itself"""
+        children = {}
+        for module in modules:
+            children.setdefault(module.parent_module_id, []).append(module)
+        level = [m for m in modules if m.parent_module_id is None or m.parent_module_id in known]
+        while level:
+            for module in level:
+                parent = known.get(module.parent_module_id)
+                module.depth = parent.depth + 1 if parent else 0
+                module.tree_path = f"{parent.tree_path if parent else '/'}{module.pk}/"
+                module.full_path = f"{parent.full_path if parent else module.course.code} > {module.name}"
+                known[module.pk] = module
+            level = [child for module in level for child in children.get(module.pk, [])]
 
 class ResourceType(models.Model):
     """Types: Test, Quiz, Exam, Lab, Notes, etc."""
@@ -99,6 +186,9 @@ class Resource(models.Model):
         (0, 'Full Year'),
     ]
     
+    # Academic years kept by the prune_resources command
+    RETENTION_YEARS = 3
+    
     university = models.ForeignKey(University, on_delete=models.CASCADE)
     course = models.ForeignKey(Course, on_delete=models.CASCADE)
     module = models.ForeignKey(Module, on_delete=models.CASCADE, blank=True, null=True)
@@ -117,11 +207,18 @@ class Resource(models.Model):
     
     file = models.FileField(upload_to='resources/%Y/%m/')
     file_size = models.IntegerField(default=0)
+    # Filled from the bytes on upload (resources/uploads.py)
+    content_hash = models.CharField(max_length=64, blank=True, db_index=True, editable=False)
+    mime_type = models.CharField(max_length=100, blank=True, editable=False)
+    page_count = models.PositiveIntegerField(blank=True, null=True, editable=False)
     
     uploaded_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True)
     uploaded_at = models.DateTimeField(auto_now_add=True)
     downloads = models.IntegerField(default=0)
     
+    # Course/university/module/type/year words, indexed for full-text search
+    search_keywords = models.TextField(blank=True, editable=False)
+    
     class Meta:
         app_label = 'resources'
         ordering = ['-academic_year', 'course', 'resource_type']
@@ -139,24 +236,191 @@ class Resource(models.Model):
         # Ensure academic_year is set
         if not self.academic_year:
             self.academic_year = datetime.now().year
+        self.search_keywords = self.build_search_keywords()
+        update_fields = {'search_keywords'}
+        if self.file and not self.file._committed:
+            # New upload: hash it and store it by content, sharing duplicates
+            from .uploads import store
+            store(self)
+            update_fields |= {'file', 'file_size', 'content_hash', 'mime_type', 'page_count'}
+        if kwargs.get('update_fields') is not None:
+            kwargs['update_fields'] = {*kwargs['update_fields'], *update_fields}
         super().save(*args, **kwargs)
-        self.cleanup_old_years()
+    
+    def build_search_keywords(self):
+        parts = [
+            self.course.code, self.course.name,
+            self.university.code, self.university.name,
+            self.module.path if self.module_id else '',
+            self.resource_type.name,
+            self.get_year_level_display(), str(self.academic_year),
+            self.get_semester_display(),
+        ]
+        return ' '.join(part for part in parts if part)
+    
+    @classmethod
+    def expired(cls, keep_years=None):
+        """Resources older than the most recent ``keep_years`` academic years"""
+        keep_years = keep_years or cls.RETENTION_YEARS
+        return cls.objects.filter(academic_year__lte=datetime.now().year - keep_years)
+
+class ResourceText(models.Model):
+    """Text extracted from a resource's PDF, one form-feed separated page at a time"""
+    # No database FK: resources_resource is partitioned on PostgreSQL (resources/partitions.py)
+    resource = models.OneToOneField(
+        Resource, on_delete=models.CASCADE, primary_key=True, related_name='extracted_text', db_constraint=False
+    )
+    content = models.TextField(blank=True)
+    page_count = models.IntegerField(default=0)
+    # The file this text came from; a re-upload gets a new storage name
+    source_name = models.CharField(max_length=255)
+    error = models.CharField(max_length=255, blank=True)
+    extracted_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        app_label = 'resources'
+        verbose_name = 'Resource Text'
+        verbose_name_plural = 'Resource Texts'
+    
+    def __str__(self):
+        return f"Text of {self.resource_id} ({self.page_count} pages)"
+    
+    @property
+    def pages(self):
+        return self.content.split('\f') if self.content else []
+
+class ResourcePreview(models.Model):
+    """First-page thumbnail and preview image of a resource, rendered by render_previews"""
+    # No database FK: resources_resource is partitioned on PostgreSQL (resources/partitions.py)
+    resource = models.OneToOneField(
+        Resource, on_delete=models.CASCADE, primary_key=True, related_name='preview', db_constraint=False
+    )
+    thumbnail = models.ImageField(upload_to='previews/', blank=True)
+    image = models.ImageField(upload_to='previews/', blank=True)
+    # The file these came from; a re-upload gets a new storage name
+    source_name = models.CharField(max_length=255)
+    error = models.CharField(max_length=255, blank=True)
+    rendered_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        app_label = 'resources'
+        verbose_name = 'Resource Preview'
+        verbose_name_plural = 'Resource Previews'
+    
+    def __str__(self):
+        return f"Preview of {self.resource_id}"
+
+class ArchivedResource(models.Model):
+    """Cold copy of a resource removed by prune_resources --archive"""
+    original_id = models.IntegerField(db_index=True)
+    university_code = models.CharField(max_length=20)
+    course_code = models.CharField(max_length=20)
+    module_path = models.CharField(max_length=500, blank=True)
+    resource_type = models.CharField(max_length=50)
+    title = models.CharField(max_length=200)
+    description = models.TextField(blank=True, null=True)
+    year_level = models.IntegerField()
+    academic_year = models.IntegerField(db_index=True)
+    semester = models.IntegerField()
+    # Storage name only: pruning deletes rows, never the stored file
+    file = models.CharField(max_length=255)
+    file_size = models.IntegerField(default=0)
+    uploaded_by_id = models.IntegerField(blank=True, null=True)
+    uploaded_at = models.DateTimeField()
+    downloads = models.IntegerField(default=0)
+    archived_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        app_label = 'resources'
+        ordering = ['-academic_year', 'course_code']
+        verbose_name = 'Archived Resource'
+        verbose_name_plural = 'Archived Resources'
+    
+    def __str__(self):
+        return f"{self.course_code} - {self.title} ({self.academic_year}, archived)"
     
     @classmethod
-    def cleanup_old_years(cls):
-        """Keep only 3 most recent academic years"""
-        current_year = datetime.now().year
-        allowed_years = [current_year, current_year-1, current_year-2]
-        cls.objects.exclude(academic_year__in=allowed_years).delete()
+    def from_resource(cls, resource):
+        return cls(
+            original_id=resource.pk,
+            university_code=resource.university.code,
+            course_code=resource.course.code,
+            module_path=resource.module.path if resource.module_id else '',
+            resource_type=resource.resource_type.name,
+            title=resource.title,
+            description=resource.description,
+            year_level=resource.year_level,
+            academic_year=resource.academic_year,
+            semester=resource.semester,
+            file=resource.file.name,
+            file_size=resource.file_size,
+            uploaded_by_id=resource.uploaded_by_id,
+            uploaded_at=resource.uploaded_at,
+            downloads=resource.downloads,
+        )
 
 class ResourceDownload(models.Model):
     """Track downloads"""
-    resource = models.ForeignKey(Resource, on_delete=models.CASCADE)
+    # No database FK: resources_resource is partitioned on PostgreSQL (resources/partitions.py)
+    resource = models.ForeignKey(Resource, on_delete=models.CASCADE, db_constraint=False)
     user = models.ForeignKey(User, on_delete=models.SET_NULL, null=True)
-    downloaded_at = models.DateTimeField(auto_now_add=True)
+    downloaded_at = models.DateTimeField(default=timezone.now, db_index=True)
     ip_address = models.GenericIPAddressField(blank=True, null=True)
+    # False until flush_downloads adds it to Resource.downloads (resources/downloads.py)
+    counted = models.BooleanField(default=True)
     
     class Meta:
         app_label = 'resources'
+        indexes = [
+            models.Index(fields=['id'], condition=models.Q(counted=False), name='resources_download_uncounted'),
+        ]
         verbose_name = 'Resource Download'
-        verbose_name_plural = 'Resource Downloads'
\ No newline at end of file
+        verbose_name_plural = 'Resource Downloads'
+
+
+class DownloadRollup(models.Model):
+    """Downloads of one resource on one day, maintained by rollup_downloads"""
+    day = models.DateField()
+    # Kept (with resource emptied) when the resource is pruned, so course and
+    # university totals survive; no database FK as resources_resource is partitioned
+    resource = models.ForeignKey(
+        Resource, on_delete=models.SET_NULL, null=True, blank=True, related_name='download_rollups', db_constraint=False
+    )
+    course = models.ForeignKey(Course, on_delete=models.CASCADE, related_name='download_rollups')
+    university = models.ForeignKey(University, on_delete=models.CASCADE, related_name='download_rollups')
+    downloads = models.IntegerField(default=0)
+    
+    class Meta:
+        app_label = 'resources'
+        ordering = ['-day', '-downloads']
+        unique_together = ['day', 'resource']
+        indexes = [
+            models.Index(fields=['course', 'day']),
+            models.Index(fields=['university', 'day']),
+        ]
+        verbose_name = 'Daily Downloads'
+        verbose_name_plural = 'Daily Downloads'
+    
+    def __str__(self):
+        return f"{self.day}: {self.downloads} downloads of {self.resource_id or 'a removed resource'}"
+
+
+class ResourceBundle(models.Model):
+    """ZIP of a course year's papers prebuilt by build_resource_bundles (resources/bundles.py)"""
+    course = models.ForeignKey(Course, on_delete=models.CASCADE, related_name='bundles')
+    year_level = models.IntegerField()
+    academic_year = models.IntegerField()
+    # Of the papers inside; once they change the bundle is stale until rebuilt
+    fingerprint = models.CharField(max_length=16)
+    # The name storage.save() returned, which remote storages (Cloudinary) choose themselves
+    name = models.CharField(max_length=255)
+    built_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        app_label = 'resources'
+        unique_together = ['course', 'year_level', 'academic_year']
+        verbose_name = 'Resource Bundle'
+        verbose_name_plural = 'Resource Bundles'
+    
+    def __str__(self):
+        return f"{self.course_id} year {self.year_level} {self.academic_year} bundle"
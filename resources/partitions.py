@@ -0,0 +1,234 @@
+"""
+PostgreSQL list partitioning of resources_resource by academic_year.
+
+Every academic year gets its own partition (resources_resource_y2024, ...)
+and a default partition catches years nobody created ahead of time, so
+inserts never fail. Browse queries filter on academic_year and are pruned
+to a single partition; retention drops whole partitions instead of
+deleting rows.
+
+A partitioned table can only be referenced by a foreign key that includes
+the partition key, so downloads, extracted text and previews point at
+resources without a database constraint (db_constraint=False) and their
+rows are removed here, or by the ORM's cascade, before a resource goes.
+
+The conversion rewrites the whole table, so it is never run by a
+migration: the operator runs `manage.py resource_partitions --convert`
+in a maintenance window. It refuses tables it can't carry over exactly
+(unique constraints without academic_year, foreign keys from other
+tables) instead of dropping them.
+
+SQLite (dev) and other backends keep the plain table; every function
+here is a no-op for them.
+"""
+import re
+
+from django.db import connection, transaction
+
+TABLE = 'resources_resource'
+DEFAULT_PARTITION = f'{TABLE}_default'
+# Tables whose rows belong to a resource, with the column pointing at it
+DEPENDENTS = [
+    ('resources_resourcedownload', 'resource_id'),
+    ('resources_resourcetext', 'resource_id'),
+    ('resources_resourcepreview', 'resource_id'),
+]
+# Tables that keep their rows, with the resource emptied, when it goes
+DETACHED = [
+    ('resources_downloadrollup', 'resource_id'),
+]
+
+
+def partition_name(year):
+    return f'{TABLE}_y{int(year)}'
+
+
+def is_partitioned(conn=connection):
+    if conn.vendor != 'postgresql':
+        return False
+    with conn.cursor() as cursor:
+        cursor.execute("SELECT relkind FROM pg_class WHERE oid = to_regclass(%s)", [TABLE])
+        row = cursor.fetchone()
+    return bool(row) and row[0] == 'p'
+
+
+def partitions(conn=connection):
+    """{academic year: partition name} for the per-year partitions"""
+    if not is_partitioned(conn):
+        return {}
+    with conn.cursor() as cursor:
+        cursor.execute(
+            "SELECT child.relname FROM pg_inherits JOIN pg_class child ON child.oid = pg_inherits.inhrelid "
+            "WHERE pg_inherits.inhparent = to_regclass(%s)",
+            [TABLE],
+        )
+        names = [row[0] for row in cursor.fetchall()]
+    years = {}
+    for name in names:
+        match = re.fullmatch(rf'{TABLE}_y(\d+)', name)
+        if match:
+            years[int(match.group(1))] = name
+    return years
+
+
+def create_partition(year, conn=connection):
+    """
+    Create the partition for ``year``. Rows already parked in the default
+    partition for that year are moved into it. Returns False if it existed.
+    """
+    if not is_partitioned(conn) or year in partitions(conn):
+        return False
+    name = partition_name(year)
+    with transaction.atomic(using=conn.alias), conn.cursor() as cursor:
+        # Attaching checks the default partition holds no rows for the year,
+        # so they are moved into the new table before it is attached
+        cursor.execute(f"CREATE TABLE {name} (LIKE {TABLE} INCLUDING DEFAULTS)")
+        cursor.execute(f"INSERT INTO {name} SELECT * FROM {DEFAULT_PARTITION} WHERE academic_year = %s", [year])
+        cursor.execute(f"DELETE FROM {DEFAULT_PARTITION} WHERE academic_year = %s", [year])
+        cursor.execute(f"ALTER TABLE {TABLE} ATTACH PARTITION {name} FOR VALUES IN ({int(year)})")
+    return True
+
+
+def drop_partition(year, conn=connection):
+    """Drop the partition for ``year`` with its dependent rows. Returns rows removed."""
+    name = partitions(conn).get(year)
+    if name is None:
+        return 0
+    with transaction.atomic(using=conn.alias), conn.cursor() as cursor:
+        cursor.execute(f"SELECT count(*) FROM {name}")
+        count = cursor.fetchone()[0]
+        for table, column in DEPENDENTS:
+            cursor.execute(f"DELETE FROM {table} WHERE {column} IN (SELECT id FROM {name})")
+        for table, column in DETACHED:
+            cursor.execute(f"UPDATE {table} SET {column} = NULL WHERE {column} IN (SELECT id FROM {name})")
+        cursor.execute(f"ALTER TABLE {TABLE} DETACH PARTITION {name}")
+        cursor.execute(f"DROP TABLE {name}")
+    return count
+
+
+class PartitionError(Exception):
+    pass
+
+
+def blockers(conn=connection):
+    """Reasons resources_resource can't be converted as it stands (empty if it can)"""
+    if conn.vendor != 'postgresql' or is_partitioned(conn):
+        return []
+    with conn.cursor() as cursor:
+        # Incoming keys can't point at a partitioned table by id alone; the
+        # models referencing resources declare db_constraint=False
+        cursor.execute(
+            "SELECT conrelid::regclass::text, conname FROM pg_constraint WHERE confrelid = to_regclass(%s) AND contype = 'f'",
+            [TABLE],
+        )
+        reasons = [f'foreign key {name} on {table} references it' for table, name in cursor.fetchall()]
+        cursor.execute(
+            "SELECT indexrelid::regclass::text, pg_get_indexdef(indexrelid) FROM pg_index "
+            "WHERE indrelid = to_regclass(%s) AND indisunique AND NOT indisprimary",
+            [TABLE],
+        )
+        reasons += [
+            f'unique index {name} does not include academic_year'
+            for name, definition in cursor.fetchall() if 'academic_year' not in definition
+        ]
+    return reasons
+
+
+def partition_table(conn):
+    """
+    Convert the plain resources_resource into a partitioned table.
+
+    The old table is renamed, an empty partitioned copy takes its name
+    (same columns, defaults, id sequence, indexes, unique and outgoing
+    foreign key constraints, with (id, academic_year) as primary key:
+    ids stay unique through the sequence), one partition is created per
+    academic year present plus the default, and the rows are copied
+    across. Raises PartitionError, changing nothing, if blockers() finds
+    anything that can't be carried over.
+
+    Django creates ids as identity columns, which partitioned tables only
+    accept from PostgreSQL 17, so the copy takes its ids from a sequence
+    default instead, continuing after the old table's last id. Tables
+    created with a serial id keep their sequence.
+    """
+    if conn.vendor != 'postgresql' or is_partitioned(conn):
+        return False
+    reasons = blockers(conn)
+    if reasons:
+        raise PartitionError('; '.join(reasons))
+    old = f'{TABLE}_unpartitioned'
+    with conn.cursor() as cursor:
+        cursor.execute(
+            "SELECT indexname, indexdef FROM pg_indexes WHERE tablename = %s "
+            "AND indexname NOT IN (SELECT conname FROM pg_constraint WHERE conrelid = to_regclass(%s))",
+            [TABLE, TABLE],
+        )
+        indexes = cursor.fetchall()
+        cursor.execute(
+            "SELECT conname, pg_get_constraintdef(oid) FROM pg_constraint "
+            "WHERE conrelid = to_regclass(%s) AND contype IN ('f', 'u')",
+            [TABLE],
+        )
+        constraints = cursor.fetchall()
+        cursor.execute("SELECT pg_get_serial_sequence(%s, 'id')", [TABLE])
+        sequence = cursor.fetchone()[0]
+        cursor.execute("SELECT attidentity FROM pg_attribute WHERE attrelid = to_regclass(%s) AND attname = 'id'", [TABLE])
+        identity = cursor.fetchone()[0]
+
+        cursor.execute(f"ALTER TABLE {TABLE} RENAME TO {old}")
+        for name, _ in indexes:
+            cursor.execute(f'ALTER INDEX "{name}" RENAME TO "{name[:48]}_unpartitioned"')
+
+        cursor.execute(
+            f"CREATE TABLE {TABLE} (LIKE {old} INCLUDING DEFAULTS INCLUDING CONSTRAINTS INCLUDING STORAGE) "
+            f"PARTITION BY LIST (academic_year)"
+        )
+        cursor.execute(f"ALTER TABLE {TABLE} ADD PRIMARY KEY (id, academic_year)")
+        if identity:
+            # The identity's sequence goes with the old table; setval below
+            # moves the new one past the copied ids
+            cursor.execute(f"CREATE SEQUENCE {TABLE}_id_partitioned_seq OWNED BY {TABLE}.id")
+            cursor.execute(f"ALTER TABLE {TABLE} ALTER COLUMN id SET DEFAULT nextval('{TABLE}_id_partitioned_seq')")
+        elif sequence:
+            # A serial default still points at the old table's sequence: move
+            # its ownership so dropping the old table keeps it
+            cursor.execute("SELECT pg_get_serial_sequence(%s, 'id')", [TABLE])
+            if cursor.fetchone()[0] is None:
+                cursor.execute(f"ALTER SEQUENCE {sequence} OWNED BY {TABLE}.id")
+        # Captured before the rename, so the definitions name the new table
+        for name, definition in indexes:
+            cursor.execute(definition)
+        for name, definition in constraints:
+            cursor.execute(f'ALTER TABLE {TABLE} ADD CONSTRAINT "{name}" {definition}')
+
+        cursor.execute(f"CREATE TABLE {DEFAULT_PARTITION} PARTITION OF {TABLE} DEFAULT")
+        cursor.execute(f"SELECT DISTINCT academic_year FROM {old} WHERE academic_year IS NOT NULL")
+        for (year,) in cursor.fetchall():
+            cursor.execute(f"CREATE TABLE {partition_name(year)} PARTITION OF {TABLE} FOR VALUES IN ({int(year)})")
+
+        cursor.execute(f"INSERT INTO {TABLE} SELECT * FROM {old}")
+        cursor.execute(
+            f"SELECT setval(pg_get_serial_sequence(%s, 'id'), coalesce(max(id), 0) + 1, false) FROM {TABLE}",
+            [TABLE],
+        )
+        cursor.execute(f"DROP TABLE {old}")
+        if identity:
+            cursor.execute(f"ALTER SEQUENCE {TABLE}_id_partitioned_seq RENAME TO {TABLE}_id_seq")
+    return True
+
+
+def convert(years, conn=connection):
+    """
+    Partition resources_resource in one transaction, with partitions for
+    ``years`` up front, and rebuild its full-text trigger on the new table.
+    Returns False if there was nothing to do.
+    """
+    from posts import search
+
+    with transaction.atomic(using=conn.alias):
+        if not partition_table(conn):
+            return False
+        for year in years:
+            create_partition(year, conn)
+        search.rebuild(conn, ['resource'])
+    return True
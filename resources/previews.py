@@ -0,0 +1,186 @@
+"""
+First-page thumbnails and preview images for resources.
+
+The browse pages show a small thumbnail per paper that opens a larger
+first-page preview, so students can check they have the right paper
+before downloading the whole PDF. render_previews runs as the worker
+process (see Procfile): it picks up new and re-uploaded files the same
+way text extraction does, and renders them in a process pool
+(extraction.run_pool).
+
+Pages are rasterized with poppler's pdftoppm when it is installed.
+Without it, the largest image embedded in the first page is used, which
+covers scanned papers. Text-only pages then get no preview, and the pages
+keep showing the file icon.
+
+Variants are stored under previews/<content hash>/, so a URL never changes
+meaning and can be cached for as long as the CDN or web server likes, and
+copies of the same paper share one rendering.
+"""
+import hashlib
+import io
+import os
+import shutil
+import subprocess
+import tempfile
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db.models import F, Q
+
+from .extraction import run_pool
+from .models import Resource, ResourcePreview
+
+# Bounding boxes (width, height) of the variants, A4 proportions
+THUMBNAIL_SIZE = getattr(settings, 'RESOURCE_THUMBNAIL_SIZE', (240, 340))
+PREVIEW_SIZE = getattr(settings, 'RESOURCE_PREVIEW_SIZE', (900, 1273))
+RENDER_TIMEOUT = 60
+
+
+def rasterize(data):
+    """First PDF page as a PIL image via pdftoppm, or None if it isn't installed"""
+    from PIL import Image
+
+    if not shutil.which('pdftoppm'):
+        return None
+    with tempfile.TemporaryDirectory() as tmp:
+        source = os.path.join(tmp, 'source.pdf')
+        with open(source, 'wb') as f:
+            f.write(data)
+        subprocess.run(
+            ['pdftoppm', '-f', '1', '-l', '1', '-singlefile', '-png',
+             '-scale-to', str(max(PREVIEW_SIZE)), source, os.path.join(tmp, 'page')],
+            check=True, capture_output=True, timeout=RENDER_TIMEOUT,
+        )
+        image = Image.open(os.path.join(tmp, 'page.png'))
+        image.load()
+        return image
+
+
+def embedded_image(data):
+    """Largest image on the first PDF page (the scan of a scanned paper), or None"""
+    from pypdf import PdfReader
+
+    reader = PdfReader(io.BytesIO(data))
+    if not reader.pages:
+        return None
+    images = [file.image for file in reader.pages[0].images]
+    return max(images, key=lambda image: image.width * image.height, default=None)
+
+
+def first_page(data):
+    from PIL import Image
+
+    if data[:1024].lstrip().startswith(b'%PDF-'):
+        image = rasterize(data) or embedded_image(data)
+        if image is None:
+            raise ValueError('no image on the first page and pdftoppm is not installed')
+        return image
+    image = Image.open(io.BytesIO(data))
+    image.load()
+    return image
+
+
+def jpeg(image, size, quality):
+    from PIL import Image
+
+    if image.mode in ('RGBA', 'LA', 'P'):
+        # Transparent scans and PNGs go on white paper, not black
+        image = image.convert('RGBA')
+        background = Image.new('RGB', image.size, 'white')
+        background.paste(image, mask=image.getchannel('A'))
+        image = background
+    elif image.mode != 'RGB':
+        image = image.convert('RGB')
+    else:
+        image = image.copy()
+    image.thumbnail(size)
+    out = io.BytesIO()
+    image.save(out, 'JPEG', quality=quality, optimize=True, progressive=True)
+    return out.getvalue()
+
+
+def render_worker(data):
+    """Runs in a pool process: never touches the database"""
+    try:
+        image = first_page(data)
+        return {'thumbnail': jpeg(image, THUMBNAIL_SIZE, 70), 'image': jpeg(image, PREVIEW_SIZE, 80)}, ''
+    except Exception as e:
+        return None, f'{type(e).__name__}: {e}'[:255]
+
+
+def pending(force=False, retry_failed=False):
+    """Resources whose file has no up-to-date preview"""
+    resources = Resource.objects.exclude(file='').order_by('pk')
+    if force:
+        return resources
+    stale = Q(preview__isnull=True) | ~Q(preview__source_name=F('file'))
+    if retry_failed:
+        stale |= ~Q(preview__error='')
+    return resources.filter(stale)
+
+
+def storage_key(resource):
+    return resource.content_hash or hashlib.sha256(resource.file.name.encode()).hexdigest()
+
+
+def store_variants(resource, variants):
+    """Save rendered JPEGs (unless this content's are stored already). Returns their names."""
+    key = storage_key(resource)
+    names = {}
+    for field, filename in (('thumbnail', 'thumb.jpg'), ('image', 'preview.jpg')):
+        name = f'previews/{key[:2]}/{key}/{filename}'
+        if not default_storage.exists(name):
+            name = default_storage.save(name, ContentFile(variants[field]))
+        names[field] = name
+    return names
+
+
+def save_result(resource, names, error):
+    ResourcePreview.objects.update_or_create(
+        resource_id=resource.pk,
+        defaults={**names, 'source_name': resource.file.name, 'error': error},
+    )
+
+
+def share_existing(resources):
+    """
+    Point resources whose content already has a preview (the same paper in
+    another course) at it instead of rendering again. Returns
+    (resources still to render, number shared).
+    """
+    rendered = dict(
+        ResourcePreview.objects.filter(
+            error='', source_name=F('resource__file'),
+            resource__content_hash__in=resources.exclude(content_hash='').values('content_hash'),
+        ).values_list('resource__content_hash', 'pk')
+    )
+    if not rendered:
+        return resources, 0
+    previews = ResourcePreview.objects.in_bulk(rendered.values())
+    shared = []
+    for resource in resources.filter(content_hash__in=rendered).only('pk', 'file', 'content_hash'):
+        preview = previews[rendered[resource.content_hash]]
+        save_result(resource, {'thumbnail': preview.thumbnail.name, 'image': preview.image.name}, '')
+        shared.append(resource.pk)
+    return resources.exclude(pk__in=shared), len(shared)
+
+
+def render(resources, workers=1, on_result=None):
+    """Render and save previews for ``resources``. Returns (rendered, failed)."""
+    rendered = failed = 0
+
+    def finish(resource, variants, error):
+        nonlocal rendered, failed
+        names = store_variants(resource, variants) if variants else {'thumbnail': '', 'image': ''}
+        save_result(resource, names, error)
+        if error:
+            failed += 1
+        else:
+            rendered += 1
+        if on_result:
+            on_result(resource.pk, error)
+
+    run_pool(resources.only('pk', 'file', 'content_hash'), render_worker, finish, workers)
+    return rendered, failed
@@ -0,0 +1,84 @@
+"""
+Daily download rollups.
+
+rollup() folds raw ResourceDownload rows into one DownloadRollup row per
+resource per day. Each run recomputes from the last rolled-up day onwards
+(that day may have been partial, and write-behind flushes can land late),
+so it is cheap and safe to run as often as cron likes. Everything that
+reports on downloads reads the rollups only, never the raw event table.
+"""
+from datetime import datetime, time, timedelta
+
+from django.db import transaction
+from django.db.models import Count, Max, Min, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .models import DownloadRollup, ResourceDownload
+
+
+def rollup(since=None):
+    """Recompute rollups for every day from ``since``. Returns (first day, rows written)."""
+    if since is None:
+        since = DownloadRollup.objects.aggregate(last=Max('day'))['last']
+    if since is None:
+        first = ResourceDownload.objects.aggregate(first=Min('downloaded_at'))['first']
+        if first is None:
+            return None, 0
+        since = timezone.localdate(first)
+
+    start = timezone.make_aware(datetime.combine(since, time.min))
+    counts = (
+        ResourceDownload.objects.filter(downloaded_at__gte=start)
+        .annotate(day=TruncDate('downloaded_at'))
+        .values('day', 'resource_id', 'resource__course_id', 'resource__university_id')
+        .annotate(downloads=Count('id'))
+        .order_by()
+    )
+    rows = [
+        DownloadRollup(
+            day=row['day'], resource_id=row['resource_id'], course_id=row['resource__course_id'],
+            university_id=row['resource__university_id'], downloads=row['downloads'],
+        )
+        for row in counts
+    ]
+    with transaction.atomic():
+        DownloadRollup.objects.filter(day__gte=since, resource__isnull=False).delete()
+        DownloadRollup.objects.bulk_create(rows, batch_size=1000)
+    return since, len(rows)
+
+
+def window(days, course=None, university=None):
+    """Rollups for the last ``days`` days (today included)"""
+    rollups = DownloadRollup.objects.filter(day__gt=timezone.localdate() - timedelta(days=days))
+    if course is not None:
+        rollups = rollups.filter(course=course)
+    if university is not None:
+        rollups = rollups.filter(university=university)
+    return rollups
+
+
+def top_resources(days=7, course=None, university=None, limit=10):
+    """[{'resource_id', 'downloads'}] most downloaded over the window"""
+    return list(
+        window(days, course, university)
+        .filter(resource__isnull=False)
+        .values('resource_id')
+        .annotate(downloads=Sum('downloads'))
+        .order_by('-downloads', 'resource_id')[:limit]
+    )
+
+
+def daily_series(days=30, course=None, university=None):
+    """[(day, downloads)] for every day of the window, zeros included"""
+    totals = dict(
+        window(days, course, university)
+        .values_list('day')
+        .annotate(downloads=Sum('downloads'))
+        .order_by()
+    )
+    today = timezone.localdate()
+    return [
+        (day, totals.get(day, 0))
+        for day in (today - timedelta(days=offset) for offset in range(days - 1, -1, -1))
+    ]
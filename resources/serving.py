@@ -0,0 +1,157 @@
+"""
+Serving resource files.
+
+Remote storages (Cloudinary) get a redirect and their CDN handles the
+rest. Files on local disk (RESOURCE_STORAGE = 'local') are answered here:
+
+- RESOURCE_ACCEL_REDIRECT set: an empty response with X-Accel-Redirect,
+  so nginx reads the file (ranges and sendfile included) and Python never
+  touches the body.
+- Otherwise a FileResponse. Under gunicorn the file goes through
+  wsgi.file_wrapper, i.e. sendfile(), for the whole file or for a single
+  Range (the file is positioned at the range start and Content-Length
+  stops it at the range end).
+
+ETag and Last-Modified come from the stored name, size and mtime, so
+conditional requests, If-Range and the long max-age stay correct across
+re-uploads (a re-upload gets a new stored name).
+"""
+import hashlib
+import mimetypes
+import os
+import re
+from urllib.parse import quote
+
+from django.conf import settings
+from django.http import FileResponse, HttpResponse, HttpResponseRedirect
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date, parse_http_date_safe, quote_etag
+from django.utils.text import get_valid_filename
+
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+def local_path(file):
+    """Filesystem path of a stored file, or None for remote storages"""
+    try:
+        return file.storage.path(file.name)
+    except NotImplementedError:
+        return None
+
+
+def parse_range(header, size):
+    """
+    ``(start, end)`` inclusive for a single byte range, None to serve the
+    whole file (no header, several ranges, or garbage), or False if the
+    range can't be satisfied.
+    """
+    match = RANGE_RE.match(header.strip()) if header else None
+    if not match or match.groups() == ('', ''):
+        return None
+    first, last = match.groups()
+    if first == '':
+        # Suffix range: the last N bytes
+        length = int(last)
+        if length == 0:
+            return False
+        return max(size - length, 0), size - 1
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if last and int(last) < start:
+        return None
+    if start >= size:
+        return False
+    return start, end
+
+
+class RangeFile:
+    """A file positioned at ``start`` that reads at most ``length`` bytes"""
+
+    def __init__(self, file, start, length):
+        file.seek(start)
+        self.file = file
+        self.remaining = length
+
+    def read(self, size=-1):
+        if size < 0 or size > self.remaining:
+            size = self.remaining
+        data = self.file.read(size)
+        self.remaining -= len(data)
+        return data
+
+    def fileno(self):
+        # sendfile() starts at the current offset and stops at Content-Length
+        return self.file.fileno()
+
+    def tell(self):
+        return self.file.tell()
+
+    def close(self):
+        self.file.close()
+
+
+def download_name(resource):
+    """Stored names are content hashes (resources/uploads.py): name the file after its title"""
+    ext = os.path.splitext(resource.file.name)[1]
+    title = get_valid_filename(resource.title) if resource.title else ''
+    return f'{title}{ext}' if title else os.path.basename(resource.file.name)
+
+
+def serve(request, resource, as_attachment=False):
+    file = resource.file
+    path = local_path(file)
+    if path is None:
+        url = file.url + ('?fl_attachment=true' if as_attachment else '')
+        return HttpResponseRedirect(url)
+
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return HttpResponse('File not found', status=404)
+    size, mtime = stat.st_size, int(stat.st_mtime)
+    etag = quote_etag(hashlib.md5(f'{file.name}:{size}:{mtime}'.encode()).hexdigest())
+    content_type = mimetypes.guess_type(file.name)[0] or 'application/octet-stream'
+    filename = download_name(resource)
+
+    response = get_conditional_response(request, etag=etag, last_modified=mtime)
+    if response is None:
+        byte_range = parse_range(request.headers.get('Range'), size)
+        if byte_range is not None and not if_range_holds(request, etag, mtime):
+            byte_range = None
+
+        if byte_range is False:
+            response = HttpResponse(status=416)
+            response['Content-Range'] = f'bytes */{size}'
+        elif getattr(settings, 'RESOURCE_ACCEL_REDIRECT', ''):
+            # nginx applies Range/If-Range itself to the internal location
+            response = HttpResponse(content_type=content_type)
+            response['X-Accel-Redirect'] = settings.RESOURCE_ACCEL_REDIRECT.rstrip('/') + '/' + quote(file.name)
+        elif byte_range is None:
+            response = FileResponse(open(path, 'rb'), content_type=content_type)
+        else:
+            start, end = byte_range
+            length = end - start + 1
+            response = FileResponse(RangeFile(open(path, 'rb'), start, length), content_type=content_type, status=206)
+            response['Content-Length'] = length
+            response['Content-Range'] = f'bytes {start}-{end}/{size}'
+
+        if response.status_code != 416:
+            disposition = 'attachment' if as_attachment else 'inline'
+            response['Content-Disposition'] = f"{disposition}; filename*=UTF-8''{quote(filename)}"
+
+    response['Accept-Ranges'] = 'bytes'
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(mtime)
+    patch_cache_control(response, public=True, max_age=getattr(settings, 'RESOURCE_FILE_MAX_AGE', 7 * 24 * 3600))
+    return response
+
+
+def if_range_holds(request, etag, mtime):
+    """A Range only applies if If-Range (when sent) still names this file"""
+    if_range = request.headers.get('If-Range')
+    if not if_range:
+        return True
+    if if_range.startswith('"') or if_range.startswith('W/'):
+        # Strong comparison: a weak validator never matches
+        return if_range == etag
+    return parse_http_date_safe(if_range) == mtime
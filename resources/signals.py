@@ -0,0 +1,51 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from .models import University, Course, Module, ResourceType, Resource
+from . import catalog
+
+
+def refresh_search_keywords(resources):
+    """Recompute denormalized search keywords after a related row changed"""
+    resources = list(resources.select_related('university', 'course', 'resource_type', 'module'))
+    for resource in resources:
+        resource.search_keywords = resource.build_search_keywords()
+    Resource.objects.bulk_update(resources, ['search_keywords'], batch_size=500)
+
+
+@receiver(post_save, sender=University)
+def university_saved(sender, instance, created, raw=False, **kwargs):
+    if not created and not raw:
+        refresh_search_keywords(Resource.objects.filter(university=instance))
+
+
+@receiver(post_save, sender=Course)
+def course_saved(sender, instance, created, raw=False, update_fields=None, **kwargs):
+    if not created and not raw:
+        # Folder paths start with the course code
+        code_saved = update_fields is None or 'code' in update_fields
+        if code_saved and instance.code != getattr(instance, '_loaded_code', None):
+            Module.rebuild_paths(instance)
+        instance._loaded_code = instance.code
+        refresh_search_keywords(Resource.objects.filter(course=instance))
+
+
+@receiver(post_save, sender=Module)
+def module_saved(sender, instance, created, raw=False, **kwargs):
+    if not created and not raw:
+        refresh_search_keywords(instance.all_resources())
+
+
+@receiver(post_save, sender=ResourceType)
+def resource_type_saved(sender, instance, created, raw=False, **kwargs):
+    if not created and not raw:
+        refresh_search_keywords(Resource.objects.filter(resource_type=instance))
+
+
+@receiver([post_save, post_delete], sender=University)
+@receiver([post_save, post_delete], sender=Course)
+@receiver([post_save, post_delete], sender=Module)
+@receiver([post_save, post_delete], sender=ResourceType)
+@receiver([post_save, post_delete], sender=Resource)
+def catalog_changed(sender, raw=False, **kwargs):
+    if not raw:
+        catalog.invalidate()
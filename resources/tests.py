@@ -1,3 +1,1034 @@
-from django.test import TestCase
+import io
+import json
+import os
+import shutil
+import tempfile
+import uuid
+import zipfile
+from datetime import timedelta
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.core.files.base import ContentFile
+from django.core.files.storage import FileSystemStorage
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from posts import typeahead
+from posts.search import UnifiedSearchResults
+from . import bundles, catalog, downloads, extraction, partitions, previews, rollups, uploads
+from .models import (
+    University, Course, Module, ResourceType, Resource, ResourceBundle, ResourceDownload, DownloadRollup,
+    ArchivedResource, ResourcePreview, ResourceText,
+)
+
+
+def pdf(pages=1, marker=''):
+    """A PDF of ``pages`` blank pages; ``marker`` makes the bytes differ"""
+    from pypdf import PdfWriter
+
+    writer = PdfWriter()
+    for _ in range(pages):
+        writer.add_blank_page(width=612, height=792)
+    if marker:
+        writer.add_metadata({'/Title': marker})
+    out = io.BytesIO()
+    writer.write(out)
+    return out.getvalue()
+
+
+def png(color='white', size=(1240, 1754)):
+    """A scanned page as PNG bytes"""
+    from PIL import Image
+
+    out = io.BytesIO()
+    Image.new('RGB', size, color).save(out, 'PNG')
+    return out.getvalue()
+
+
+class RenamingStorage(FileSystemStorage):
+    """Saves under a name of its own choosing, as Cloudinary does"""
+
+    def _save(self, name, content):
+        root, ext = os.path.splitext(name)
+        return super()._save(f'{root}-renamed{uuid.uuid4().hex[:6]}{ext}', content)
+
+
+PLAIN_STORAGES = {
+    'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+    'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'},
+}
+
+RENAMING_STORAGES = {
+    'default': {'BACKEND': 'resources.tests.RenamingStorage'},
+    'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'},
+}
+
+
+class ResourceTestCase(TestCase):
+    """A course with a folder and a resource type, stored under a throwaway MEDIA_ROOT"""
+
+    def setUp(self):
+        media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media, ignore_errors=True)
+        settings_override = override_settings(MEDIA_ROOT=media, RESOURCE_STORAGE='local', RESOURCE_ACCEL_REDIRECT='')
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.media = media
+        cache.clear()
+
+        self.university = University.objects.create(name='University of Botswana', code='ub')
+        self.course = Course.objects.create(university=self.university, code='CSC101', name='Programming')
+        self.module = Module.objects.create(course=self.course, name='Finals')
+        self.exam = ResourceType.objects.create(name='Exam')
+
+    def add_resource(self, data, name='paper.pdf', **fields):
+        fields = {
+            'university': self.university, 'course': self.course, 'module': self.module,
+            'resource_type': self.exam, 'title': 'Final paper', 'year_level': 1, 'academic_year': 2024,
+            **fields,
+        }
+        return Resource.objects.create(file=ContentFile(data, name), **fields)
+
+    def stored_blobs(self):
+        return sorted(name for _, _, names in os.walk(os.path.join(self.media, 'blobs')) for name in names)
+
+
+# ==================== ADMIN AUTOCOMPLETE ====================
+
+class AutocompleteTests(ResourceTestCase):
+    url = '/admin/autocomplete/?app_label=resources&model_name=resource&field_name=course'
+
+    def setUp(self):
+        super().setUp()
+        typeahead._index = None
+        Course.objects.bulk_create([
+            Course(university=self.university, code=f'CSC{number}', name='Computing') for number in range(102, 232)
+        ])
+        self.client.force_login(User.objects.create_superuser('admin', 'admin@example.com', 'pw'))
+
+    def lookup(self, term, page=1):
+        response = self.client.get(f'{self.url}&term={term}&page={page}')
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        return [result['text'] for result in data['results']], data['pagination']['more']
+
+    def test_pages_through_every_match(self):
+        seen = []
+        for page in range(1, 8):
+            results, more = self.lookup('csc', page)
+            seen += results
+        self.assertFalse(more)
+        self.assertEqual((len(results), len(set(seen))), (11, 131))
+
+    def test_best_match_comes_first(self):
+        results, _ = self.lookup('csc131')
+        self.assertEqual(results[0], 'CSC131 - Computing')
+        self.assertEqual(self.lookup('zzz'), ([], False))
+
+
+# ==================== SEARCH KEYWORDS ====================
+
+class SearchKeywordTests(ResourceTestCase):
+    def test_renaming_related_rows_refreshes_keywords(self):
+        chapter = Module.objects.create(course=self.course, parent_module=self.module, name='Chapter one')
+        paper = self.add_resource(pdf(), module=chapter)
+        renames = [
+            (self.university, 'name', 'Botswana University'),
+            (self.course, 'name', 'Structured Programming'),
+            (self.course, 'code', 'CSC111'),
+            (self.module, 'name', 'Examinations'),
+            (self.exam, 'name', 'Midterm'),
+        ]
+        for row, field, value in renames:
+            with self.subTest(f'{type(row).__name__}.{field}'):
+                setattr(row, field, value)
+                row.save()
+                paper.refresh_from_db()
+                self.assertIn(value, paper.search_keywords)
+                self.assertEqual(UnifiedSearchResults(value, kind='resource').count(), 1)
+
+
+# ==================== EXTRACTION ====================
+
+class ExtractionTests(ResourceTestCase):
+    def extract(self, *args):
+        out = io.StringIO()
+        call_command('extract_resource_text', '--workers', '1', '--verbosity', '2', *args, stdout=out)
+        return out.getvalue()
+
+    def pending(self, **kwargs):
+        return list(extraction.pending(**kwargs).values_list('pk', flat=True))
+
+    def test_pending_is_new_reuploaded_and_optionally_failed_files(self):
+        paper = self.add_resource(pdf(pages=2))
+        broken = self.add_resource(b'not a pdf at all', name='notes.pdf', title='Notes')
+        self.assertEqual(self.pending(), [paper.pk, broken.pk])
+
+        self.extract()
+        text = ResourceText.objects.get(resource=paper)
+        self.assertEqual((text.page_count, text.source_name, text.error), (2, paper.file.name, ''))
+        self.assertEqual(ResourceText.objects.get(resource=broken).error, 'ValueError: not a PDF')
+        self.assertEqual(self.pending(), [])
+        self.assertEqual(self.pending(retry_failed=True), [broken.pk])
+        self.assertEqual(self.pending(force=True), [paper.pk, broken.pk])
+
+        paper.file = ContentFile(pdf(pages=3, marker='corrected'), 'paper.pdf')
+        paper.save()
+        self.assertEqual(self.pending(), [paper.pk])
+        self.extract()
+        self.assertEqual(ResourceText.objects.get(resource=paper).page_count, 3)
+
+    def test_interrupted_runs_resume_where_they_stopped(self):
+        papers = [self.add_resource(pdf(marker=str(n)), title=f'Paper {n}') for n in range(3)]
+        self.assertIn(f'Resource {papers[0].pk}: 1 pages', self.extract('--limit', '1'))
+        self.assertEqual(self.pending(), [papers[1].pk, papers[2].pk])
+
+        out = self.extract()
+        self.assertNotIn(f'Resource {papers[0].pk}:', out)
+        self.assertIn('Extracted 2 files, 0 failed', out)
+        self.assertEqual(ResourceText.objects.count(), 3)
+
+
+# ==================== PRUNING ====================
+
+class PruneTests(ResourceTestCase):
+    def setUp(self):
+        super().setUp()
+        self.this_year = timezone.now().year
+        self.kept = [self.add_resource(pdf(marker=str(age)), academic_year=self.this_year - age) for age in (0, 2)]
+        self.expired = [
+            self.add_resource(pdf(marker=f'old{n}'), academic_year=self.this_year - 3 - n % 2, title=f'Old paper {n}')
+            for n in range(5)
+        ]
+
+    def prune(self, *args):
+        out = io.StringIO()
+        call_command('prune_resources', *args, stdout=out)
+        return out.getvalue()
+
+    def remaining(self):
+        return sorted(Resource.objects.values_list('pk', flat=True))
+
+    def test_keeps_the_most_recent_academic_years(self):
+        self.assertEqual(
+            sorted(Resource.expired().values_list('pk', flat=True)), sorted(r.pk for r in self.expired)
+        )
+        self.assertIn('5 resources', self.prune('--dry-run'))
+        self.assertEqual(len(self.remaining()), 7)
+
+        self.prune()
+        self.assertEqual(self.remaining(), sorted(r.pk for r in self.kept))
+        self.prune('--keep-years', '1')
+        self.assertEqual(self.remaining(), [self.kept[0].pk])
+        with self.assertRaises(CommandError):
+            self.prune('--keep-years', '0')
+
+    def test_batches_are_archived_and_exported_before_deleting(self):
+        export = os.path.join(self.media, 'pruned.jsonl')
+        out = self.prune('--batch-size', '2', '--archive', '--export', export)
+        self.assertEqual(out.count('so far'), 3)
+        self.assertEqual(self.remaining(), sorted(r.pk for r in self.kept))
+
+        archived = ArchivedResource.objects.order_by('original_id')
+        self.assertEqual([row.original_id for row in archived], [r.pk for r in self.expired])
+        self.assertEqual(
+            (archived[0].course_code, archived[0].module_path, archived[0].file),
+            ('CSC101', 'CSC101 > Finals', self.expired[0].file.name),
+        )
+        with open(export) as lines:
+            rows = [json.loads(line) for line in lines]
+        self.assertEqual([row['title'] for row in rows], [f'Old paper {n}' for n in range(5)])
+        # Pruning deletes rows, never the stored file
+        self.assertTrue(os.path.exists(os.path.join(self.media, self.expired[0].file.name)))
+
+
+# ==================== PARTITIONS ====================
+
+postgresql_only = skipUnless(connection.vendor == 'postgresql', 'resources are only partitioned on PostgreSQL')
+
+
+class PartitionTests(ResourceTestCase):
+    def test_other_databases_keep_the_plain_table(self):
+        if connection.vendor == 'postgresql':
+            self.skipTest('partitioned on PostgreSQL')
+        self.assertFalse(partitions.convert([2030]))
+        self.assertEqual(partitions.blockers(), [])
+        out = io.StringIO()
+        call_command('resource_partitions', '--convert', stdout=out)
+        self.assertIn('not partitioned on this database', out.getvalue())
+
+    @postgresql_only
+    def test_blockers(self):
+        self.assertEqual(partitions.blockers(), [])
+        with connection.cursor() as cursor:
+            cursor.execute("CREATE UNIQUE INDEX resources_title_unique ON resources_resource (title)")
+            cursor.execute(
+                "CREATE TABLE resources_pinned (resource_id integer REFERENCES resources_resource (id))"
+            )
+        reasons = partitions.blockers()
+        self.assertEqual(len(reasons), 2)
+        self.assertIn('unique index resources_title_unique', ' '.join(reasons))
+        with self.assertRaises(partitions.PartitionError):
+            partitions.convert([2030])
+        self.assertFalse(partitions.is_partitioned())
+
+    @postgresql_only
+    def test_convert_create_and_drop(self):
+        old = self.add_resource(pdf(), academic_year=2019)
+        current = self.add_resource(pdf(marker='current'))
+        ResourceDownload.objects.create(resource=old, ip_address='10.0.0.1')
+        DownloadRollup.objects.create(day='2019-06-01', resource=old, course=self.course, university=self.university, downloads=3)
+
+        self.assertTrue(partitions.convert([2030]))
+        self.assertTrue(partitions.is_partitioned())
+        self.assertFalse(partitions.convert([2030]))
+        self.assertEqual(set(partitions.partitions()), {2019, 2024, 2030})
+        self.assertEqual(Resource.objects.filter(academic_year=2019).get(), old)
+
+        # New ids continue after the copied ones; unknown years park in the default partition
+        later = self.add_resource(pdf(marker='later'), academic_year=2031)
+        self.assertGreater(later.pk, current.pk)
+        self.assertTrue(partitions.create_partition(2031))
+        self.assertFalse(partitions.create_partition(2031))
+        with connection.cursor() as cursor:
+            cursor.execute(f"SELECT id FROM {partitions.partition_name(2031)}")
+            self.assertEqual(cursor.fetchall(), [(later.pk,)])
+
+        self.assertEqual(partitions.drop_partition(2019), 1)
+        self.assertNotIn(2019, partitions.partitions())
+        self.assertFalse(Resource.objects.filter(pk=old.pk).exists())
+        self.assertFalse(ResourceDownload.objects.exists())
+        self.assertEqual(DownloadRollup.objects.get().resource_id, None)
+        # The full-text index follows the new table
+        self.assertEqual(UnifiedSearchResults('final paper', kind='resource').count(), 2)
+
+
+# ==================== DOWNLOADS ====================
+
+class DownloadTests(ResourceTestCase):
+    def test_clicks_are_logged_once_per_visitor_and_counted_on_flush(self):
+        paper = self.add_resource(pdf())
+        for address in ['10.0.0.1', '10.0.0.1', '10.0.0.2']:
+            response = self.client.get(f'/resources/download/{paper.pk}/', REMOTE_ADDR=address)
+            self.assertEqual(response.status_code, 200)
+            response.close()
+
+        self.assertEqual(ResourceDownload.objects.filter(resource=paper).count(), 2)
+        out = io.StringIO()
+        call_command('flush_downloads', stdout=out)
+        paper.refresh_from_db()
+        self.assertEqual(paper.downloads, 2)
+        self.assertFalse(ResourceDownload.objects.filter(counted=False).exists())
+
+        # Flushing again counts nothing twice
+        call_command('flush_downloads', stdout=out)
+        paper.refresh_from_db()
+        self.assertEqual(paper.downloads, 2)
+
+    def test_flush_batches_increments(self):
+        papers = [self.add_resource(pdf(marker=str(i)), title=f'Paper {i}') for i in range(3)]
+        for i, paper in enumerate(papers):
+            for address in range(i + 1):
+                downloads.record(paper.pk, ip_address=f'10.0.0.{address}')
+        self.assertEqual(downloads.flush(), 6)
+        self.assertEqual(
+            list(Resource.objects.order_by('pk').values_list('downloads', flat=True)), [1, 2, 3]
+        )
+
+
+    def test_forwarded_for_is_only_trusted_from_our_proxies(self):
+        paper = self.add_resource(pdf())
+        url = f'/resources/download/{paper.pk}/'
+        for spoofed in ['1.1.1.1', '2.2.2.2']:
+            self.client.get(url, REMOTE_ADDR='10.0.0.1', HTTP_X_FORWARDED_FOR=spoofed).close()
+        self.assertEqual(list(ResourceDownload.objects.values_list('ip_address', flat=True)), ['10.0.0.1'])
+
+        with self.settings(TRUSTED_PROXY_COUNT=1):
+            self.client.get(url, REMOTE_ADDR='10.0.0.254', HTTP_X_FORWARDED_FOR='1.1.1.1, 10.0.0.7').close()
+            self.client.get(url, REMOTE_ADDR='10.0.0.254', HTTP_X_FORWARDED_FOR='<script>').close()
+        self.assertEqual(
+            list(ResourceDownload.objects.order_by('pk').values_list('ip_address', flat=True)), ['10.0.0.1', '10.0.0.7', None]
+        )
+
+# ==================== ROLLUPS ====================
+
+class RollupTests(ResourceTestCase):
+    def setUp(self):
+        super().setUp()
+        self.paper = self.add_resource(pdf())
+        self.today = timezone.localdate()
+
+    def download(self, days_ago, resource=None):
+        ResourceDownload.objects.create(
+            resource=resource or self.paper, downloaded_at=timezone.now() - timedelta(days=days_ago)
+        )
+
+    def rollups(self):
+        return dict(DownloadRollup.objects.filter(resource=self.paper).values_list('day', 'downloads'))
+
+    def test_reruns_recompute_from_the_last_day_or_since(self):
+        for days_ago in (2, 2, 1):
+            self.download(days_ago)
+        call_command('rollup_downloads', stdout=io.StringIO())
+        two_days_ago, yesterday = self.today - timedelta(days=2), self.today - timedelta(days=1)
+        self.assertEqual(self.rollups(), {two_days_ago: 2, yesterday: 1})
+
+        # A late flush for both days: a plain rerun only redoes the last day
+        self.download(2)
+        self.download(1)
+        call_command('rollup_downloads', stdout=io.StringIO())
+        self.assertEqual(self.rollups(), {two_days_ago: 2, yesterday: 2})
+
+        call_command('rollup_downloads', '--since', two_days_ago.isoformat(), stdout=io.StringIO())
+        self.assertEqual(self.rollups(), {two_days_ago: 3, yesterday: 2})
+        with self.assertRaises(CommandError):
+            call_command('rollup_downloads', '--since', 'last week', stdout=io.StringIO())
+
+    def test_totals_survive_pruning(self):
+        old = self.add_resource(pdf(marker='old'), academic_year=2000)
+        for days_ago in (1, 1, 0):
+            self.download(days_ago, resource=old)
+        self.download(0)
+        call_command('rollup_downloads', stdout=io.StringIO())
+
+        call_command('prune_resources', stdout=io.StringIO())
+        self.assertFalse(Resource.objects.filter(pk=old.pk).exists())
+        detached = DownloadRollup.objects.filter(resource=None)
+        self.assertEqual(sum(detached.values_list('downloads', flat=True)), 3)
+        self.assertEqual(set(detached.values_list('course', flat=True)), {self.course.pk})
+
+        # Recomputing keeps them, and the course totals still count them
+        call_command('rollup_downloads', '--since', (self.today - timedelta(days=1)).isoformat(), stdout=io.StringIO())
+        self.assertEqual(sum(detached.values_list('downloads', flat=True)), 3)
+        self.assertEqual(sum(count for day, count in rollups.daily_series(7, course=self.course)), 4)
+        self.assertEqual(rollups.top_resources(7), [{'resource_id': self.paper.pk, 'downloads': 1}])
+
+    def test_stats_are_for_staff(self):
+        self.download(0)
+        call_command('rollup_downloads', stdout=io.StringIO())
+        self.assertEqual(self.client.get('/resources/stats/downloads/').status_code, 302)
+
+        self.client.force_login(User.objects.create_user('staff', password='pw', is_staff=True))
+        data = self.client.get('/resources/stats/downloads/?days=3&university=ub&course=CSC101').json()
+        self.assertEqual(data['top'], [{'id': self.paper.pk, 'title': 'Final paper', 'course': 'CSC101', 'downloads': 1}])
+        self.assertEqual([day['downloads'] for day in data['daily']], [0, 0, 1])
+        self.assertEqual(self.client.get('/resources/stats/downloads/?days=x').status_code, 400)
+
+
+# ==================== BROWSE ====================
+
+class BrowseTests(ResourceTestCase):
+    """Query counts must not grow with the number of levels, folders or papers"""
+
+    def setUp(self):
+        super().setUp()
+        settings_override = override_settings(STORAGES=PLAIN_STORAGES)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.quiz = ResourceType.objects.create(name='Quiz')
+        self.add_papers(self.module)
+
+    def add_papers(self, module):
+        chapter = Module.objects.create(course=self.course, parent_module=module, name=f'{module.name} notes')
+        for level in (1, 2):
+            for year in (2023, 2024):
+                for folder, rtype in ((module, self.exam), (chapter, self.quiz)):
+                    self.add_resource(
+                        pdf(marker=f'{folder.pk}-{level}-{year}'), module=folder, resource_type=rtype,
+                        year_level=level, academic_year=year,
+                    )
+
+    def assertQueries(self, cold, warm, url):
+        cache.clear()
+        with self.assertNumQueries(cold):
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        with self.assertNumQueries(warm):
+            self.client.get(url)
+
+    def test_catalog_pages_read_the_cached_tree(self):
+        urls = [
+            '/resources/',
+            '/resources/university/ub/',
+            '/resources/university/ub/CSC101/',
+            '/resources/university/ub/CSC101/year-level/1/',
+        ]
+        for more in (False, True):
+            if more:
+                self.add_papers(Module.objects.create(course=self.course, name='Tests'))
+                Course.objects.create(university=self.university, code='CSC102', name='Data Structures')
+            for url in urls:
+                with self.subTest(url, more=more):
+                    # The four tree queries, then nothing while the tree is cached
+                    self.assertQueries(4, 0, url)
+
+    def test_listings_fetch_their_papers_once(self):
+        chapter = Module.objects.get(name='Finals notes')
+        for more in (False, True):
+            if more:
+                self.add_papers(Module.objects.create(course=self.course, name='Tests'))
+                self.add_papers(chapter)
+            urls = [
+                f'/resources/university/ub/CSC101/module/{self.module.pk}/',
+                f'/resources/university/ub/CSC101/module/{chapter.pk}/',
+                '/resources/university/ub/CSC101/year-level/1/2024/',
+            ]
+            for url in urls:
+                with self.subTest(url, more=more):
+                    self.assertQueries(5, 1, url)
+
+        response = self.client.get('/resources/university/ub/CSC101/year-level/1/2024/')
+        self.assertEqual(
+            [module.name for module in response.context['resources_by_module']],
+            ['Finals', 'Finals notes', 'Finals notes notes', 'Tests', 'Tests notes'],
+        )
+
+
+# ==================== FOLDERS ====================
+
+class FolderTests(ResourceTestCase):
+    def setUp(self):
+        super().setUp()
+        self.chapter = Module.objects.create(course=self.course, parent_module=self.module, name='Chapter 1')
+        self.section = Module.objects.create(course=self.course, parent_module=self.chapter, name='Section A')
+
+    def paths(self):
+        return {
+            module.name: (module.tree_path, module.depth, module.full_path)
+            for module in Module.objects.filter(course=self.course)
+        }
+
+    def test_paths_of_a_new_tree(self):
+        finals, chapter, section = self.module.pk, self.chapter.pk, self.section.pk
+        self.assertEqual(self.paths(), {
+            'Finals': (f'/{finals}/', 0, 'CSC101 > Finals'),
+            'Chapter 1': (f'/{finals}/{chapter}/', 1, 'CSC101 > Finals > Chapter 1'),
+            'Section A': (f'/{finals}/{chapter}/{section}/', 2, 'CSC101 > Finals > Chapter 1 > Section A'),
+        })
+        self.assertEqual(list(self.section.ancestors()), [self.module, self.chapter])
+        self.assertEqual(set(self.chapter.subtree()), {self.chapter, self.section})
+
+    def test_rename_rewrites_descendants(self):
+        self.module.name = 'Exams'
+        self.module.save()
+        self.assertEqual(self.paths()['Section A'][2], 'CSC101 > Exams > Chapter 1 > Section A')
+
+    def test_move_rewrites_descendants(self):
+        tests = Module.objects.create(course=self.course, name='Tests')
+        self.chapter.parent_module = tests
+        self.chapter.save()
+        self.assertEqual(self.paths()['Section A'], (
+            f'/{tests.pk}/{self.chapter.pk}/{self.section.pk}/', 2, 'CSC101 > Tests > Chapter 1 > Section A',
+        ))
+        self.assertEqual(list(self.module.subtree()), [self.module])
+
+        self.chapter.parent_module = None
+        self.chapter.save()
+        self.assertEqual(self.paths()['Section A'], (
+            f'/{self.chapter.pk}/{self.section.pk}/', 1, 'CSC101 > Chapter 1 > Section A',
+        ))
+
+    def test_course_code_change_rewrites_every_path(self):
+        self.course.code = 'CSC111'
+        self.course.save()
+        self.assertEqual(
+            sorted(full_path for _, _, full_path in self.paths().values()),
+            ['CSC111 > Finals', 'CSC111 > Finals > Chapter 1', 'CSC111 > Finals > Chapter 1 > Section A'],
+        )
+        # Saving the course without a new code leaves the paths alone
+        with mock.patch.object(Module, 'rebuild_paths') as rebuild_paths:
+            self.course.name = 'Programming I'
+            self.course.save()
+            Course.objects.get(pk=self.course.pk).save()
+        rebuild_paths.assert_not_called()
+
+    def test_clean_rejects_cycles(self):
+        for parent in (self.module, self.chapter, self.section):
+            with self.subTest(parent=parent.name):
+                self.module.parent_module = parent
+                with self.assertRaises(ValidationError):
+                    self.module.clean()
+        self.section.parent_module = self.module
+        self.section.clean()
+
+
+# ==================== CATALOG ====================
+
+class CatalogTests(ResourceTestCase):
+    def test_edits_replace_the_catalog_version(self):
+        paper = self.add_resource(pdf())
+        other = University.objects.create(name='BIUST', code='biust')
+        other_course = Course.objects.create(university=other, code='MAT101', name='Calculus')
+        quiz = ResourceType.objects.create(name='Quiz')
+        edits = [
+            ('university saved', self.university.save),
+            ('course saved', self.course.save),
+            ('module saved', self.module.save),
+            ('resource type saved', self.exam.save),
+            ('resource saved', paper.save),
+            ('resource deleted', paper.delete),
+            ('module deleted', self.module.delete),
+            ('resource type deleted', quiz.delete),
+            ('course deleted', other_course.delete),
+            ('university deleted', other.delete),
+        ]
+        for label, edit in edits:
+            with self.subTest(label):
+                before = catalog.version()
+                edit()
+                self.assertNotEqual(catalog.version(), before)
+
+    def test_tree_is_read_from_cache_until_an_edit(self):
+        self.add_resource(pdf())
+        self.assertEqual(catalog.course('ub', 'CSC101')['num_resources'], 1)
+        with self.assertNumQueries(0):
+            catalog.get_tree()
+
+        self.course.name = 'Programming I'
+        self.course.save()
+        self.add_resource(pdf(marker='second'), title='Supplementary paper')
+        course = catalog.course('ub', 'CSC101')
+        self.assertEqual((course['name'], course['num_resources']), ('Programming I', 2))
+
+        Resource.objects.filter(title='Supplementary paper').get().delete()
+        self.assertEqual(catalog.course('ub', 'CSC101')['num_resources'], 1)
+        self.university.delete()
+        self.assertIsNone(catalog.university('ub'))
+
+
+# ==================== API ====================
+
+class ApiTests(ResourceTestCase):
+    def setUp(self):
+        super().setUp()
+        self.chapter = Module.objects.create(course=self.course, parent_module=self.module, name='Chapter 1')
+        self.other = Course.objects.create(university=self.university, code='CSC102', name='Data Structures')
+        quiz = ResourceType.objects.create(name='Quiz')
+        self.papers = [
+            self.add_resource(pdf(marker='a')),
+            self.add_resource(pdf(marker='b'), module=self.chapter, resource_type=quiz, semester=2),
+            self.add_resource(pdf(marker='c'), year_level=2, academic_year=2023),
+            self.add_resource(pdf(marker='d'), course=self.other, module=None),
+        ]
+
+    def ids(self, url):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return [item['id'] for item in response.json()['results']]
+
+    def test_resource_filters(self):
+        a, b, c, d = (paper.pk for paper in self.papers)
+        cases = {
+            '': [a, b, c, d],
+            f'course={self.other.pk}': [d],
+            'university=ub&year_level=2': [c],
+            'academic_year=2024&semester=2': [b],
+            'resource_type=quiz': [b],
+            f'module={self.module.pk}': [a, c],
+            f'module={self.module.pk}&subfolders=1': [a, b, c],
+            'module=999999&subfolders=1': [],
+            'university=biust': [],
+        }
+        for query, expected in cases.items():
+            with self.subTest(query):
+                self.assertEqual(self.ids(f'/api/resources/?{query}'), expected)
+
+    def test_module_and_course_filters(self):
+        self.assertEqual(self.ids(f'/api/modules/?course={self.course.pk}&parent=none'), [self.module.pk])
+        self.assertEqual(self.ids(f'/api/modules/?parent={self.module.pk}'), [self.chapter.pk])
+        self.assertEqual(self.ids('/api/courses/?university=ub'), [self.course.pk, self.other.pk])
+
+    def test_bad_integers_are_rejected(self):
+        for url, name in [
+            ('/api/resources/?course=csc101', 'course'),
+            ('/api/resources/?academic_year=2024a', 'academic_year'),
+            ('/api/resources/?module=finals', 'module'),
+            ('/api/modules/?parent=top', 'parent'),
+        ]:
+            with self.subTest(url):
+                response = self.client.get(url)
+                self.assertEqual(response.status_code, 400)
+                self.assertEqual(list(response.json()), [name])
+
+    def test_keyset_pages_survive_inserts(self):
+        seen = []
+        url = '/api/resources/?page_size=3'
+        while url:
+            data = self.client.get(url).json()
+            seen += [item['id'] for item in data['results']]
+            if len(seen) == 3:
+                # Lands after the cursor, so it shows up once on the next page
+                self.papers.append(self.add_resource(pdf(marker='e')))
+            url = data['next']
+        self.assertEqual(seen, [paper.pk for paper in self.papers])
+
+    def test_unchanged_catalog_revalidates_without_queries(self):
+        url = '/api/resources/?university=ub'
+        response = self.client.get(url)
+        etag = response['ETag']
+        self.assertIn('max-age', response['Cache-Control'])
+
+        with self.assertNumQueries(0):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertNotEqual(self.client.get('/api/resources/?university=biust')['ETag'], etag)
+
+        self.papers[0].title = 'Final paper (corrected)'
+        self.papers[0].save()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+
+# ==================== BUNDLES ====================
+
+class BundleTests(ResourceTestCase):
+    url = '/resources/university/ub/CSC101/year-level/1/2024/bundle.zip'
+
+    def test_streams_every_paper_of_the_course_year(self):
+        first = self.add_resource(pdf(2), title='Final 2024')
+        second = self.add_resource(pdf(marker='test'), title='Test 1')
+        self.add_resource(pdf(marker='other year'), academic_year=2023)
+
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        self.assertIn('CSC101-year1-2024.zip', response['Content-Disposition'])
+
+        archive = zipfile.ZipFile(io.BytesIO(b''.join(response.streaming_content)))
+        self.assertIsNone(archive.testzip())
+        self.assertEqual(archive.namelist(), [f'Exam/Final_2024-{first.pk}.pdf', f'Exam/Test_1-{second.pk}.pdf'])
+        with first.file.open('rb') as f:
+            self.assertEqual(archive.read(f'Exam/Final_2024-{first.pk}.pdf'), f.read())
+
+    def test_missing_files_are_listed_not_fatal(self):
+        kept = self.add_resource(pdf(), title='Kept')
+        lost = self.add_resource(pdf(marker='lost'), title='Lost')
+        os.remove(lost.file.path)
+
+        archive = zipfile.ZipFile(io.BytesIO(b''.join(self.client.get(self.url).streaming_content)))
+        self.assertEqual(archive.namelist(), [f'Exam/Kept-{kept.pk}.pdf', 'MISSING.txt'])
+        self.assertIn(f'Lost ({lost.pk})', archive.read('MISSING.txt').decode())
+
+    def test_prebuilt_bundle_is_redirected_to(self):
+        self.add_resource(pdf())
+        url = bundles.build(self.course, 1, 2024)
+        # Another process: nothing cached, only what was recorded
+        cache.clear()
+        response = self.client.get(self.url)
+        self.assertRedirects(response, url, fetch_redirect_response=False)
+        self.assertEqual(bundles.build(self.course, 1, 2024), url)
+
+        # Any change to the papers streams again until the next build
+        self.add_resource(pdf(marker='new'), title='New')
+        self.assertTrue(self.client.get(self.url).streaming)
+        self.assertEqual(self.client.get('/resources/university/ub/CSC101/year-level/1/2019/bundle.zip').status_code, 404)
+
+    @override_settings(RESOURCE_BUNDLE_STORAGE='resources.tests.RenamingStorage')
+    def test_storage_may_rename_the_bundle(self):
+        self.add_resource(pdf())
+        url = bundles.build(self.course, 1, 2024)
+        bundle = ResourceBundle.objects.get(course=self.course)
+        self.assertIn('-renamed', bundle.name)
+        self.assertEqual(url, RenamingStorage().url(bundle.name))
+        self.assertTrue(RenamingStorage().exists(bundle.name))
+        self.assertRedirects(self.client.get(self.url), url, fetch_redirect_response=False)
+
+        # A rebuild replaces the stale bundle
+        self.add_resource(pdf(marker='new'), title='New')
+        bundles.build(self.course, 1, 2024)
+        self.assertFalse(RenamingStorage().exists(bundle.name))
+        self.assertEqual(ResourceBundle.objects.count(), 1)
+
+
+# ==================== SERVING ====================
+
+class ServingTests(ResourceTestCase):
+    def setUp(self):
+        super().setUp()
+        self.data = pdf(3)
+        self.paper = self.add_resource(self.data, title='Final Exam 2024')
+        self.url = f'/resources/view/{self.paper.pk}/'
+
+    def test_serves_the_whole_file(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b''.join(response.streaming_content), self.data)
+        self.assertEqual(response['Accept-Ranges'], 'bytes')
+        self.assertEqual(response['Content-Type'], 'application/pdf')
+
+    def test_serves_a_range(self):
+        response = self.client.get(self.url, HTTP_RANGE='bytes=5-14')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response['Content-Range'], f'bytes 5-14/{len(self.data)}')
+        self.assertEqual(b''.join(response.streaming_content), self.data[5:15])
+
+        response = self.client.get(self.url, HTTP_RANGE='bytes=-10')
+        self.assertEqual(b''.join(response.streaming_content), self.data[-10:])
+
+    def test_unsatisfiable_range(self):
+        response = self.client.get(self.url, HTTP_RANGE=f'bytes={len(self.data) + 10}-')
+        self.assertEqual(response.status_code, 416)
+        self.assertEqual(response['Content-Range'], f'bytes */{len(self.data)}')
+
+    def test_stale_if_range_gets_the_whole_file(self):
+        response = self.client.get(self.url, HTTP_RANGE='bytes=0-9', HTTP_IF_RANGE='"not-this-file"')
+        self.assertEqual(response.status_code, 200)
+        response.close()
+
+    def test_revalidation_and_download_name(self):
+        etag = self.client.get(self.url)['ETag']
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        response = self.client.get(f'/resources/download/{self.paper.pk}/')
+        self.assertIn('attachment', response['Content-Disposition'])
+        self.assertIn('Final_Exam_2024.pdf', response['Content-Disposition'])
+        response.close()
+
+    @override_settings(RESOURCE_ACCEL_REDIRECT='/protected-media/')
+    def test_nginx_sends_the_body_when_configured(self):
+        response = self.client.get(self.url, HTTP_RANGE='bytes=0-9')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['X-Accel-Redirect'], f'/protected-media/{self.paper.file.name}')
+        self.assertEqual(response.content, b'')
+
+
+# ==================== UPLOADS ====================
+
+class UploadTests(ResourceTestCase):
+    def test_same_content_is_stored_once(self):
+        data = pdf(2)
+        first = self.add_resource(data, name='ub-final.pdf', title='Final')
+        other = Course.objects.create(university=self.university, code='CSC102', name='Data Structures')
+        second = self.add_resource(data, name='copy.pdf', course=other, module=None, title='Same final')
+
+        self.assertEqual(first.file.name, second.file.name)
+        self.assertTrue(first.file.name.startswith(f'blobs/{first.content_hash[:2]}/'))
+        self.assertEqual(first.content_hash, second.content_hash)
+        self.assertEqual((first.page_count, first.mime_type), (2, 'application/pdf'))
+        self.assertEqual((second.page_count, second.mime_type), (2, 'application/pdf'))
+        self.assertEqual(first.file_size, len(data))
+
+        self.assertEqual(len(self.stored_blobs()), 1)
+
+    def test_different_content_gets_its_own_blob(self):
+        first = self.add_resource(pdf())
+        second = self.add_resource(pdf(marker='another'))
+        self.assertNotEqual(first.file.name, second.file.name)
+        self.assertFalse(uploads.duplicates().exists())
+
+
+# ==================== PREVIEWS ====================
+
+class PreviewTests(ResourceTestCase):
+    def render(self, *args):
+        out = io.StringIO()
+        call_command('render_previews', '--workers', '1', '--verbosity', '2', *args, stdout=out)
+        return out.getvalue()
+
+    def pending(self, **kwargs):
+        return list(previews.pending(**kwargs).values_list('pk', flat=True))
+
+    def test_renders_new_and_reuploaded_files(self):
+        from PIL import Image
+
+        scan = self.add_resource(png(), name='scan.png')
+        broken = self.add_resource(b'not an image', name='scan.jpg', title='Broken scan')
+        self.assertEqual(self.pending(), [scan.pk, broken.pk])
+        self.assertIn('Rendered 1 previews, shared 0, 1 failed', self.render())
+
+        preview = ResourcePreview.objects.get(resource=scan)
+        self.assertEqual(preview.thumbnail.name, f'previews/{scan.content_hash[:2]}/{scan.content_hash}/thumb.jpg')
+        with preview.thumbnail.open() as thumbnail:
+            width, height = Image.open(thumbnail).size
+        self.assertLessEqual(width, previews.THUMBNAIL_SIZE[0])
+        self.assertLessEqual(height, previews.THUMBNAIL_SIZE[1])
+        self.assertTrue(ResourcePreview.objects.get(resource=broken).error)
+        self.assertEqual(self.pending(), [])
+        self.assertEqual(self.pending(retry_failed=True), [broken.pk])
+
+        scan.file = ContentFile(png('grey'), 'scan.png')
+        scan.save()
+        self.assertEqual(self.pending(), [scan.pk])
+
+    def test_copies_share_one_rendering(self):
+        scan = self.add_resource(png(), name='scan.png')
+        self.render()
+        other = Course.objects.create(university=self.university, code='CSC102', name='Data Structures')
+        copy = self.add_resource(png(), name='copy.png', course=other, module=None)
+
+        self.assertIn('Rendered 0 previews, shared 1, 0 failed', self.render())
+        self.assertEqual(
+            ResourcePreview.objects.get(resource=copy).thumbnail.name,
+            ResourcePreview.objects.get(resource=scan).thumbnail.name,
+        )
+
+    def test_interrupted_runs_resume_where_they_stopped(self):
+        scans = [self.add_resource(png(color), name='scan.png') for color in ('white', 'grey', 'black')]
+        self.render('--limit', '1')
+        self.assertEqual(self.pending(), [scans[1].pk, scans[2].pk])
+
+        out = self.render()
+        self.assertNotIn(f'Resource {scans[0].pk}', out)
+        self.assertIn('Rendered 2 previews', out)
+        self.assertEqual(ResourcePreview.objects.filter(error='').count(), 3)
+
+
+# ==================== IMPORT ====================
+
+class ImportTests(ResourceTestCase):
+    manifest = (
+        'path,university,course,course_name,module,year_level,academic_year,resource_type,title\n'
+        'csc201/final.pdf,UB,CSC201,Algorithms,Past Papers > Finals,2,2023,exam,\n'
+        'csc201/test.pdf,ub,CSC201,,Past Papers/Tests,2,2023,Exam,Test 1\n'
+        'csc101/final.pdf,ub,CSC101,,,1,2023,Exam,Final 2023\n'
+        'csc101/missing.pdf,ub,CSC101,,,1,2023,Exam,Lost\n'
+        'csc101/final.pdf,ub,CSC101,,,1,2023,Quiz,Wrong type\n'
+    )
+
+    def make_source(self):
+        source = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, source, ignore_errors=True)
+        files = {'csc201/final.pdf': pdf(2), 'csc201/test.pdf': pdf(marker='test'), 'csc101/final.pdf': pdf(3)}
+        for path, data in files.items():
+            os.makedirs(os.path.join(source, os.path.dirname(path)), exist_ok=True)
+            with open(os.path.join(source, path), 'wb') as f:
+                f.write(data)
+        with open(os.path.join(source, 'manifest.csv'), 'w') as f:
+            f.write(self.manifest)
+        return source
+
+    def test_imports_a_directory(self):
+        out = io.StringIO()
+        call_command('import_resources', self.make_source(), '--workers', '2', stdout=out)
+        output = out.getvalue()
+        self.assertIn('Imported 3, skipped 0 already imported, 2 failed', output)
+        self.assertIn('Line 5 (csc101/missing.pdf)', output)
+        self.assertIn("Line 6 (csc101/final.pdf): unknown resource type 'Quiz'", output)
+
+        course = Course.objects.get(code='CSC201')
+        self.assertEqual(course.name, 'Algorithms')
+        final = Resource.objects.get(course=course, title='final')
+        self.assertEqual(final.module.full_path, 'CSC201 > Past Papers > Finals')
+        self.assertEqual(Resource.objects.get(title='Test 1').module.parent_module, final.module.parent_module)
+        self.assertEqual((final.page_count, final.year_level, final.resource_type), (2, 2, self.exam))
+        self.assertEqual(Resource.objects.get(title='Final 2023').module, None)
+
+    def test_rerun_skips_what_is_imported(self):
+        source = self.make_source()
+        call_command('import_resources', source, stdout=io.StringIO())
+        out = io.StringIO()
+        call_command('import_resources', source, stdout=out)
+        self.assertIn('Imported 0, skipped 3 already imported', out.getvalue())
+        self.assertEqual(Resource.objects.count(), 3)
+        self.assertEqual(Module.objects.filter(course__code='CSC201').count(), 3)
+
+    @override_settings(STORAGES=RENAMING_STORAGES)
+    def test_content_is_uploaded_once_when_storage_renames(self):
+        source = self.make_source()
+        with open(os.path.join(source, 'manifest.csv'), 'a') as f:
+            # The same paper filed under a second course, in the same batch
+            f.write('csc201/final.pdf,ub,CSC301,,,3,2023,Exam,Shared final\n')
+        call_command('import_resources', source, stdout=io.StringIO())
+        blobs = self.stored_blobs()
+        self.assertEqual(len(blobs), 3)
+        self.assertEqual(
+            Resource.objects.get(title='Shared final').file.name, Resource.objects.get(title='final').file.name
+        )
+
+        out = io.StringIO()
+        call_command('import_resources', source, stdout=out)
+        self.assertIn('Imported 0, skipped 4 already imported', out.getvalue())
+        self.assertEqual(self.stored_blobs(), blobs)
+
+    def test_imports_a_zip(self):
+        source = self.make_source()
+        archive = os.path.join(self.media, 'papers.zip')
+        with zipfile.ZipFile(archive, 'w') as zf:
+            for root, _, names in os.walk(source):
+                for name in names:
+                    path = os.path.join(root, name)
+                    zf.write(path, os.path.relpath(path, source))
+        call_command('import_resources', archive, stdout=io.StringIO())
+        self.assertEqual(Resource.objects.count(), 3)
+
+    def test_bad_manifest(self):
+        source = self.make_source()
+        with open(os.path.join(source, 'manifest.csv'), 'w') as f:
+            f.write('path,university,course\nx.pdf,ub,CSC101\n')
+        with self.assertRaisesMessage(CommandError, 'missing columns: year_level, academic_year, resource_type'):
+            call_command('import_resources', source, stdout=io.StringIO())
+        with self.assertRaisesMessage(CommandError, 'neither a directory nor a ZIP'):
+            call_command('import_resources', os.path.join(source, 'manifest.csv'), stdout=io.StringIO())
+
+
+# ==================== BULK ADD ====================
+
+@override_settings(STORAGES={
+    'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+    'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'},
+})
+class BulkAddTests(ResourceTestCase):
+    url = '/admin/resources/resource/bulk-add/'
+
+    def setUp(self):
+        super().setUp()
+        admin = User.objects.create_superuser('admin', 'admin@example.com', 'pw')
+        self.client.force_login(admin)
+        self.admin = admin
+
+    def post(self, *files):
+        return self.client.post(self.url, {
+            'university': self.university.pk, 'course': self.course.pk, 'module': self.module.pk,
+            'resource_type': self.exam.pk, 'year_level': 1, 'academic_year': 2024, 'semester': 2,
+            'papers': [ContentFile(data, name) for name, data in files],
+        })
+
+    def test_form_renders(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'up to 40 per upload')
+
+    def test_every_file_becomes_a_resource(self):
+        response = self.post(('Final_2024.pdf', pdf(2)), ('Test_1.pdf', pdf(marker='test')), ('copy.pdf', pdf(2)))
+        self.assertRedirects(
+            response, f'/admin/resources/resource/?course__id__exact={self.course.pk}', fetch_redirect_response=False
+        )
+        resources = Resource.objects.order_by('title')
+        self.assertEqual([r.title for r in resources], ['Final 2024', 'Test 1', 'copy'])
+        final, test, copy = resources
+        self.assertEqual((final.module, final.semester, final.uploaded_by), (self.module, 2, self.admin))
+        self.assertEqual(final.page_count, 2)
+        self.assertEqual(final.file.name, copy.file.name)
+        self.assertNotEqual(final.file.name, test.file.name)
+
+    @override_settings(STORAGES=RENAMING_STORAGES)
+    def test_stored_papers_are_not_uploaded_again(self):
+        existing = self.add_resource(pdf(2), title='Already here')
+        blobs = self.stored_blobs()
+        self.post(('Final_2024.pdf', pdf(2)), ('again.pdf', pdf(2)), ('new.pdf', pdf(marker='new')))
+        self.assertEqual(
+            set(Resource.objects.filter(title__in=['Final 2024', 'again']).values_list('file', flat=True)),
+            {existing.file.name},
+        )
+        self.assertEqual(len(self.stored_blobs()), len(blobs) + 1)
+
+    @override_settings(RESOURCE_BULK_MAX_FILES=2)
+    def test_too_many_files(self):
+        response = self.post(*[(f'{i}.pdf', pdf(marker=str(i))) for i in range(3)])
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, '3 files chosen; upload at most 2 at a time')
+        self.assertFalse(Resource.objects.exists())
+
+    def test_course_must_match_university(self):
+        other = University.objects.create(name='BIUST', code='biust')
+        response = self.client.post(self.url, {
+            'university': other.pk, 'course': self.course.pk, 'resource_type': self.exam.pk,
+            'year_level': 1, 'academic_year': 2024, 'semester': 1, 'papers': [ContentFile(pdf(), 'a.pdf')],
+        })
+        self.assertContains(response, 'CSC101 is not a course at biust')
+        self.assertFalse(Resource.objects.exists())
@@ -0,0 +1,202 @@
+"""
+Content-addressed storage for uploaded resource files.
+
+Resource.save() hands every new, uncommitted upload to store(): the file
+is read once in chunks to get its size, SHA-256 and type, and is then
+saved as blobs/<hash prefix>/<hash><ext>. Uploading a paper that is
+already stored (the same exam filed under several courses) reuses the
+existing blob instead of sending the bytes to storage again. Existing
+content is found by its hash in the database, not by asking storage for
+the blob name: Cloudinary saves under a public id of its own choosing.
+
+Blobs are shared, so nothing here ever deletes a stored file.
+"""
+import hashlib
+import mimetypes
+import os
+
+from django.core.files import File
+from django.db.models import Count
+
+from .models import Resource
+
+CHUNK_SIZE = 64 * 1024
+
+# Leading bytes of the formats students upload, checked before the file name
+MAGIC = [
+    (b'%PDF-', 'application/pdf'),
+    (b'\x89PNG', 'image/png'),
+    (b'\xff\xd8\xff', 'image/jpeg'),
+    (b'PK\x03\x04', None),  # zip container (docx, pptx...): trust the extension
+    (b'\xd0\xcf\x11\xe0', 'application/msword'),
+]
+
+
+def sniff_type(head, name):
+    for magic, mime_type in MAGIC:
+        if head.startswith(magic) and mime_type:
+            return mime_type
+    return mimetypes.guess_type(name)[0] or 'application/octet-stream'
+
+
+def digest(chunks):
+    """``(sha256 hex, size, first bytes)`` of a stream of chunks"""
+    sha, size, head = hashlib.sha256(), 0, b''
+    for chunk in chunks:
+        if len(head) < 1024:
+            head += chunk[:1024 - len(head)]
+        sha.update(chunk)
+        size += len(chunk)
+    return sha.hexdigest(), size, head
+
+
+def count_pages(file):
+    """Pages of a seekable PDF file object, or None if it can't be parsed"""
+    from pypdf import PdfReader
+
+    try:
+        file.seek(0)
+        return len(PdfReader(file).pages)
+    except Exception:
+        return None
+    finally:
+        file.seek(0)
+
+
+def blob_name(content_hash, name):
+    ext = os.path.splitext(name)[1].lower()
+    return f'blobs/{content_hash[:2]}/{content_hash}{ext}'
+
+
+def metadata(content_hash, size, head, name):
+    return {
+        'content_hash': content_hash, 'file_size': size,
+        'mime_type': sniff_type(head, name), 'page_count': None,
+    }
+
+
+def inspect(file, name):
+    """Metadata of a seekable ``file`` named ``name``, read once in chunks"""
+    file.seek(0)
+    content_hash, size, head = digest(iter(lambda: file.read(CHUNK_SIZE), b''))
+    file.seek(0)
+    return metadata(content_hash, size, head, name)
+
+
+def save_blob(file, name, meta, storage, max_length=None):
+    """Store ``file`` as its content's blob unless it is there already. Returns the stored name."""
+    if meta['mime_type'] == 'application/pdf':
+        meta['page_count'] = count_pages(file)
+    stored = blob_name(meta['content_hash'], name)
+    if not storage.exists(stored):
+        stored = storage.save(stored, File(file, name=os.path.basename(name)), max_length=max_length)
+    return stored
+
+
+def stored_copies(hashes):
+    """{content hash: (stored name, page_count, mime_type)} of content some resource already holds"""
+    found = {}
+    rows = (
+        Resource.objects.filter(content_hash__in=hashes).exclude(file='')
+        .values_list('content_hash', 'file', 'page_count', 'mime_type')
+    )
+    for content_hash, *stored in rows:
+        found.setdefault(content_hash, tuple(stored))
+    return found
+
+
+def _inspect_one(open_file, name):
+    with open_file() as file:
+        return inspect(file, name)
+
+
+def _save_one(open_file, name, meta, storage, max_length):
+    with open_file() as file:
+        return save_blob(file, name, meta, storage, max_length)
+
+
+def _results(futures):
+    results = []
+    for future in futures:
+        try:
+            results.append(future.result())
+        except Exception as e:
+            results.append(e)
+    return results
+
+
+def put_many(pool, files, storage, max_length=None):
+    """
+    Hash and store many files on ``pool``, uploading each new content once.
+
+    ``files`` are ``(open_file, name)`` pairs, ``open_file()`` returning a
+    seekable file that is closed after use. Returns, per file, ``(stored
+    name, metadata)`` or the exception reading or storing it raised. The
+    pool threads only read files and talk to storage; the one lookup of
+    already stored content runs here.
+    """
+    metas = _results([pool.submit(_inspect_one, open_file, name) for open_file, name in files])
+    known = stored_copies({meta['content_hash'] for meta in metas if isinstance(meta, dict)})
+
+    # The first file with each new content is stored, the rest reuse it
+    new = {}
+    for (open_file, name), meta in zip(files, metas):
+        if isinstance(meta, dict) and meta['content_hash'] not in known:
+            new.setdefault(meta['content_hash'], (open_file, name, meta))
+    saved = _results([
+        pool.submit(_save_one, open_file, name, meta, storage, max_length) for open_file, name, meta in new.values()
+    ])
+    for (content_hash, (_, _, meta)), stored in zip(new.items(), saved):
+        known[content_hash] = stored if isinstance(stored, Exception) else (stored, meta['page_count'], meta['mime_type'])
+
+    results = []
+    for meta in metas:
+        stored = meta if isinstance(meta, Exception) else known[meta['content_hash']]
+        if isinstance(stored, Exception):
+            results.append(stored)
+            continue
+        name, meta['page_count'], meta['mime_type'] = stored
+        results.append((name, meta))
+    return results
+
+
+def store(resource):
+    """Save ``resource.file`` (a new upload) by content, sharing existing blobs"""
+    field_file = resource.file
+    upload = field_file.file
+    meta = inspect(upload, field_file.name)
+
+    existing = stored_copies([meta['content_hash']]).get(meta['content_hash'])
+    if existing:
+        # Same bytes already stored: point at them, nothing is uploaded
+        name, meta['page_count'], meta['mime_type'] = existing
+    else:
+        name = save_blob(upload, field_file.name, meta, field_file.storage, field_file.field.max_length)
+
+    for field, value in meta.items():
+        setattr(resource, field, value)
+    field_file.name = name
+    field_file._committed = True
+
+
+def describe_stored(resource):
+    """Fill the metadata of an already stored file (backfill), reading it once"""
+    from .bundles import iter_file
+    from .serving import local_path
+
+    meta = metadata(*digest(iter_file(resource)), resource.file.name)
+    path = local_path(resource.file)
+    if path and meta['mime_type'] == 'application/pdf':
+        with open(path, 'rb') as file:
+            meta['page_count'] = count_pages(file)
+    for field, value in meta.items():
+        setattr(resource, field, value)
+
+
+def duplicates():
+    """Hashes stored under more than one file name, largest waste first"""
+    return (
+        Resource.objects.exclude(content_hash='').values('content_hash')
+        .annotate(files=Count('file', distinct=True), resources=Count('id'))
+        .filter(files__gt=1).order_by('-files')
+    )
@@ -19,6 +19,10 @@ urlpatterns = [
     path('university/<str:uni_code>/<str:course_code>/year-level/<int:year_level>/<int:academic_year>/', 
          views.year_level_academic_detail, name='year_level_academic_detail'),
     
+    # ==================== ZIP OF A WHOLE YEAR LEVEL + ACADEMIC YEAR ====================
+    path('university/<str:uni_code>/<str:course_code>/year-level/<int:year_level>/<int:academic_year>/bundle.zip',
+         views.download_bundle, name='download_bundle'),
+    
     # ==================== MODULE LEVEL ====================
     path('university/<str:uni_code>/<str:course_code>/module/<int:module_id>/', 
          views.module_detail, name='module_detail'),
@@ -27,6 +31,12 @@ urlpatterns = [
     path('view/<int:resource_id>/', views.view_pdf, name='view_pdf'),
     path('download/<int:resource_id>/', views.download_resource, name='download_resource'),
     
+    # ==================== CATALOG TREE (JSON) ====================
+    path('catalog/', views.catalog_json, name='resource_catalog'),
+    
+    # ==================== DOWNLOAD ANALYTICS ====================
+    path('stats/downloads/', views.download_stats, name='download_stats'),
+    
     # ==================== UTILITY URLS (FOR DATABASE FIXES) ====================
     # Run Django migrations
     path('run-migrations/', views.run_migrations, name='run_migrations'),
@@ -1,13 +1,15 @@
 from django.shortcuts import render, get_object_or_404, redirect
-from django.http import HttpResponse
+from django.http import Http404, HttpResponse, JsonResponse, StreamingHttpResponse
 from django.core.management import call_command
 from django.conf import settings
+from django.contrib.admin.views.decorators import staff_member_required
 from django.db import connection
-from .models import University, Course, Module, Resource, ResourceType
+from .models import University, Course, Resource
+from . import bundles, catalog, downloads, rollups, serving
 
 def resources_dashboard(request):
     """Main resources page - list all universities"""
-    universities = University.objects.all()
+    universities = catalog.get_tree()['universities'].values()
     context = {
         'universities': universities,
     }
@@ -15,105 +17,80 @@ def resources_dashboard(request):
 
 def university_detail(request, uni_code):
     """Show courses for a specific university"""
-    university = get_object_or_404(University, code=uni_code)
-    courses = university.courses.all()
+    university = catalog.university(uni_code)
+    if university is None:
+        raise Http404("No such university")
     context = {
         'university': university,
-        'courses': courses,
+        'courses': university['courses'].values(),
     }
     return render(request, 'resources/university_detail.html', context)
 
+def catalog_course(uni_code, course_code):
+    """(university, course) from the cached catalog, or 404"""
+    university = catalog.university(uni_code)
+    course = university and university['courses'].get(course_code)
+    if course is None:
+        raise Http404("No such course")
+    return university, course
+
 def course_detail(request, uni_code, course_code):
     """Show year levels and modules for a course"""
-    university = get_object_or_404(University, code=uni_code)
-    course = get_object_or_404(Course, university=university, code=course_code)
-    
-    # Get year levels that have resources
-    year_levels_data = []
-    for level_num, level_name in Resource.YEAR_LEVELS:
-        try:
-            resource_count = Resource.objects.filter(course=course, year_level=level_num).count()
-            if resource_count > 0:
-                year_levels_data.append({
-                    'level': level_num,
-                    'name': level_name,
-                    'resource_count': resource_count,
-                })
-        except:
-            # Column might not exist yet, skip
-            pass
-    
-    # Get top-level modules
-    modules = course.modules.filter(parent_module=None)
-    
+    university, course = catalog_course(uni_code, course_code)
     context = {
         'university': university,
         'course': course,
-        'year_levels': year_levels_data,
-        'modules': modules,
+        'year_levels': course['year_levels'],
+        'modules': course['top_modules'],
     }
     return render(request, 'resources/course_detail.html', context)
 
+def group_resources(resources, key):
+    """Group already-fetched resources by ``key(resource)``, keeping their order"""
+    groups = {}
+    for resource in resources:
+        groups.setdefault(key(resource), []).append(resource)
+    return groups
+
 def year_level_detail(request, uni_code, course_code, year_level):
     """Show academic years and modules for a specific year level"""
-    university = get_object_or_404(University, code=uni_code)
-    course = get_object_or_404(Course, university=university, code=course_code)
+    university, course = catalog_course(uni_code, course_code)
     
     # Get year level name
     year_level_dict = dict(Resource.YEAR_LEVELS)
     year_level_name = year_level_dict.get(year_level, f'Year {year_level}')
     
-    try:
-        # Get resources for this year level
-        resources = Resource.objects.filter(course=course, year_level=year_level)
-        
-        # Get unique academic years
-        academic_years = resources.values_list('academic_year', flat=True).distinct().order_by('-academic_year')
-        
-        # Get modules that have resources in this year level
-        modules = Module.objects.filter(resource__in=resources).distinct()
-    except:
-        # Columns might not exist yet
-        resources = Resource.objects.none()
-        academic_years = []
-        modules = Module.objects.none()
+    level = next((level for level in course['year_levels'] if level['level'] == year_level), None)
     
     context = {
         'university': university,
         'course': course,
         'year_level': year_level,
         'year_level_name': year_level_name,
-        'resources': resources,
-        'academic_years': academic_years,
-        'modules': modules,
+        'academic_years': level['academic_years'] if level else [],
+        'modules': level['modules'] if level else [],
     }
     return render(request, 'resources/year_level_detail.html', context)
 
 def year_level_academic_detail(request, uni_code, course_code, year_level, academic_year):
     """Show resources for a specific year level and academic year"""
-    university = get_object_or_404(University, code=uni_code)
-    course = get_object_or_404(Course, university=university, code=course_code)
+    university, course = catalog_course(uni_code, course_code)
     
     year_level_dict = dict(Resource.YEAR_LEVELS)
     year_level_name = year_level_dict.get(year_level, f'Year {year_level}')
     
-    try:
-        resources = Resource.objects.filter(
-            course=course, 
-            year_level=year_level,
-            academic_year=academic_year
-        )
-        
-        modules = Module.objects.filter(resource__in=resources).distinct()
-        
-        # Group by module
-        resources_by_module = {}
-        for module in modules:
-            module_resources = resources.filter(module=module)
-            if module_resources.exists():
-                resources_by_module[module] = module_resources
-    except:
-        resources_by_module = {}
+    resources = Resource.objects.filter(
+        course_id=course['id'],
+        year_level=year_level,
+        academic_year=academic_year,
+        module__isnull=False,
+    ).select_related('module', 'resource_type', 'preview')
+    
+    # Group by module, modules in their folder order
+    grouped = group_resources(resources, key=lambda r: r.module)
+    resources_by_module = {
+        module: grouped[module] for module in sorted(grouped, key=lambda module: (module.order, module.name))
+    }
     
     context = {
         'university': university,
@@ -127,38 +104,101 @@ def year_level_academic_detail(request, uni_code, course_code, year_level, acade
 
 def module_detail(request, uni_code, course_code, module_id):
     """Show submodules and resources in a module"""
-    university = get_object_or_404(University, code=uni_code)
-    course = get_object_or_404(Course, university=university, code=course_code)
-    module = get_object_or_404(Module, id=module_id, course=course)
+    university, course = catalog_course(uni_code, course_code)
+    module = course['modules'].get(module_id)
+    if module is None:
+        raise Http404("No such module")
     
-    submodules = module.submodules.all()
-    resources = Resource.objects.filter(module=module)
-    resource_types = ResourceType.objects.all()
+    resources = Resource.objects.filter(module_id=module_id).select_related('resource_type', 'preview')
     
-    resources_by_type = {}
-    for rtype in resource_types:
-        resources_by_type[rtype.name] = resources.filter(resource_type=rtype)
+    # Types in their usual (id) order, resources newest year first within each
+    by_type = group_resources(resources, key=lambda r: r.resource_type)
+    resources_by_type = {rtype.name: by_type[rtype] for rtype in sorted(by_type, key=lambda rtype: rtype.pk)}
     
     context = {
         'university': university,
         'course': course,
         'module': module,
-        'submodules': submodules,
+        'ancestors': catalog.ancestors(course, module),
+        'submodules': catalog.submodules(course, module),
         'resources_by_type': resources_by_type,
     }
     return render(request, 'resources/module_detail.html', context)
 
+def catalog_json(request):
+    """JSON catalog tree (universities, courses, year levels, modules with counts)"""
+    return JsonResponse({'universities': catalog.as_json(catalog.get_tree())})
+
+def download_bundle(request, uni_code, course_code, year_level, academic_year):
+    """ZIP of every paper for a course year level and academic year"""
+    university, course = catalog_course(uni_code, course_code)
+    resources = list(bundles.bundle_resources(course['id'], year_level, academic_year))
+    if not resources:
+        raise Http404("No resources to bundle")
+    
+    user_id = request.user.id if request.user.is_authenticated else None
+    ip_address = downloads.client_ip(request)
+    for resource in resources:
+        downloads.record(resource.id, user_id, ip_address)
+    downloads.maybe_flush()
+    
+    url = bundles.prebuilt_url(resources[0].course, year_level, academic_year, resources)
+    if url:
+        return redirect(url)
+    response = StreamingHttpResponse(bundles.stream(resources), content_type='application/zip')
+    name = bundles.filename(resources[0].course, year_level, academic_year)
+    response['Content-Disposition'] = f'attachment; filename="{name}"'
+    return response
+
 def view_pdf(request, resource_id):
     """View PDF in browser"""
-    resource = get_object_or_404(Resource, id=resource_id)
-    return redirect(resource.file.url)
+    resource = get_object_or_404(Resource.objects.only('id', 'title', 'file'), id=resource_id)
+    return serving.serve(request, resource)
 
 def download_resource(request, resource_id):
     """Download the file"""
-    resource = get_object_or_404(Resource, id=resource_id)
-    resource.downloads += 1
-    resource.save()
-    return redirect(resource.file.url + '?fl_attachment=true')
+    resource = get_object_or_404(Resource.objects.only('id', 'title', 'file'), id=resource_id)
+    user_id = request.user.id if request.user.is_authenticated else None
+    downloads.record(resource.id, user_id, downloads.client_ip(request))
+    downloads.maybe_flush()
+    return serving.serve(request, resource, as_attachment=True)
+
+@staff_member_required
+def download_stats(request):
+    """JSON download trends, read from the daily rollups only"""
+    try:
+        days = min(max(int(request.GET.get('days', 7)), 1), 365)
+    except ValueError:
+        return JsonResponse({'error': 'days must be a number'}, status=400)
+    
+    course = university = None
+    if request.GET.get('university'):
+        university = get_object_or_404(University, code=request.GET['university'])
+    if request.GET.get('course'):
+        if university is None:
+            return JsonResponse({'error': 'course needs a university'}, status=400)
+        course = get_object_or_404(Course, university=university, code=request.GET['course'])
+    
+    top = rollups.top_resources(days, course, university)
+    resources = Resource.objects.select_related('course').in_bulk([row['resource_id'] for row in top])
+    return JsonResponse({
+        'days': days,
+        'university': university.code if university else None,
+        'course': course.code if course else None,
+        'top': [
+            {
+                'id': row['resource_id'],
+                'title': resources[row['resource_id']].title,
+                'course': resources[row['resource_id']].course.code,
+                'downloads': row['downloads'],
+            }
+            for row in top if row['resource_id'] in resources
+        ],
+        'daily': [
+            {'day': day.isoformat(), 'downloads': count}
+            for day, count in rollups.daily_series(days, course, university)
+        ],
+    })
 
 def run_migrations(request):
     """Run migrations manually"""
@@ -4,6 +4,8 @@ Django settings for varsity project.
 import os
 from pathlib import Path
 
+from django.core.exceptions import ImproperlyConfigured
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -153,19 +155,54 @@ cloudinary.config(secure=True)
 # Media files
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
-DEFAULT_FILE_STORAGE = 'cloudinary_storage.storage.MediaCloudinaryStorage'
+
+# Where uploads live: 'cloudinary', or 'local' (MEDIA_ROOT, served with Range
+# support by resources/serving.py). Set it explicitly in production; unset, it is
+# cloudinary whenever the SDK found credentials in any form (CLOUDINARY_URL or
+# CLOUDINARY_CLOUD_NAME/API_KEY/API_SECRET), else local.
+RESOURCE_STORAGE = os.environ.get('RESOURCE_STORAGE') or ('cloudinary' if cloudinary.config().cloud_name else 'local')
+if RESOURCE_STORAGE not in ('cloudinary', 'local'):
+    raise ImproperlyConfigured(f"RESOURCE_STORAGE must be 'cloudinary' or 'local', not {RESOURCE_STORAGE!r}")
+STORAGES = {
+    'default': {
+        'BACKEND': 'cloudinary_storage.storage.MediaCloudinaryStorage' if RESOURCE_STORAGE == 'cloudinary'
+        else 'django.core.files.storage.FileSystemStorage',
+    },
+    'staticfiles': {'BACKEND': STATICFILES_STORAGE},
+}
+# Local storage behind nginx: internal location aliasing MEDIA_ROOT (e.g. '/protected-media/'),
+# so nginx sends file bodies via X-Accel-Redirect instead of Python
+RESOURCE_ACCEL_REDIRECT = os.environ.get('RESOURCE_ACCEL_REDIRECT', '')
+# Browser/CDN caching of served files; ETags revalidate after a re-upload (seconds)
+RESOURCE_FILE_MAX_AGE = 7 * 24 * 3600
+# Concurrent storage uploads for the admin's bulk add, and how many files one
+# upload may carry: they are stored within the request, so keep a batch well
+# inside gunicorn's --timeout (Procfile)
+RESOURCE_UPLOAD_WORKERS = 4
+RESOURCE_BULK_MAX_FILES = 40
 
 # Authentication settings
 LOGIN_URL = 'login'
 LOGIN_REDIRECT_URL = 'home'
 
-# Cache for online users
-CACHES = {
-    'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
-        'LOCATION': 'unique-snowflake',
+# Cache for online users, API tokens, search results and the resource catalog.
+# Invalidation (logout, catalog edits) has to reach every gunicorn worker, so
+# deployments share Redis with Channels. Without REDIS_URL the cache is per
+# process, which only suits a single-process dev server.
+if 'REDIS_URL' in os.environ:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.environ['REDIS_URL'],
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'unique-snowflake',
+        }
     }
-}
 
 # ============ GOOGLE ANALYTICS ============
 GANALYTICS_TRACKING_CODE = 'G-Z3MDMT6983'
@@ -173,7 +210,7 @@ GANALYTICS_TRACKING_CODE = 'G-Z3MDMT6983'
 # ============ MOBILE APP API SETTINGS ============
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework.authentication.TokenAuthentication',
+        'posts.authentication.CachedTokenAuthentication',
         'rest_framework.authentication.SessionAuthentication',
     ],
     'DEFAULT_PERMISSION_CLASSES': [
@@ -191,6 +228,32 @@ REST_FRAMEWORK = {
     ],
 }
 
+# Token -> user lookups cached by CachedTokenAuthentication (seconds); only
+# with the shared cache, so a logout revokes the token in every worker
+TOKEN_CACHE_TIMEOUT = 300 if 'REDIS_URL' in os.environ else 0
+
+# Ranked ids, counts and facets cached by the unified /api/search/ (seconds)
+SEARCH_CACHE_TIMEOUT = 60
+
+# Characters of PDF text kept per resource by extract_resource_text
+RESOURCE_TEXT_MAX_CHARS = 200_000
+
+# Download clicks: repeat window per user/IP and write-behind flush interval (seconds)
+DOWNLOAD_DEDUP_WINDOW = 3600
+DOWNLOAD_FLUSH_INTERVAL = 30
+# Proxies in front of the app that append to X-Forwarded-For (the platform router, a CDN);
+# the client address is the entry this many places from the right, REMOTE_ADDR when 0
+TRUSTED_PROXY_COUNT = int(os.environ.get('TRUSTED_PROXY_COUNT', 0))
+
+# Cached resources catalog tree; signals invalidate it on edits (seconds)
+CATALOG_CACHE_TIMEOUT = 600
+# max-age of the resources API; devices revalidate with the ETag after it
+RESOURCES_API_MAX_AGE = 300
+
+# Storage class for prebuilt course-year ZIPs (build_resource_bundles); None
+# keeps them in the default storage
+RESOURCE_BUNDLE_STORAGE = None
+
 # CORS settings (for mobile app)
 CORS_ALLOW_ALL_ORIGINS = True
 CORS_ALLOW_CREDENTIALS = True